@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Kathara Lab Creator - Benchmark
+Misura le prestazioni della generazione dei laboratori su topologie
+sintetiche di dimensione crescente
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Directory del progetto: i template sono cercati in fileConfigurazione/
+PROJECT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+import kathara_lab_creator as klc
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+
+# Fasi misurate da bench_stages, nell'ordine in cui vengono eseguite
+STAGES = ["model", "validate", "lab_directory", "lab_conf", "startup_files", "config_directories", "commit"]
+
+# Metriche confrontate con la baseline: (sezione, metrica, True se più alto è meglio)
+TRACKED_METRICS = [
+    ("stages", "seconds", False),
+    ("stages", "read_write_syscalls", False),
+    ("stream", "files_per_sec", True),
+    ("memory", "device_bytes", False),
+    ("startup", "batch_ms", False),
+]
+
+# Dispositivi avviati da bench_startup: (nome, interfacce, rotte statiche)
+STARTUP_PROFILES = [("leaf48", 48, 0), ("host256", 1, 256)]
+BOOT_RUNS = 20
+
+# Sotto questa durata le differenze di tempo sono rumore
+MIN_SECONDS = 0.02
+
+def synthetic_devices(num_devices):
+    """
+    Produce in streaming una catena di router (uno ogni quattro dispositivi
+    è un host) con indirizzi già assegnati: il dominio Dk usa 10.x.y.0/24
+    """
+    for i in range(num_devices):
+        left, right = i, i + 1
+        left_net = f"10.{(left >> 8) & 255}.{left & 255}"
+        right_net = f"10.{(right >> 8) & 255}.{right & 255}"
+
+        if i % 4 == 3:
+            yield f"h{i}", {
+                'image': 'kathara/base',
+                'interfaces': {0: f"D{left}"},
+                'is_router': False,
+                'is_server': False,
+                'is_host': True,
+                'routing_protocol': None,
+                'ip_addresses': {0: f"{left_net}.10/24"},
+                'host_routes': [{'network': 'default', 'gateway': f"{left_net}.2", 'is_default': True}]
+            }
+        else:
+            yield f"r{i}", {
+                'image': 'kathara/frr',
+                'interfaces': {0: f"D{left}", 1: f"D{right}"},
+                'is_router': True,
+                'is_server': False,
+                'is_host': False,
+                'routing_protocol': 'ospf',
+                'ip_addresses': {0: f"{left_net}.2/24", 1: f"{right_net}.1/24"},
+                'host_routes': []
+            }
+
+def peak_rss_kb():
+    """Picco di memoria residente del processo corrente (KB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def read_write_syscalls():
+    """
+    Chiamate di sistema di lettura e scrittura del processo (syscr + syscw
+    di /proc/self/io, None se /proc non c'è): open, stat, mkdir, link e le
+    altre operazioni sui metadati non sono contate
+    """
+    try:
+        with open("/proc/self/io", 'r') as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters['syscr']) + int(counters['syscw'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+@contextlib.contextmanager
+def measure(stages, name):
+    """Registra durata e chiamate di lettura/scrittura di una fase in stages[name]"""
+    # Leggere /proc/self/io costa a sua volta qualche chiamata: va sottratta
+    overhead = -(read_write_syscalls() or 0) + (read_write_syscalls() or 0)
+    syscalls = read_write_syscalls()
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    stages[name] = {
+        'seconds': elapsed,
+        'read_write_syscalls': read_write_syscalls() - syscalls - overhead if syscalls is not None else None,
+    }
+
+def run_stages_child(num_devices):
+    """
+    Esegue la generazione non interattiva (come build_lab) su un anello di
+    router con un host ciascuno, misurando ogni fase separatamente
+    """
+    os.chdir(PROJECT_DIR)
+    stages = {}
+    with tempfile.TemporaryDirectory(prefix="kathara_bench_") as tmp, \
+            open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        lab_path = Path(tmp) / "lab"
+        
+        with measure(stages, "model"):
+            lab_name, devices_info, _ = klc.generate_topology(f"ring:routers={max(num_devices // 2, 1)}")
+            klc.allocate_ip_addresses(devices_info, "10.0.0.0/8", 24)
+            klc.derive_host_routes(devices_info)
+        
+        with measure(stages, "validate"):
+            errors = klc.validate_addressing(devices_info)
+        if errors:
+            raise ValueError(errors[0])
+        
+        staged = klc.staged_lab_directory(lab_path)
+        with measure(stages, "lab_directory"):
+            staging_path = staged.__enter__()
+        with measure(stages, "lab_conf"):
+            klc.create_lab_conf(lab_name, devices_info, staging_path)
+        with measure(stages, "startup_files"):
+            klc.create_startup_files(devices_info, staging_path)
+        with measure(stages, "config_directories"):
+            klc.create_config_directories(devices_info, staging_path)
+        with measure(stages, "commit"):
+            staged.__exit__(None, None, None)
+        
+        files = sum(len(file_names) for _, _, file_names in os.walk(lab_path))
+    
+    total = sum(stage['seconds'] for stage in stages.values())
+    return {
+        'devices': len(devices_info),
+        'files': files,
+        'seconds': total,
+        'files_per_sec': files / total if total else 0.0,
+        'peak_rss_kb': peak_rss_kb(),
+        'stages': stages,
+    }
+
+def run_child(mode, num_devices):
+    """Esegue una misura in un processo separato e ne restituisce il risultato"""
+    output = subprocess.run(
+        [sys.executable, __file__, f"--child-{mode}", str(num_devices)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+def bench_stages(sizes):
+    """
+    Misura tempo e chiamate di lettura/scrittura di ogni fase della
+    generazione completa, una dimensione per processo
+    """
+    print(f"{'dispositivi':>12} {'fase':>20} {'secondi':>9} {'syscall r/w':>11}")
+    results = []
+    for num_devices in sizes:
+        result = run_child("stages", num_devices)
+        results.append(result)
+        for name in STAGES:
+            stage = result['stages'][name]
+            syscalls = stage['read_write_syscalls'] if stage['read_write_syscalls'] is not None else "-"
+            print(f"{result['devices']:>12} {name:>20} {stage['seconds']:>9.3f} {syscalls:>11}")
+        print(f"{result['devices']:>12} {'totale':>20} {result['seconds']:>9.3f} "
+              f"{result['files_per_sec']:>6.0f} file/s, picco RSS {result['peak_rss_kb'] / 1024:.1f} MB")
+    return results
+
+def run_stream_child(num_devices):
+    """Esegue una singola misura di stream_lab (nel processo figlio)"""
+    os.chdir(PROJECT_DIR)
+    with tempfile.TemporaryDirectory(prefix="kathara_bench_") as tmp:
+        lab_path = Path(tmp) / "lab"
+        lab_path.mkdir()
+
+        start = time.perf_counter()
+        stats = klc.stream_lab(synthetic_devices(num_devices), lab_path)
+        elapsed = time.perf_counter() - start
+
+    return {
+        'devices': num_devices,
+        'files': stats['files'],
+        'seconds': elapsed,
+        'files_per_sec': stats['files'] / elapsed if elapsed else 0.0,
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+def bench_stream(sizes):
+    """
+    Misura file/s e picco di RSS della generazione in streaming. Ogni
+    dimensione gira in un processo separato, così il picco di memoria di
+    una misura non contamina le successive
+    """
+    print(f"{'dispositivi':>12} {'file':>8} {'secondi':>9} {'file/s':>10} {'picco RSS':>12}")
+    results = []
+    for num_devices in sizes:
+        result = run_child("stream", num_devices)
+        results.append(result)
+        print(f"{result['devices']:>12} {result['files']:>8} {result['seconds']:>9.2f} "
+              f"{result['files_per_sec']:>10.0f} {result['peak_rss_kb'] / 1024:>9.1f} MB")
+    return results
+
+def model_size(num_devices, compact):
+    """Memoria (byte) occupata da devices_info con il modello a dizionari o con Device"""
+    tracemalloc.start()
+    if compact:
+        devices_info = {name: klc.Device.from_dict(data) for name, data in synthetic_devices(num_devices)}
+    else:
+        devices_info = dict(synthetic_devices(num_devices))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del devices_info
+    return size
+
+def bench_memory(sizes):
+    """Confronta la memoria del modello a dizionari con quella del modello compatto"""
+    print(f"{'dispositivi':>12} {'dict':>10} {'Device':>10} {'risparmio':>10}")
+    results = []
+    for num_devices in sizes:
+        dict_size = model_size(num_devices, compact=False)
+        device_size = model_size(num_devices, compact=True)
+        results.append({'devices': num_devices, 'dict_bytes': dict_size, 'device_bytes': device_size})
+        print(f"{num_devices:>12} {dict_size / 2**20:>7.1f} MB {device_size / 2**20:>7.1f} MB "
+              f"{dict_size / device_size:>9.1f}x")
+    return results
+
+def startup_device(interfaces, routes):
+    """
+    Dispositivo di bench_startup: un router con 'interfacce' porte
+    indirizzate oppure, se ha rotte, un host con 'routes' rotte statiche
+    """
+    addresses = [f"10.{eth_num >> 8}.{eth_num & 255}.2/24" for eth_num in range(interfaces)]
+    spec = {'type': "router" if not routes else "host", 'routing_protocol': "ospf",
+            'interfaces': [f"D{eth_num}" for eth_num in range(interfaces)], 'ip_addresses': addresses}
+    if routes:
+        del spec['routing_protocol']
+        spec['host_routes'] = [f"172.{16 + (i >> 8)}.{i & 255}.0/24 via 10.0.0.1" for i in range(routes)]
+    device_data, errors = klc.build_device("bench", spec)
+    if errors:
+        raise ValueError(errors[0])
+    return device_data
+
+def boot_time(startup, interfaces, tmp):
+    """
+    Avvia la parte di rete di un .startup (senza i servizi) in un nuovo
+    network namespace con interfacce eth0..ethN già create, come in un
+    container appena avviato, e ne restituisce la durata in millisecondi
+    """
+    script = Path(tmp) / "bench.startup"
+    script.write_text("".join(line for line in startup.splitlines(keepends=True)
+                              if not line.startswith("systemctl")), encoding='utf-8')
+    setup = "".join(f"link add eth{eth_num} type veth peer name peer{eth_num}\n"
+                    for eth_num in range(interfaces))
+    output = subprocess.run(
+        ["unshare", "-n", "bash", "-c",
+         f"ip -batch - <<'EOF'\n{setup}EOF\n"
+         f"start=$EPOCHREALTIME; bash {script}; echo $start $EPOCHREALTIME"],
+        check=True, capture_output=True, text=True, env=dict(os.environ, LC_ALL="C")
+    ).stdout.split()
+    return (float(output[-1]) - float(output[-2])) * 1000
+
+def bench_startup(boot_runs=BOOT_RUNS):
+    """
+    Confronta l'avvio della rete di un container con i due stili di
+    .startup: un processo ip per operazione (commands) o un solo ip -batch
+    (batch). Serve unshare -n, quindi i privilegi per creare network
+    namespace (root): altrimenti la misura viene saltata
+    """
+    print(f"{'dispositivo':>12} {'operazioni':>11} {'commands':>10} {'batch':>10} {'speedup':>8}")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="kathara_bench_") as tmp:
+        for name, interfaces, routes in STARTUP_PROFILES:
+            device_data = startup_device(interfaces, routes)
+            result = {'profile': name, 'interfaces': interfaces, 'routes': routes}
+            for style in klc.STARTUP_STYLES:
+                klc.set_startup_style({"bench": device_data}, style)
+                startup = klc.render_startup("bench", device_data)
+                try:
+                    times = sorted(boot_time(startup, interfaces, tmp) for _ in range(boot_runs))
+                except (OSError, subprocess.CalledProcessError) as e:
+                    print(f"⚠️  Impossibile creare un network namespace ({e}): misura saltata")
+                    return []
+                # Mediana: l'avvio di processi è molto variabile
+                result[f"{style}_ms"] = times[len(times) // 2]
+            result['ip_commands'] = startup.count("\n", startup.index("<<'EOF'"), startup.index("\nEOF\n"))
+            results.append(result)
+            print(f"{name:>12} {result['ip_commands']:>11} {result['commands_ms']:>7.1f} ms "
+                  f"{result['batch_ms']:>7.1f} ms {result['commands_ms'] / result['batch_ms']:>7.1f}x")
+    return results
+
+def _metric_rows(results, section, metric):
+    """Valori di una metrica indicizzati per (dimensione o dispositivo, fase)"""
+    rows = {}
+    for result in results.get(section, []):
+        if section == "stages":
+            for name, stage in result['stages'].items():
+                rows[(result['devices'], name)] = stage.get(metric)
+        else:
+            rows[(result.get('devices', result.get('profile')), None)] = result.get(metric)
+    return rows
+
+def compare_results(results, baseline, tolerance=0.25):
+    """
+    Confronta i risultati con la baseline e restituisce le regressioni:
+    metriche peggiorate di oltre tolerance (tempi sotto MIN_SECONDS esclusi)
+    """
+    regressions = []
+    for section, metric, higher_is_better in TRACKED_METRICS:
+        current = _metric_rows(results, section, metric)
+        for key, old in _metric_rows(baseline, section, metric).items():
+            new = current.get(key)
+            if new is None or old is None or old == 0:
+                continue
+            if metric == "seconds" and max(new, old) < MIN_SECONDS:
+                continue
+            change = (old - new) / old if higher_is_better else (new - old) / old
+            if change > tolerance:
+                devices, stage = key
+                if isinstance(devices, str):
+                    label = f"{section}/{devices} {metric}"
+                else:
+                    label = f"{section}/{stage} " if stage else f"{section} "
+                    label += f"{metric} con {devices} dispositivi"
+                regressions.append(f"{label}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark di Kathara Lab Creator")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="numero di dispositivi per ogni misura")
+    parser.add_argument("--suite", nargs="+", choices=["stages", "stream", "memory", "startup"],
+                        default=["stages", "stream", "memory"],
+                        help="misure da eseguire (startup richiede i privilegi per unshare -n)")
+    parser.add_argument("--boot-runs", type=int, default=BOOT_RUNS,
+                        help=f"avvii misurati per ogni stile di .startup (default {BOOT_RUNS})")
+    parser.add_argument("--output", metavar="FILE", default="benchmark_results.json",
+                        help="file JSON in cui salvare i risultati (default benchmark_results.json)")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="confronta i risultati con questa baseline: esce con codice 1 se "
+                             "una metrica peggiora oltre la tolleranza")
+    parser.add_argument("--save-baseline", metavar="FILE",
+                        help="salva i risultati anche come nuova baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="peggioramento ammesso rispetto alla baseline (default 0.25 = 25%%)")
+    parser.add_argument("--child-stream", type=int, metavar="N", help=argparse.SUPPRESS)
+    parser.add_argument("--child-stages", type=int, metavar="N", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    
+    if args.child_stream:
+        print(json.dumps(run_stream_child(args.child_stream)))
+        return
+    if args.child_stages:
+        print(json.dumps(run_stages_child(args.child_stages)))
+        return
+    
+    results = {'python': sys.version.split()[0], 'sizes': args.sizes}
+    
+    if "stages" in args.suite:
+        print("⏱️  Fasi della generazione completa")
+        results['stages'] = bench_stages(args.sizes)
+    
+    if "stream" in args.suite:
+        print("\n📈 Generazione in streaming (stream_lab)")
+        results['stream'] = bench_stream(args.sizes)
+    
+    if "memory" in args.suite:
+        print("\n🧮 Memoria del modello dei dispositivi (devices_info)")
+        results['memory'] = bench_memory(args.sizes)
+    
+    if "startup" in args.suite:
+        print("\n🥾 Avvio della rete dei container: comandi ip separati o ip -batch")
+        results['startup'] = bench_startup(args.boot_runs)
+    
+    for output in filter(None, [args.output, args.save_baseline]):
+        Path(output).write_text(json.dumps(results, indent=1), encoding='utf-8')
+        print(f"\n💾 Risultati salvati in {output}")
+    
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regressions = compare_results(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressioni rispetto a {args.baseline}:")
+            for regression in regressions:
+                print(f"   • {regression}")
+            return 1
+        print(f"\n✅ Nessuna regressione rispetto a {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,832 +1,5170 @@
-#!/usr/bin/env python3
-"""
-Kathara Lab Creator - Versione semplificata
-Crea file lab.conf e startup e file di configurazione delle macchine
-per laboratori Kathara
-"""
-
-import os
-import shutil
-from pathlib import Path
-
-def welcome():
-    """Mostra messaggio di benvenuto"""
-    print("=" * 50)
-    print("🌐 KATHARA LAB CREATOR")
-    print("=" * 50)
-    print("Creatore semplificato per laboratori Kathara")
-    print("Questo strumento ti aiuterà a creare il file lab.conf")
-    print("e i file .startup per ogni dispositivo")
-    print("=" * 50)
-    print()
-
-def show_existing_labs():
-    """Mostra i laboratori già creati"""
-    created_labs_dir = Path("created_labs")
-    
-    if created_labs_dir.exists():
-        labs = [d.name for d in created_labs_dir.iterdir() if d.is_dir()]
-        if labs:
-            print("\n📚 Laboratori esistenti in created_labs/:")
-            for lab in sorted(labs):
-                print(f"   • {lab}")
-        else:
-            print("\n📚 Nessun laboratorio trovato in created_labs/")
-    else:
-        print("\n📚 Directory created_labs/ non esistente (verrà creata)")
-
-def get_lab_name():
-    """Chiede il nome del laboratorio"""
-    while True:
-        lab_name = input("Nome del laboratorio: ").strip()
-        if lab_name:
-            return lab_name
-        print("❌ Il nome del laboratorio non può essere vuoto!")
-
-def get_devices():
-    """Chiede il numero di dispositivi e i loro nomi"""
-    devices = []
-    
-    # Chiedi numero di dispositivi
-    while True:
-        try:
-            num_devices = int(input("Quanti dispositivi vuoi nel laboratorio? "))
-            if num_devices > 0:
-                break
-            else:
-                print("❌ Devi avere almeno 1 dispositivo!")
-        except ValueError:
-            print("❌ Inserisci un numero valido!")
-    
-    print(f"\nOra inserisci i nomi dei {num_devices} dispositivi:")
-    
-    # Chiedi nome di ogni dispositivo
-    for i in range(num_devices):
-        while True:
-            device_name = input(f"Nome dispositivo {i+1}: ").strip()
-            
-            # Verifica che il nome sia valido
-            if not device_name:
-                print("❌ Il nome non può essere vuoto!")
-                continue
-            
-            # Verifica che non sia duplicato
-            if device_name in devices:
-                print("❌ Nome già esistente! Scegli un nome diverso.")
-                continue
-            
-            # Verifica caratteri validi (lettere, numeri, underscore, trattino)
-            # Permette nomi come: r1, pc1, br1r, br2r, web-server, db_1, etc.
-            valid_chars = all(c.isalnum() or c in ('_', '-') for c in device_name)
-            if not valid_chars:
-                print("❌ Il nome può contenere solo lettere, numeri, - e _")
-                continue
-            
-            # Il nome deve iniziare con una lettera o numero (non con - o _)
-            if not device_name[0].isalnum():
-                print("❌ Il nome deve iniziare con una lettera o un numero")
-                continue
-            
-            devices.append(device_name)
-            print(f"✅ Dispositivo '{device_name}' aggiunto")
-            break
-    
-    return devices
-
-def choose_device_type(device_name):
-    """Chiede il tipo di dispositivo per scegliere l'immagine Docker"""
-    print(f"\nChe tipo di dispositivo è '{device_name}'?")
-    print("1. Router (kathara/frr)")
-    print("2. Host (kathara/base)")
-    print("3. Server (kathara/base)")
-    
-    images = {
-        "1": "kathara/frr",
-        "2": "kathara/base", 
-        "3": "kathara/base"
-    }
-    
-    # Tipi considerati router (che necessitano configurazione routing)
-    router_types = {"1"}
-    server_types = {"3"}
-    
-    while True:
-        choice = input("Scegli tipo (1-3): ").strip()
-        
-        if choice in images:
-            is_router = choice in router_types
-            is_server = choice in server_types
-            return images[choice], is_router, is_server
-        else:
-            print("❌ Scelta non valida! Scegli 1, 2 o 3.")
-
-def get_device_interfaces(device_name):
-    """Chiede quante interfacce ha il dispositivo e i domini di collisione"""
-    print(f"\n🔌 Configurazione interfacce per '{device_name}'")
-    
-    # Chiedi numero di interfacce
-    while True:
-        try:
-            num_interfaces = int(input(f"Quante porte ethernet ha '{device_name}'? "))
-            if num_interfaces >= 0:
-                break
-            else:
-                print("❌ Il numero di interfacce non può essere negativo!")
-        except ValueError:
-            print("❌ Inserisci un numero valido!")
-    
-    interfaces = {}
-    used_domains = set()
-    
-    # Per ogni interfaccia, chiedi il dominio di collisione
-    for i in range(num_interfaces):
-        print(f"\nInterfaccia eth{i} di '{device_name}':")
-        
-        while True:
-            domain = input(f"Dominio di collisione per eth{i} (es. A, B, C...): ").strip().upper()
-            
-            # Verifica che non sia vuoto
-            if not domain:
-                print("❌ Il dominio di collisione non può essere vuoto!")
-                continue
-            
-            # Verifica che sia un nome valido (lettere e numeri)
-            if not domain.replace('_', '').replace('-', '').isalnum():
-                print("❌ Il dominio può contenere solo lettere, numeri, - e _")
-                continue
-            
-            # Suggerimento se non è una lettera maiuscola singola
-            if len(domain) > 1 or not domain.isalpha():
-                confirm = input(f"⚠️  Di solito si usano lettere singole (A, B, C...). Confermi '{domain}'? (s/N): ").strip().lower()
-                if confirm != 's':
-                    continue
-            
-            interfaces[i] = domain
-            used_domains.add(domain)
-            print(f"✅ eth{i} → {domain}")
-            break
-    
-    return interfaces, used_domains
-
-def get_router_ip_addresses(device_name, interfaces):
-    """Chiede gli indirizzi IP per ogni interfaccia del router"""
-    print(f"\n🌐 Configurazione indirizzi IP per router '{device_name}'")
-    ip_config = {}
-    
-    for eth_num in sorted(interfaces.keys()):
-        domain = interfaces[eth_num]
-        print(f"\nInterfaccia eth{eth_num} (dominio {domain}):")
-        
-        while True:
-            ip_input = input(f"Indirizzo IP per eth{eth_num} (formato: 10.0.0.1/24): ").strip()
-            
-            # Verifica formato base (contiene / e punto)
-            if not ip_input:
-                print("❌ L'indirizzo IP non può essere vuoto!")
-                continue
-            
-            if '/' not in ip_input:
-                print("❌ Formato non valido! Usa il formato: IP/NETMASK (es. 10.0.0.1/24)")
-                continue
-            
-            # Split IP e netmask
-            try:
-                ip_part, netmask = ip_input.split('/')
-                
-                # Verifica che la netmask sia un numero
-                netmask_int = int(netmask)
-                if netmask_int < 0 or netmask_int > 32:
-                    print("❌ La netmask deve essere tra 0 e 32!")
-                    continue
-                
-                # Verifica formato IP (deve avere 4 ottetti)
-                octets = ip_part.split('.')
-                if len(octets) != 4:
-                    print("❌ L'indirizzo IP deve avere 4 ottetti (es. 192.168.1.1)!")
-                    continue
-                
-                # Verifica che ogni ottetto sia valido
-                valid = True
-                for octet in octets:
-                    octet_int = int(octet)
-                    if octet_int < 0 or octet_int > 255:
-                        print(f"❌ Ottetto {octet} non valido! Deve essere tra 0 e 255.")
-                        valid = False
-                        break
-                
-                if not valid:
-                    continue
-                
-                # Salva la configurazione
-                ip_config[eth_num] = ip_input
-                print(f"✅ eth{eth_num} → {ip_input}")
-                break
-                
-            except ValueError:
-                print("❌ Formato non valido! Usa il formato: IP/NETMASK (es. 10.0.0.1/24)")
-                continue
-    
-    return ip_config
-
-def get_host_server_ip_addresses(device_name, device_type, interfaces):
-    """Chiede gli indirizzi IP per ogni interfaccia di host/server"""
-    print(f"\n🌐 Configurazione indirizzi IP per {device_type} '{device_name}'")
-    print("Vuoi configurare gli indirizzi IP per questo dispositivo?")
-    
-    configure_ips = input("Configura IP? (s/N): ").strip().lower()
-    
-    if configure_ips != 's':
-        return {}
-    
-    ip_config = {}
-    
-    for eth_num in sorted(interfaces.keys()):
-        domain = interfaces[eth_num]
-        print(f"\nInterfaccia eth{eth_num} (dominio {domain}):")
-        
-        while True:
-            ip_input = input(f"Indirizzo IP per eth{eth_num} (formato: 10.0.0.1/24 o invio per saltare): ").strip()
-            
-            # Permetti di saltare l'interfaccia
-            if not ip_input:
-                print(f"⏭️  eth{eth_num} saltata (verrà commentata nel file .startup)")
-                break
-            
-            if '/' not in ip_input:
-                print("❌ Formato non valido! Usa il formato: IP/NETMASK (es. 10.0.0.1/24)")
-                continue
-            
-            # Split IP e netmask
-            try:
-                ip_part, netmask = ip_input.split('/')
-                
-                # Verifica che la netmask sia un numero
-                netmask_int = int(netmask)
-                if netmask_int < 0 or netmask_int > 32:
-                    print("❌ La netmask deve essere tra 0 e 32!")
-                    continue
-                
-                # Verifica formato IP (deve avere 4 ottetti)
-                octets = ip_part.split('.')
-                if len(octets) != 4:
-                    print("❌ L'indirizzo IP deve avere 4 ottetti (es. 192.168.1.1)!")
-                    continue
-                
-                # Verifica che ogni ottetto sia valido
-                valid = True
-                for octet in octets:
-                    octet_int = int(octet)
-                    if octet_int < 0 or octet_int > 255:
-                        print(f"❌ Ottetto {octet} non valido! Deve essere tra 0 e 255.")
-                        valid = False
-                        break
-                
-                if not valid:
-                    continue
-                
-                # Salva la configurazione
-                ip_config[eth_num] = ip_input
-                print(f"✅ eth{eth_num} → {ip_input}")
-                break
-                
-            except ValueError:
-                print("❌ Formato non valido! Usa il formato: IP/NETMASK (es. 10.0.0.1/24)")
-                continue
-    
-    return ip_config
-
-def get_host_routes(device_name):
-    """Chiede le rotte da aggiungere per un host"""
-    print(f"\n🛣️  Configurazione rotte per host '{device_name}'")
-    print("Vuoi aggiungere rotte statiche per questo host?")
-    
-    add_routes = input("Aggiungi rotte? (s/N): ").strip().lower()
-    
-    if add_routes != 's':
-        return []
-    
-    routes = []
-    print("\nInserisci le rotte (lascia vuoto per terminare)")
-    print("Formato rotta di default: default via GATEWAY (es. default via 192.168.1.1)")
-    print("Formato rotta specifica: RETE/NETMASK via GATEWAY (es. 192.168.2.0/24 via 192.168.1.1)")
-    
-    while True:
-        route_input = input(f"Rotta {len(routes) + 1} (o invio per terminare): ").strip()
-        
-        if not route_input:
-            break
-        
-        # Verifica formato base
-        if ' via ' not in route_input.lower():
-            print("❌ Formato non valido! Usa: RETE/NETMASK via GATEWAY o default via GATEWAY")
-            continue
-        
-        try:
-            # Split in parti
-            parts = route_input.lower().split(' via ')
-            if len(parts) != 2:
-                print("❌ Formato non valido! Usa: RETE/NETMASK via GATEWAY o default via GATEWAY")
-                continue
-            
-            network, gateway = parts[0].strip(), parts[1].strip()
-            
-            # Verifica se è la rotta di default
-            is_default = (network == 'default')
-            
-            if not is_default:
-                # Verifica che la rete abbia la netmask
-                if '/' not in network:
-                    print("❌ La rete deve includere la netmask (es. 192.168.2.0/24) o usare 'default'")
-                    continue
-                
-                # Verifica formato network
-                net_part, netmask = network.split('/')
-                netmask_int = int(netmask)
-                if netmask_int < 0 or netmask_int > 32:
-                    print("❌ La netmask deve essere tra 0 e 32!")
-                    continue
-                
-                # Verifica formato IP della rete
-                net_octets = net_part.split('.')
-                if len(net_octets) != 4:
-                    print("❌ La rete deve avere 4 ottetti!")
-                    continue
-                
-                # Verifica validità ottetti della rete
-                valid = True
-                for octet in net_octets:
-                    octet_int = int(octet)
-                    if octet_int < 0 or octet_int > 255:
-                        print(f"❌ Ottetto {octet} non valido! Deve essere tra 0 e 255.")
-                        valid = False
-                        break
-                
-                if not valid:
-                    continue
-            
-            # Verifica formato IP del gateway
-            gw_octets = gateway.split('.')
-            if len(gw_octets) != 4:
-                print("❌ Il gateway deve avere 4 ottetti!")
-                continue
-            
-            # Verifica validità ottetti del gateway
-            valid = True
-            for octet in gw_octets:
-                octet_int = int(octet)
-                if octet_int < 0 or octet_int > 255:
-                    print(f"❌ Ottetto {octet} non valido! Deve essere tra 0 e 255.")
-                    valid = False
-                    break
-            
-            if not valid:
-                continue
-            
-            # Salva la rotta
-            routes.append({'network': network, 'gateway': gateway, 'is_default': is_default})
-            if is_default:
-                print(f"✅ Rotta di default aggiunta: via {gateway}")
-            else:
-                print(f"✅ Rotta aggiunta: {network} via {gateway}")
-            
-        except ValueError:
-            print("❌ Formato non valido! Usa: RETE/NETMASK via GATEWAY o default via GATEWAY")
-            continue
-    
-    return routes
-
-def choose_routing_protocol(device_name):
-    """Chiede quale protocollo di routing usa il router"""
-    print(f"\n🔀 Configurazione routing per '{device_name}'")
-    print("Quale protocollo di routing usa questo router?")
-    print("1. OSPF (Open Shortest Path First)")
-    print("2. RIP (Routing Information Protocol)")
-    print("3. BGP (Border Gateway Protocol)")
-    
-    while True:
-        choice = input("Scegli protocollo (1-3): ").strip()
-        
-        if choice == "1":
-            return "ospf"
-        elif choice == "2":
-            return "rip"
-        elif choice == "3":
-            return "bgp"
-        else:
-            print("❌ Scelta non valida! Scegli 1, 2 o 3.")
-
-def create_router_config_directories(device_name, routing_protocol, lab_path):
-    """
-    Crea la directory nomerouter/etc/frr/ e copia i file di configurazione
-    dal protocollo di routing specificato
-    """
-    # Path della directory di destinazione
-    router_dir = lab_path / device_name / "etc" / "frr"
-    router_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Path della directory sorgente
-    config_source_dir = Path("fileConfigurazione") / routing_protocol
-    
-    # Verifica che la directory sorgente esista
-    if not config_source_dir.exists():
-        print(f"⚠️  Directory di configurazione {config_source_dir} non trovata!")
-        return False
-    
-    # Lista dei file da copiare
-    config_files = ["daemons", "frr.conf", "vtysh.conf"]
-    
-    # Copia ogni file
-    copied_files = []
-    for config_file in config_files:
-        source_file = config_source_dir / config_file
-        dest_file = router_dir / config_file
-        
-        if source_file.exists():
-            shutil.copy2(source_file, dest_file)
-            copied_files.append(config_file)
-        else:
-            print(f"⚠️  File {config_file} non trovato in {config_source_dir}")
-    
-    if copied_files:
-        print(f"✅ Creata directory {device_name}/etc/frr/ con file: {', '.join(copied_files)}")
-        return True
-    else:
-        print(f"❌ Nessun file di configurazione copiato per {device_name}")
-        return False
-
-def create_server_config_directories(device_name, lab_path):
-    """
-    Crea la directory nome_server/var/www/html/ e copia il file index.html
-    dalla directory fileConfigurazione/server/
-    """
-    # Path della directory di destinazione
-    server_dir = lab_path / device_name / "var" / "www" / "html"
-    server_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Path della directory sorgente
-    config_source_dir = Path("fileConfigurazione") / "server" / "var" / "www" / "html"
-    
-    # Verifica che la directory sorgente esista
-    if not config_source_dir.exists():
-        print(f"⚠️  Directory di configurazione {config_source_dir} non trovata!")
-        return False
-    
-    # File da copiare
-    source_file = config_source_dir / "index.html"
-    dest_file = server_dir / "index.html"
-    
-    if source_file.exists():
-        shutil.copy2(source_file, dest_file)
-        print(f"✅ Creata directory {device_name}/var/www/html/ con file: index.html")
-        return True
-    else:
-        print(f"⚠️  File index.html non trovato in {config_source_dir}")
-        return False
-
-
-def create_lab_directory(lab_name):
-    """Crea la directory del laboratorio dentro created_labs"""
-    # Crea prima la directory principale created_labs se non esiste
-    base_dir = Path("created_labs")
-    base_dir.mkdir(exist_ok=True)
-    
-    # Crea il path completo del laboratorio
-    lab_path = base_dir / lab_name
-    
-    # Se la directory esiste, chiedi conferma per sovrascriverla
-    if lab_path.exists():
-        print(f"⚠️  Directory 'created_labs/{lab_name}' già esistente!")
-        overwrite = input("Vuoi sovrascriverla? (s/N): ").strip().lower()
-        if overwrite != 's':
-            print("❌ Operazione annullata.")
-            return None
-        
-        # Rimuovi contenuto esistente
-        import shutil
-        shutil.rmtree(lab_path)
-    
-    # Crea la directory
-    lab_path.mkdir(parents=True, exist_ok=True)
-    print(f"✅ Directory 'created_labs/{lab_name}' creata")
-    return lab_path
-
-def create_lab_conf(lab_name, devices_info, lab_path):
-    """Crea il file lab.conf nella directory del laboratorio"""
-    filename = lab_path / "lab.conf"
-    
-    print(f"\n📁 Creando file lab.conf...")
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-               
-        # Per ogni dispositivo, scrivi la configurazione
-        for device_name, device_data in devices_info.items():
-            image = device_data['image']
-            interfaces = device_data['interfaces']
-            
-            # Specifica sempre l'immagine (anche kathara/base per host e server)
-            f.write(f'{device_name}[image]="{image}"\n')
-            
-            # Configura le interfacce
-            for eth_num, domain in interfaces.items():
-                f.write(f'{device_name}[{eth_num}]="{domain}"\n')
-            
-            if interfaces:
-                f.write(f"# {device_name} - Interfacce configurate\n")
-            else:
-                f.write(f"# {device_name} - Nessuna interfaccia configurata\n")
-            f.write("\n")
-    
-    print(f"✅ File lab.conf creato!")
-    return filename
-
-def create_startup_files(devices_info, lab_path):
-    """Crea i file .startup per ogni dispositivo"""
-    print(f"\n🚀 Creando file .startup...")
-    
-    startup_files = []
-    
-    for device_name, device_data in devices_info.items():
-        startup_filename = lab_path / f"{device_name}.startup"
-        image = device_data['image']
-        interfaces = device_data['interfaces']
-        is_router = device_data.get('is_router', False)
-        is_server = device_data.get('is_server', False)
-        is_host = device_data.get('is_host', False)
-        ip_addresses = device_data.get('ip_addresses', {})
-        host_routes = device_data.get('host_routes', [])
-        
-        with open(startup_filename, 'w', encoding='utf-8') as f:
-            f.write("#!/bin/bash\n\n")
-            
-            # Configurazione delle interfacce
-            f.write("# Configurazione interfacce di rete\n")
-            
-            # Se ci sono IP configurati (router, host o server)
-            if ip_addresses:
-                for eth_num in sorted(interfaces.keys()):
-                    domain = interfaces[eth_num]
-                    if eth_num in ip_addresses:
-                        ip_addr = ip_addresses[eth_num]
-                        f.write(f"ip addr add {ip_addr} dev eth{eth_num}\n")
-                    else:
-                        # Interfaccia senza IP configurato
-                        f.write(f"# eth{eth_num} collegata al dominio {domain}\n")
-                        f.write(f"# ip addr add <INDIRIZZO_IP>/<NETMASK> dev eth{eth_num}\n")
-            else:
-                # Nessun IP configurato - commenta tutte le interfacce
-                for eth_num, domain in interfaces.items():
-                    f.write(f"# eth{eth_num} collegata al dominio {domain}\n")
-                    f.write(f"# ip addr add <INDIRIZZO_IP>/<NETMASK> dev eth{eth_num}\n")
-            
-            if interfaces:
-                f.write("\n")
-            
-            # Se è un host con rotte, aggiungile
-            if is_host and host_routes:
-                f.write("# Configurazione rotte statiche\n")
-                for route in host_routes:
-                    if route.get('is_default', False):
-                        # Rotta di default
-                        f.write(f"ip route add default via {route['gateway']}\n")
-                    else:
-                        # Rotta specifica
-                        f.write(f"ip route add {route['network']} via {route['gateway']}\n")
-                f.write("\n")
-            
-            # Se è un router, aggiungi il comando per avviare FRR
-            if is_router:
-                f.write("# Avvio servizio FRR\n")
-                f.write("systemctl start frr\n")
-            
-            # Se è un server, aggiungi il comando per avviare Apache2
-            if is_server:
-                f.write("# Avvio servizio Apache2\n")
-                f.write("systemctl start apache2\n")
-        
-        # Rendi il file eseguibile
-        startup_filename.chmod(0o755)
-        startup_files.append(startup_filename)
-        print(f"✅ Creato {device_name}.startup")
-    
-    return startup_files
-
-def show_generated_files(lab_path, devices_info):
-    """Mostra il contenuto dei file generati"""
-    print("\n" + "=" * 70)
-    print("📄 CONTENUTO FILE GENERATI")
-    print("=" * 70)
-    
-    # Mostra lab.conf
-    lab_conf_path = lab_path / "lab.conf"
-    if lab_conf_path.exists():
-        print("\n🔧 CONTENUTO lab.conf:")
-        print("-" * 50)
-        with open(lab_conf_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            print(content)
-        print("-" * 50)
-    
-    # Mostra i file .startup
-    print("\n🚀 CONTENUTO FILE .startup:")
-    print("-" * 50)
-    
-    for device_name in devices_info.keys():
-        startup_path = lab_path / f"{device_name}.startup"
-        if startup_path.exists():
-            print(f"\n📄 File: {device_name}.startup")
-            print("─" * 30)
-            with open(startup_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                print(content)
-            print("─" * 30)
-    
-    print("\n" + "=" * 70)
-
-def show_summary(lab_name, devices_info, all_domains):
-    """Mostra un riassunto del laboratorio"""
-    print("\n📊 RIASSUNTO LABORATORIO")
-    print("=" * 50)
-    print(f"Nome: {lab_name}")
-    print(f"Numero dispositivi: {len(devices_info)}")
-    print(f"Domini di collisione: {len(all_domains)}")
-    print("\nDispositivi:")
-    
-    for device_name, device_data in devices_info.items():
-        image = device_data['image']
-        interfaces = device_data['interfaces']
-        is_router = device_data.get('is_router', False)
-        routing_protocol = device_data.get('routing_protocol', None)
-        ip_addresses = device_data.get('ip_addresses', {})
-        
-        print(f"  • {device_name} ({image})")
-        
-        if is_router and routing_protocol:
-            print(f"    ├─ Protocollo: {routing_protocol.upper()}")
-        
-        if interfaces:
-            for eth_num, domain in interfaces.items():
-                ip_info = ""
-                if eth_num in ip_addresses:
-                    ip_info = f" - IP: {ip_addresses[eth_num]}"
-                print(f"    └─ eth{eth_num} → {domain}{ip_info}")
-        else:
-            print(f"    └─ Nessuna interfaccia")
-    
-    if all_domains:
-        print(f"\n📡 DOMINI DI COLLISIONE UTILIZZATI")
-        print("-" * 35)
-        for domain in sorted(all_domains):
-            print(f"  • {domain}")
-        print()
-        print("💡 Ogni dominio di collisione rappresenta un segmento di rete")
-        print("   Dispositivi nello stesso dominio possono comunicare direttamente")
-    else:
-        print("\n📡 Nessun dominio di collisione configurato")
-        print("   (Tutti i dispositivi sono isolati)")
-    
-    print("=" * 50)
-
-def main():
-    """Funzione principale"""
-    welcome()
-    
-    # Ottieni nome laboratorio
-    lab_name = get_lab_name()
-    
-    # Crea directory del laboratorio
-    lab_path = create_lab_directory(lab_name)
-    if lab_path is None:
-        return
-    
-    # Ottieni lista dispositivi
-    devices = get_devices()
-    
-    # Per ogni dispositivo, chiedi il tipo e le interfacce
-    devices_info = {}
-    all_domains = set()
-    
-    print(f"\n🖥️  CONFIGURAZIONE DISPOSITIVI")
-    print("-" * 35)
-    
-    for device in devices:
-        print(f"\n--- Configurazione {device} ---")
-        
-        # Tipo di dispositivo
-        image, is_router, is_server = choose_device_type(device)
-        is_host = not is_router and not is_server
-        
-        # Interfacce del dispositivo
-        interfaces, device_domains = get_device_interfaces(device)
-        
-        # Configurazione IP e rotte in base al tipo
-        routing_protocol = None
-        ip_addresses = {}
-        host_routes = []
-        
-        if is_router:
-            # Router: chiedi protocollo di routing e IP
-            routing_protocol = choose_routing_protocol(device)
-            if interfaces:
-                ip_addresses = get_router_ip_addresses(device, interfaces)
-        elif is_host:
-            # Host: chiedi IP e rotte
-            if interfaces:
-                ip_addresses = get_host_server_ip_addresses(device, "host", interfaces)
-            host_routes = get_host_routes(device)
-        elif is_server:
-            # Server: chiedi solo IP
-            if interfaces:
-                ip_addresses = get_host_server_ip_addresses(device, "server", interfaces)
-        
-        # Salva informazioni dispositivo
-        devices_info[device] = {
-            'image': image,
-            'interfaces': interfaces,
-            'is_router': is_router,
-            'is_server': is_server,
-            'is_host': is_host,
-            'routing_protocol': routing_protocol,
-            'ip_addresses': ip_addresses,
-            'host_routes': host_routes
-        }
-        
-        # Aggiungi domini utilizzati
-        all_domains.update(device_domains)
-    
-    # Mostra riassunto
-    show_summary(lab_name, devices_info, all_domains)
-    
-    # Chiedi conferma
-    confirm = input("\nVuoi creare i file del laboratorio? (S/n): ").strip().lower()
-    if confirm != 'n':
-        # Crea file lab.conf
-        lab_conf_file = create_lab_conf(lab_name, devices_info, lab_path)
-        
-        # Crea file .startup
-        startup_files = create_startup_files(devices_info, lab_path)
-        
-        # Crea directory di configurazione per i router
-        router_configs_created = []
-        for device_name, device_data in devices_info.items():
-            if device_data.get('is_router') and device_data.get('routing_protocol'):
-                success = create_router_config_directories(
-                    device_name, 
-                    device_data['routing_protocol'], 
-                    lab_path
-                )
-                if success:
-                    router_configs_created.append(device_name)
-        
-        # Crea directory di configurazione per i server
-        server_configs_created = []
-        for device_name, device_data in devices_info.items():
-            if device_data.get('is_server'):
-                success = create_server_config_directories(
-                    device_name,
-                    lab_path
-                )
-                if success:
-                    server_configs_created.append(device_name)
-        
-        print(f"\n🎉 Laboratorio '{lab_name}' creato!")
-        print(f"📁 Directory: {lab_path.absolute()}")
-        print("📄 File generati:")
-        print(f"   • lab.conf")
-        print(f"   • {len(startup_files)} file .startup")
-        if router_configs_created:
-            print(f"   • {len(router_configs_created)} directory di configurazione router:")
-            for router in router_configs_created:
-                print(f"     - {router}/etc/frr/")
-        if server_configs_created:
-            print(f"   • {len(server_configs_created)} directory di configurazione server:")
-            for server in server_configs_created:
-                print(f"     - {server}/var/www/html/")
-        
-        print("\nProssimi passi:")
-        print("1. Modifica i file .startup per configurare gli IP")
-        if router_configs_created:
-            print("2. Personalizza i file di configurazione routing in <router>/etc/frr/")
-            print("3. Entra nella directory del laboratorio:")
-        else:
-            print("2. Entra nella directory del laboratorio:")
-        print(f"   cd created_labs/{lab_name}")
-        print(f"{3 if router_configs_created else 2}. Avvia il laboratorio:")
-        print("   kathara lstart")
-        print(f"{4 if router_configs_created else 3}. Per fermarlo:")
-        print("   kathara lclean")
-        
-        # Chiedi se mostrare il contenuto dei file
-        show_files = input("\nVuoi vedere il contenuto dei file generati? (S/n): ").strip().lower()
-        if show_files != 'n':
-            show_generated_files(lab_path, devices_info)
-        
-    else:
-        print("\n👋 Operazione annullata.")
-
-if __name__ == "__main__":
-    try:
-        main()
-    except KeyboardInterrupt:
-        print("\n\n👋 Uscita dal programma. Arrivederci!")
-    except Exception as e:
-        print(f"\n❌ Errore: {e}")
\ No newline at end of file
+#!/usr/bin/env python3
+"""
+Kathara Lab Creator - Versione semplificata
+Crea file lab.conf e startup e file di configurazione delle macchine
+per laboratori Kathara
+"""
+
+import argparse
+import cProfile
+import ctypes
+import bisect
+import hashlib
+import heapq
+import io
+import itertools
+import ipaddress
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+
+try:
+    import yaml
+except ImportError:  # PyYAML è opzionale: senza, le specifiche devono essere JSON
+    yaml = None
+
+try:
+    import fcntl
+except ImportError:  # Non disponibile su Windows: il reflink ricade sulla copia
+    fcntl = None
+
+# Tipi di dispositivo accettati nelle specifiche: immagine, is_router, is_server
+DEVICE_TYPES = {
+    "router": ("kathara/frr", True, False),
+    "host": ("kathara/base", False, False),
+    "server": ("kathara/base", False, True),
+}
+
+ROUTING_PROTOCOLS = ("ospf", "rip", "bgp")
+
+# Strategie per installare i template nei laboratori
+LINK_MODES = ("copy", "hardlink", "reflink", "symlink")
+
+# File di configurazione FRR copiati dai template per ogni router
+ROUTER_CONFIG_FILES = ["daemons", "frr.conf", "vtysh.conf"]
+
+# File che l'utente personalizza dopo la generazione: vengono sempre copiati
+CUSTOMISED_FILES = {"frr.conf"}
+
+# Demoni FRR richiesti dalle sezioni di frr.conf (zebra e staticd partono sempre)
+FRR_DAEMONS = {"bgp": "bgpd", "ospf": "ospfd", "ospf6": "ospf6d", "rip": "ripd", "ripng": "ripngd",
+               "isis": "isisd", "eigrp": "eigrpd", "babel": "babeld", "openfabric": "fabricd",
+               "bfd": "bfdd", "mpls ldp": "ldpd", "pbr-map": "pbrd", "ip pim": "pimd", "vrrp": "vrrpd"}
+FRR_DAEMON_RE = re.compile(r'^\s*(?:router (bgp|ospf6|ospf|ripng|rip|isis|eigrp|babel|openfabric)\b'
+                           r'|(bfd)\s*$|neighbor \S+ (bfd)\b|(mpls ldp)\b|(pbr-map)\b|(ip pim)\b|(vrrp)\b)',
+                           re.MULTILINE)
+DAEMON_LINE_RE = re.compile(r'^(\w+d)=(?:yes|no)$', re.MULTILINE)
+ZEBRA_BUFFER_RE = re.compile(r'^(zebra_options=".*-s )(\d+)', re.MULTILINE)
+
+# Buffer netlink di zebra (-s): spazio per ogni rotta attesa, con il
+# minimo predefinito di FRR (4 MiB), arrotondato alla potenza di 2
+ZEBRA_BUFFER_PER_ROUTE = 2048
+ZEBRA_BUFFER_MIN = 4 * 1024 * 1024
+
+# Modello di capacità per i limiti [mem] e [cpus] di lab.conf: memoria (MB)
+# e CPU di base per ruolo, più il costo di ogni demone FRR, di ogni
+# interfaccia e di ogni rotta attesa (RIB di zebra e tabella di ogni demone)
+ROLE_MEMORY_MB = {"host": 32, "server": 80, "router": 48}
+ROLE_CPUS = {"host": 0.25, "server": 0.5, "router": 0.5}
+DAEMON_MEMORY_MB = {"bgpd": 24}
+DAEMON_MEMORY_DEFAULT_MB = 12
+DAEMON_CPUS = 0.25
+INTERFACE_MEMORY_MB = 1
+ROUTE_MEMORY_KB = 4
+ROUTES_PER_CPU = 20000
+MEMORY_STEP_MB = 16
+MAX_DEVICE_CPUS = 4
+# I limiti di CPU sono tetti, non riservati: somma ammessa per CPU della macchina
+CPU_OVERCOMMIT = 4
+
+# Simulatore del piano di controllo: distanze amministrative di zebra usate
+# per scegliere tra i protocolli, costo OSPF delle interfacce senza
+# "ip ospf cost", metrica delle rotte esterne OSPF (sempre peggiori di
+# quelle interne), metrica RIP irraggiungibile ed esempi mostrati
+ADMIN_DISTANCES = {"ebgp": 20, "ospf": 110, "rip": 120, "ibgp": 200}
+OSPF_DEFAULT_COST = 10
+OSPF_EXTERNAL_METRIC = 1 << 24
+RIP_INFINITY = 16
+SIMULATION_SAMPLES = 10
+
+# Manifest con l'hash di ogni file generato, usato dalla rigenerazione incrementale
+MANIFEST_NAME = ".kathara_manifest.json"
+
+# Formati di --archive: compressione di tarfile (None = zip)
+ARCHIVE_FORMATS = {"tar": "", "tar.gz": "gz", "tar.bz2": "bz2", "tar.xz": "xz", "zip": None}
+
+# Stili dei file .startup: un comando ip per operazione o un solo processo
+# ip -batch con tutte le operazioni di rete del dispositivo
+STARTUP_STYLES = ("commands", "batch")
+
+# Variabili d'ambiente equivalenti a --profile e --profile-dump
+PROFILE_ENV = "KATHARA_PROFILE"
+PROFILE_DUMP_ENV = "KATHARA_PROFILE_DUMP"
+
+# Catalogue dei laboratori in created_labs/ con i metadati usati da --list
+CATALOGUE_NAME = ".catalogue.json"
+
+# Segnaposto dei template FRR (es. <IP/NETMASK>, <AS_NUMBER>, <router name>)
+PLACEHOLDER_RE = re.compile(r'<([A-Za-z_/ ]+)>')
+
+# Nomi come as1r2 indicano un router dell'AS 1
+AS_NAME_RE = re.compile(r'^as(\d+)r\d+$', re.IGNORECASE)
+
+# Righe dei laboratori esistenti riconosciute da load_lab
+LAB_CONF_RE = re.compile(r'^([A-Za-z0-9][A-Za-z0-9_-]*)\[(\w+)\]="?([^"]*)"?\s*$')
+IP_ADDR_RE = re.compile(r'^(?:ip )?addr add (\S+) dev eth(\d+)')
+IP_ROUTE_RE = re.compile(r'^(?:ip )?route add (\S+) via (\S+)')
+IP_BATCH_RE = re.compile(r'^ip (?:-force )?-batch ')
+SERVICE_RE = re.compile(r'^systemctl start (\w+)')
+FRR_ROUTER_RE = re.compile(r'^router (ospf|rip|bgp)\b(?: (\d+))?')
+FRR_NETWORK_RE = re.compile(r'^\s*network (\S+)(?: area (\S+))?')
+FRR_NEIGHBOR_RE = re.compile(r'^\s*neighbor (\S+) (remote-as|description) (\S+)')
+FRR_NEIGHBOR_EXTRA_RE = re.compile(r'^\s*(neighbor (\S+) (?:next-hop-self|route-reflector-client))\s*$')
+FRR_STUB_RE = re.compile(r'^\s*area (\S+) stub')
+FRR_INTERFACE_RE = re.compile(r'^interface eth(\d+)')
+FRR_COST_RE = re.compile(r'^\s*ip ospf cost (\d+)')
+FRR_REDISTRIBUTE_RE = re.compile(r'^\s*redistribute (\S+)')
+FRR_RIP_ROUTE_RE = re.compile(r'^\s*route (\S+)')
+FRR_CIDR_RE = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}/\d{1,2}$')
+# Comandi di primo livello che chiudono la sezione router corrente
+FRR_SECTION_END_RE = re.compile(r'^(?:interface|route-map|access-list|ip|ipv6|debug|log|line|end|'
+                                r'hostname|password|vrf|key|bfd)\b')
+
+# Layout delle sessioni iBGP tra i router dello stesso AS
+IBGP_LAYOUTS = ("none", "full-mesh", "route-reflector")
+
+# Righe commentate dei template da attivare nei router BGP generati: senza
+# policy esplicite FRR non scambia rotte sulle sessioni eBGP
+BGP_UNCOMMENT = {"no bgp ebgp-requires-policy", "no bgp network import-check"}
+
+# Righe dei template ripetute per ogni elemento di una lista, riconosciute
+# dai segnaposto che contengono (in ordine di priorità)
+TEMPLATE_LOOPS = (
+    ("neighbors", {"IP_ADDRESS"}),
+    ("networks", {"IP/NETMASK", "IP_ADDRESS/NETMASK"}),
+    ("areas", {"AREA_ID"}),
+)
+
+# ioctl Linux per clonare un file su filesystem copy-on-write (btrfs, xfs...)
+FICLONE = 0x40049409
+
+# renameat2(2): scambia atomicamente due percorsi esistenti (Linux >= 3.15)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+except (OSError, TypeError):  # Windows: nessuna libc da caricare
+    _libc = None
+
+# Domini di collisione internati: ogni nome è salvato una sola volta e le
+# interfacce ne conservano l'indice
+_DOMAIN_IDS = {}
+_DOMAIN_NAMES = []
+
+def intern_domain(domain):
+    """Restituisce l'indice del dominio, registrandolo se è nuovo"""
+    domain_id = _DOMAIN_IDS.get(domain)
+    if domain_id is None:
+        domain_id = _DOMAIN_IDS[domain] = len(_DOMAIN_NAMES)
+        _DOMAIN_NAMES.append(domain)
+    return domain_id
+
+@contextmanager
+def scoped_domain_interning():
+    """
+    Al termine del blocco dimentica i domini internati al suo interno: le
+    tabelle dei domini non crescono da una generazione in streaming
+    all'altra nello stesso processo. Le interfacce create nel blocco non
+    devono sopravvivergli (i loro indici non sarebbero più validi).
+    """
+    size = len(_DOMAIN_NAMES)
+    try:
+        yield
+    finally:
+        for domain in _DOMAIN_NAMES[size:]:
+            del _DOMAIN_IDS[domain]
+        del _DOMAIN_NAMES[size:]
+
+class Interface:
+    """Interfaccia ethN collegata a un dominio, con indirizzo IPv4 opzionale"""
+    __slots__ = ('eth', 'domain_id', 'address', 'prefixlen')
+    
+    def __init__(self, eth, domain, ip_address=None):
+        self.eth = eth
+        self.domain_id = intern_domain(domain)
+        self.address = self.prefixlen = None
+        if ip_address:
+            self.address, self.prefixlen = _parse_cidr(ip_address)
+    
+    @property
+    def domain(self):
+        return _DOMAIN_NAMES[self.domain_id]
+    
+    @property
+    def ip_address(self):
+        """Indirizzo in notazione 'a.b.c.d/n' (None se non assegnato)"""
+        if self.address is None:
+            return None
+        return f"{_int_to_ip(self.address)}/{self.prefixlen}"
+    
+    def __reduce__(self):
+        # Gli indici dei domini valgono solo nel processo che li ha creati
+        return Interface, (self.eth, self.domain, self.ip_address)
+
+class Route:
+    """Rotta statica di host e server (network None = rotta di default)"""
+    __slots__ = ('network', 'prefixlen', 'gateway')
+    
+    def __init__(self, network, gateway):
+        self.network = self.prefixlen = None
+        if network != "default":
+            self.network, self.prefixlen = _parse_cidr(network)
+        self.gateway = _parse_cidr(f"{gateway}/32")[0]
+    
+    @property
+    def is_default(self):
+        return self.network is None
+    
+    def as_dict(self):
+        """Rotta nel formato di parse_route"""
+        network = "default" if self.network is None else f"{_int_to_ip(self.network)}/{self.prefixlen}"
+        return {'network': network, 'gateway': _int_to_ip(self.gateway), 'is_default': self.network is None}
+
+# Chiavi di device_data salvate negli slot di Device (le altre finiscono in attributes)
+DEVICE_KEYS = {'image', 'interfaces', 'is_router', 'is_server', 'is_host', 'routing_protocol',
+               'ip_addresses', 'host_routes', 'as_number', 'ospf_area'}
+
+class Device:
+    """
+    Dispositivo del laboratorio in forma compatta: interfacce e rotte sono
+    tuple di oggetti con __slots__, indirizzi e domini sono interi. Per
+    compatibilità con il resto dello script si comporta anche come il
+    dizionario device_data: device['ip_addresses'], device.get('is_router'),
+    device['bgp_neighbors'] = [...] ecc. Le viste ('interfaces',
+    'ip_addresses', 'host_routes') sono in sola lettura (MappingProxyType e
+    tuple): la modifica sul posto non è supportata e solleva TypeError o
+    AttributeError, per cambiarle si assegna il nuovo valore
+    (device['ip_addresses'] = {...}). Le chiavi aggiuntive (bgp_neighbors,
+    ospf, route_reflector...) sono salvate in attributes.
+    """
+    __slots__ = ('image', 'kind', 'routing_protocol', 'interfaces', 'routes',
+                 'as_number', 'ospf_area', 'attributes')
+    
+    def __init__(self, image, kind, routing_protocol=None, interfaces=(), routes=(),
+                 as_number=None, ospf_area=None, attributes=None):
+        self.image = image
+        self.kind = kind
+        self.routing_protocol = routing_protocol
+        self.interfaces = tuple(interfaces)
+        self.routes = tuple(routes)
+        self.as_number = as_number
+        self.ospf_area = ospf_area
+        self.attributes = attributes
+    
+    @classmethod
+    def from_dict(cls, device_data):
+        """Converte un device_data a dizionario (un Device viene restituito com'è)"""
+        if isinstance(device_data, Device):
+            return device_data
+        if device_data.get('is_router'):
+            kind = "router"
+        elif device_data.get('is_server'):
+            kind = "server"
+        else:
+            kind = "host"
+        ip_addresses = device_data.get('ip_addresses') or {}
+        attributes = {
+            key: value for key, value in device_data.items()
+            if key not in DEVICE_KEYS and value is not None and value is not False
+        }
+        return cls(
+            device_data['image'], kind, device_data.get('routing_protocol'),
+            [Interface(eth_num, domain, ip_addresses.get(eth_num))
+             for eth_num, domain in device_data['interfaces'].items()],
+            [Route(route['network'], route['gateway']) for route in device_data.get('host_routes') or ()],
+            device_data.get('as_number'), device_data.get('ospf_area'), attributes or None
+        )
+    
+    @property
+    def is_router(self):
+        return self.kind == "router"
+    
+    @property
+    def is_server(self):
+        return self.kind == "server"
+    
+    @property
+    def is_host(self):
+        return self.kind == "host"
+    
+    def __getitem__(self, key):
+        if key in ('image', 'routing_protocol', 'as_number', 'ospf_area',
+                   'is_router', 'is_server', 'is_host'):
+            return getattr(self, key)
+        if key == 'interfaces':
+            return MappingProxyType({interface.eth: interface.domain for interface in self.interfaces})
+        if key == 'ip_addresses':
+            return MappingProxyType({interface.eth: interface.ip_address for interface in self.interfaces
+                                     if interface.address is not None})
+        if key == 'host_routes':
+            return tuple(MappingProxyType(route.as_dict()) for route in self.routes)
+        if self.attributes is None:
+            raise KeyError(key)
+        return self.attributes[key]
+    
+    def __setitem__(self, key, value):
+        if key in ('image', 'routing_protocol', 'as_number', 'ospf_area'):
+            setattr(self, key, value)
+        elif key in ('is_router', 'is_server', 'is_host'):
+            if value:
+                self.kind = key[3:]
+        elif key == 'interfaces':
+            ip_addresses = self['ip_addresses']
+            self.interfaces = tuple(Interface(eth_num, domain, ip_addresses.get(eth_num))
+                                    for eth_num, domain in value.items())
+        elif key == 'ip_addresses':
+            for interface in self.interfaces:
+                interface.address = interface.prefixlen = None
+                if value.get(interface.eth):
+                    interface.address, interface.prefixlen = _parse_cidr(value[interface.eth])
+        elif key == 'host_routes':
+            self.routes = tuple(Route(route['network'], route['gateway']) for route in value)
+        else:
+            if self.attributes is None:
+                self.attributes = {}
+            self.attributes[key] = value
+    
+    def __contains__(self, key):
+        return key in DEVICE_KEYS or (self.attributes is not None and key in self.attributes)
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+    
+    def as_dict(self):
+        """Converte il dispositivo nel device_data a dizionario (con viste modificabili)"""
+        device_data = {key: self[key] for key in DEVICE_KEYS}
+        device_data['interfaces'] = dict(device_data['interfaces'])
+        device_data['ip_addresses'] = dict(device_data['ip_addresses'])
+        device_data['host_routes'] = [dict(route) for route in device_data['host_routes']]
+        device_data.update(self.attributes or {})
+        return device_data
+
+# Fasi misurate quando il profiling è attivo (None = disattivato) e
+# operazioni sul filesystem dovute alla sola lettura di /proc/self/io
+_profile_stages = None
+_io_overhead = 0
+
+def enable_profiling():
+    """Attiva la misura delle fasi della generazione"""
+    global _profile_stages, _io_overhead
+    _profile_stages = []
+    before, after = _io_counters(), _io_counters()
+    _io_overhead = after.get('syscr', 0) - before.get('syscr', 0)
+
+def _io_counters():
+    """Contatori di I/O del processo da /proc/self/io (vuoto se non disponibile)"""
+    try:
+        with open("/proc/self/io", 'r') as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f.read().splitlines())}
+    except (OSError, ValueError):
+        return {}
+
+@contextmanager
+def profile_stage(name):
+    """
+    Misura una fase della generazione: tempo, byte scritti (compresi i
+    messaggi a terminale) e operazioni di lettura/scrittura sul filesystem
+    (da /proc/self/io). Il blocco può
+    indicare i file prodotti in stage['files']. Se il profiling non è
+    attivo non misura nulla.
+    """
+    if _profile_stages is None:
+        yield {}
+        return
+    
+    stage = {'name': name, 'files': None}
+    before = _io_counters()
+    start = time.perf_counter()
+    try:
+        yield stage
+    finally:
+        stage['seconds'] = time.perf_counter() - start
+        after = _io_counters()
+        stage['bytes'] = after.get('wchar', 0) - before.get('wchar', 0) if after else None
+        stage['fs_ops'] = (after.get('syscr', 0) + after.get('syscw', 0)
+                           - before.get('syscr', 0) - before.get('syscw', 0) - _io_overhead) if after else None
+        _profile_stages.append(stage)
+
+def show_profile():
+    """Mostra il tempo, i file, i byte e le operazioni di ogni fase misurata"""
+    if not _profile_stages:
+        return
+    total = sum(stage['seconds'] for stage in _profile_stages)
+    
+    print(f"\n⏱️  PROFILO DELLA GENERAZIONE")
+    print("-" * 66)
+    print(f"{'fase':<22} {'secondi':>9} {'%':>5} {'file':>8} {'byte scritti':>12} {'op. fs':>7}")
+    for stage in _profile_stages:
+        share = stage['seconds'] / total * 100 if total else 0.0
+        files = stage['files'] if stage['files'] is not None else "-"
+        written = stage['bytes'] if stage['bytes'] is not None else "-"
+        fs_ops = stage['fs_ops'] if stage['fs_ops'] is not None else "-"
+        print(f"{stage['name']:<22} {stage['seconds']:>9.3f} {share:>5.1f} {files:>8} {written:>12} {fs_ops:>7}")
+    print(f"{'totale':<22} {total:>9.3f}")
+
+def welcome():
+    """Mostra messaggio di benvenuto"""
+    print("=" * 50)
+    print("🌐 KATHARA LAB CREATOR")
+    print("=" * 50)
+    print("Creatore semplificato per laboratori Kathara")
+    print("Questo strumento ti aiuterà a creare il file lab.conf")
+    print("e i file .startup per ogni dispositivo")
+    print("=" * 50)
+    print()
+
+def show_existing_labs(protocol=None, min_routers=None, max_routers=None, name=None):
+    """Mostra i laboratori già creati (filtrati) con i metadati del catalogue"""
+    created_labs_dir = Path("created_labs")
+    
+    if created_labs_dir.exists():
+        labs = search_labs(created_labs_dir, protocol, min_routers, max_routers, name)
+        if labs:
+            print("\n📚 Laboratori esistenti in created_labs/:")
+            for lab_name, entry in labs:
+                protocols = ", ".join(entry['protocols']) or "nessun protocollo"
+                print(f"   • {lab_name}: {entry['devices']} dispositivi ({entry['routers']} router, "
+                      f"{entry['hosts']} host, {entry['servers']} server), {entry['domains']} domini, "
+                      f"{protocols} - modificato {entry['modified']}")
+        else:
+            print("\n📚 Nessun laboratorio trovato in created_labs/")
+    else:
+        print("\n📚 Directory created_labs/ non esistente (verrà creata)")
+
+def check_device_name(device_name):
+    """Verifica un nome di dispositivo; restituisce il messaggio d'errore o None"""
+    if not device_name:
+        return "Il nome non può essere vuoto!"
+    
+    # Verifica caratteri validi (lettere, numeri, underscore, trattino)
+    # Permette nomi come: r1, pc1, br1r, br2r, web-server, db_1, etc.
+    if not all(c.isalnum() or c in ('_', '-') for c in device_name):
+        return "Il nome può contenere solo lettere, numeri, - e _"
+    
+    # Il nome deve iniziare con una lettera o numero (non con - o _)
+    if not device_name[0].isalnum():
+        return "Il nome deve iniziare con una lettera o un numero"
+    
+    return None
+
+def check_domain_name(domain):
+    """Verifica un dominio di collisione; restituisce il messaggio d'errore o None"""
+    if not domain:
+        return "Il dominio di collisione non può essere vuoto!"
+    
+    # Verifica che sia un nome valido (lettere e numeri)
+    if not domain.replace('_', '').replace('-', '').isalnum():
+        return "Il dominio può contenere solo lettere, numeri, - e _"
+    
+    return None
+
+def check_ospf_area(area):
+    """
+    Verifica un'area OSPF, numero (1) o in notazione puntata (0.0.0.1);
+    restituisce il messaggio d'errore o None
+    """
+    if isinstance(area, bool) or not isinstance(area, (int, str)):
+        return f"area OSPF '{area}' non valida (es. 0.0.0.0 o 1)"
+    area = str(area).strip()
+    try:
+        ipaddress.IPv4Address(int(area) if area.isdigit() else area)
+    except ValueError:
+        return f"area OSPF '{area}' non valida (es. 0.0.0.0 o 1)"
+    return None
+
+def _check_octets(octets, what):
+    """Verifica una lista di ottetti IPv4; restituisce il messaggio d'errore o None"""
+    if len(octets) != 4:
+        return f"{what} deve avere 4 ottetti!"
+    
+    for octet in octets:
+        octet_int = int(octet)
+        if octet_int < 0 or octet_int > 255:
+            return f"Ottetto {octet} non valido! Deve essere tra 0 e 255."
+    
+    return None
+
+def check_ip_address(ip_input):
+    """
+    Verifica un indirizzo nel formato IP/NETMASK (es. 10.0.0.1/24);
+    restituisce il messaggio d'errore o None
+    """
+    if not ip_input:
+        return "L'indirizzo IP non può essere vuoto!"
+    
+    if '/' not in ip_input:
+        return "Formato non valido! Usa il formato: IP/NETMASK (es. 10.0.0.1/24)"
+    
+    try:
+        ip_part, netmask = ip_input.split('/')
+        
+        # Verifica che la netmask sia un numero
+        netmask_int = int(netmask)
+        if netmask_int < 0 or netmask_int > 32:
+            return "La netmask deve essere tra 0 e 32!"
+        
+        # Verifica formato IP (deve avere 4 ottetti validi)
+        return _check_octets(ip_part.split('.'), "L'indirizzo IP")
+    
+    except ValueError:
+        return "Formato non valido! Usa il formato: IP/NETMASK (es. 10.0.0.1/24)"
+
+def parse_route(route_input):
+    """
+    Interpreta una rotta nel formato 'RETE/NETMASK via GATEWAY' o
+    'default via GATEWAY'. Restituisce (rotta, None) oppure (None, errore)
+    """
+    invalid = "Formato non valido! Usa: RETE/NETMASK via GATEWAY o default via GATEWAY"
+    
+    # Verifica formato base
+    if ' via ' not in route_input.lower():
+        return None, invalid
+    
+    try:
+        # Split in parti
+        parts = route_input.lower().split(' via ')
+        if len(parts) != 2:
+            return None, invalid
+        
+        network, gateway = parts[0].strip(), parts[1].strip()
+        
+        # Verifica se è la rotta di default
+        is_default = (network == 'default')
+        
+        if not is_default:
+            # Verifica che la rete abbia la netmask
+            if '/' not in network:
+                return None, "La rete deve includere la netmask (es. 192.168.2.0/24) o usare 'default'"
+            
+            # Verifica formato network
+            net_part, netmask = network.split('/')
+            netmask_int = int(netmask)
+            if netmask_int < 0 or netmask_int > 32:
+                return None, "La netmask deve essere tra 0 e 32!"
+            
+            error = _check_octets(net_part.split('.'), "La rete")
+            if error:
+                return None, error
+        
+        # Verifica formato IP del gateway
+        error = _check_octets(gateway.split('.'), "Il gateway")
+        if error:
+            return None, error
+        
+        return {'network': network, 'gateway': gateway, 'is_default': is_default}, None
+    
+    except ValueError:
+        return None, invalid
+
+def get_lab_name():
+    """Chiede il nome del laboratorio"""
+    while True:
+        lab_name = input("Nome del laboratorio: ").strip()
+        if lab_name:
+            return lab_name
+        print("❌ Il nome del laboratorio non può essere vuoto!")
+
+def get_devices():
+    """Chiede il numero di dispositivi e i loro nomi"""
+    devices = []
+    
+    # Chiedi numero di dispositivi
+    while True:
+        try:
+            num_devices = int(input("Quanti dispositivi vuoi nel laboratorio? "))
+            if num_devices > 0:
+                break
+            else:
+                print("❌ Devi avere almeno 1 dispositivo!")
+        except ValueError:
+            print("❌ Inserisci un numero valido!")
+    
+    print(f"\nOra inserisci i nomi dei {num_devices} dispositivi:")
+    
+    # Chiedi nome di ogni dispositivo
+    for i in range(num_devices):
+        while True:
+            device_name = input(f"Nome dispositivo {i+1}: ").strip()
+            
+            # Verifica che il nome sia valido
+            error = check_device_name(device_name)
+            if error:
+                print(f"❌ {error}")
+                continue
+            
+            # Verifica che non sia duplicato
+            if device_name in devices:
+                print("❌ Nome già esistente! Scegli un nome diverso.")
+                continue
+            
+            devices.append(device_name)
+            print(f"✅ Dispositivo '{device_name}' aggiunto")
+            break
+    
+    return devices
+
+def choose_device_type(device_name):
+    """Chiede il tipo di dispositivo per scegliere l'immagine Docker"""
+    print(f"\nChe tipo di dispositivo è '{device_name}'?")
+    print("1. Router (kathara/frr)")
+    print("2. Host (kathara/base)")
+    print("3. Server (kathara/base)")
+    
+    images = {
+        "1": "kathara/frr",
+        "2": "kathara/base", 
+        "3": "kathara/base"
+    }
+    
+    # Tipi considerati router (che necessitano configurazione routing)
+    router_types = {"1"}
+    server_types = {"3"}
+    
+    while True:
+        choice = input("Scegli tipo (1-3): ").strip()
+        
+        if choice in images:
+            is_router = choice in router_types
+            is_server = choice in server_types
+            return images[choice], is_router, is_server
+        else:
+            print("❌ Scelta non valida! Scegli 1, 2 o 3.")
+
+def get_device_interfaces(device_name):
+    """Chiede quante interfacce ha il dispositivo e i domini di collisione"""
+    print(f"\n🔌 Configurazione interfacce per '{device_name}'")
+    
+    # Chiedi numero di interfacce
+    while True:
+        try:
+            num_interfaces = int(input(f"Quante porte ethernet ha '{device_name}'? "))
+            if num_interfaces >= 0:
+                break
+            else:
+                print("❌ Il numero di interfacce non può essere negativo!")
+        except ValueError:
+            print("❌ Inserisci un numero valido!")
+    
+    interfaces = {}
+    used_domains = set()
+    
+    # Per ogni interfaccia, chiedi il dominio di collisione
+    for i in range(num_interfaces):
+        print(f"\nInterfaccia eth{i} di '{device_name}':")
+        
+        while True:
+            domain = input(f"Dominio di collisione per eth{i} (es. A, B, C...): ").strip().upper()
+            
+            # Verifica che sia un nome valido (lettere, numeri, - e _)
+            error = check_domain_name(domain)
+            if error:
+                print(f"❌ {error}")
+                continue
+            
+            # Suggerimento se non è una lettera maiuscola singola
+            if len(domain) > 1 or not domain.isalpha():
+                confirm = input(f"⚠️  Di solito si usano lettere singole (A, B, C...). Confermi '{domain}'? (s/N): ").strip().lower()
+                if confirm != 's':
+                    continue
+            
+            interfaces[i] = domain
+            used_domains.add(domain)
+            print(f"✅ eth{i} → {domain}")
+            break
+    
+    return interfaces, used_domains
+
+def get_router_ip_addresses(device_name, interfaces):
+    """Chiede gli indirizzi IP per ogni interfaccia del router"""
+    print(f"\n🌐 Configurazione indirizzi IP per router '{device_name}'")
+    ip_config = {}
+    
+    for eth_num in sorted(interfaces.keys()):
+        domain = interfaces[eth_num]
+        print(f"\nInterfaccia eth{eth_num} (dominio {domain}):")
+        
+        while True:
+            ip_input = input(f"Indirizzo IP per eth{eth_num} (formato: 10.0.0.1/24): ").strip()
+            
+            error = check_ip_address(ip_input)
+            if error:
+                print(f"❌ {error}")
+                continue
+            
+            # Salva la configurazione
+            ip_config[eth_num] = ip_input
+            print(f"✅ eth{eth_num} → {ip_input}")
+            break
+    
+    return ip_config
+
+def get_host_server_ip_addresses(device_name, device_type, interfaces):
+    """Chiede gli indirizzi IP per ogni interfaccia di host/server"""
+    print(f"\n🌐 Configurazione indirizzi IP per {device_type} '{device_name}'")
+    print("Vuoi configurare gli indirizzi IP per questo dispositivo?")
+    
+    configure_ips = input("Configura IP? (s/N): ").strip().lower()
+    
+    if configure_ips != 's':
+        return {}
+    
+    ip_config = {}
+    
+    for eth_num in sorted(interfaces.keys()):
+        domain = interfaces[eth_num]
+        print(f"\nInterfaccia eth{eth_num} (dominio {domain}):")
+        
+        while True:
+            ip_input = input(f"Indirizzo IP per eth{eth_num} (formato: 10.0.0.1/24 o invio per saltare): ").strip()
+            
+            # Permetti di saltare l'interfaccia
+            if not ip_input:
+                print(f"⏭️  eth{eth_num} saltata (verrà commentata nel file .startup)")
+                break
+            
+            error = check_ip_address(ip_input)
+            if error:
+                print(f"❌ {error}")
+                continue
+            
+            # Salva la configurazione
+            ip_config[eth_num] = ip_input
+            print(f"✅ eth{eth_num} → {ip_input}")
+            break
+    
+    return ip_config
+
+def get_host_routes(device_name):
+    """Chiede le rotte da aggiungere per un host"""
+    print(f"\n🛣️  Configurazione rotte per host '{device_name}'")
+    print("Vuoi aggiungere rotte statiche per questo host?")
+    
+    add_routes = input("Aggiungi rotte? (s/N): ").strip().lower()
+    
+    if add_routes != 's':
+        return []
+    
+    routes = []
+    print("\nInserisci le rotte (lascia vuoto per terminare)")
+    print("Formato rotta di default: default via GATEWAY (es. default via 192.168.1.1)")
+    print("Formato rotta specifica: RETE/NETMASK via GATEWAY (es. 192.168.2.0/24 via 192.168.1.1)")
+    
+    while True:
+        route_input = input(f"Rotta {len(routes) + 1} (o invio per terminare): ").strip()
+        
+        if not route_input:
+            break
+        
+        route, error = parse_route(route_input)
+        if error:
+            print(f"❌ {error}")
+            continue
+        
+        # Salva la rotta
+        routes.append(route)
+        if route['is_default']:
+            print(f"✅ Rotta di default aggiunta: via {route['gateway']}")
+        else:
+            print(f"✅ Rotta aggiunta: {route['network']} via {route['gateway']}")
+    
+    return routes
+
+def choose_routing_protocol(device_name):
+    """Chiede quale protocollo di routing usa il router"""
+    print(f"\n🔀 Configurazione routing per '{device_name}'")
+    print("Quale protocollo di routing usa questo router?")
+    print("1. OSPF (Open Shortest Path First)")
+    print("2. RIP (Routing Information Protocol)")
+    print("3. BGP (Border Gateway Protocol)")
+    
+    while True:
+        choice = input("Scegli protocollo (1-3): ").strip()
+        
+        if choice == "1":
+            return "ospf"
+        elif choice == "2":
+            return "rip"
+        elif choice == "3":
+            return "bgp"
+        else:
+            print("❌ Scelta non valida! Scegli 1, 2 o 3.")
+
+@lru_cache(maxsize=None)
+def _cached_digest(path, mtime_ns, size):
+    """SHA-256 di un template, ricalcolato solo se il file cambia"""
+    return file_digest(path)
+
+@lru_cache(maxsize=None)
+def _cached_template(path, mtime_ns, size):
+    """Contenuto di un template, riletto solo se il file cambia"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def read_template(path):
+    """Legge un template di fileConfigurazione/ usando la cache"""
+    stat = path.stat()
+    return _cached_template(str(path), stat.st_mtime_ns, stat.st_size)
+
+def file_digest(path):
+    """Calcola lo SHA-256 del contenuto di un file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_file(source_file, store_dir):
+    """
+    Inserisce un file nello store indirizzato per contenuto
+    (store_dir/<ab>/<sha256>) e ne restituisce il percorso. I file dello
+    store sono in sola lettura: con gli hardlink una modifica "sul posto"
+    cambierebbe tutti i laboratori che lo condividono.
+    """
+    stat = source_file.stat()
+    digest = _cached_digest(str(source_file), stat.st_mtime_ns, stat.st_size)
+    blob = store_dir / digest[:2] / digest
+    
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        # Scrivi su un file temporaneo e rinominalo: più laboratori (o
+        # thread) possono inserire lo stesso contenuto contemporaneamente
+        tmp_blob = blob.with_name(f"{digest}.{os.getpid()}.{id(blob)}.tmp")
+        shutil.copyfile(source_file, tmp_blob)
+        tmp_blob.chmod(0o444)
+        os.replace(tmp_blob, blob)
+    
+    return blob
+
+def store_content(content, store_dir):
+    """Come store_file, per un contenuto generato (bytes) invece di un template"""
+    digest = hashlib.sha256(content).hexdigest()
+    blob = store_dir / digest[:2] / digest
+    
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_blob = blob.with_name(f"{digest}.{os.getpid()}.{id(blob)}.tmp")
+        tmp_blob.write_bytes(content)
+        tmp_blob.chmod(0o444)
+        os.replace(tmp_blob, blob)
+    
+    return blob
+
+def _copy_source(source, dest_file):
+    """Copia un template (percorso) o scrive un contenuto generato (bytes)"""
+    if isinstance(source, bytes):
+        dest_file.write_bytes(source)
+    else:
+        shutil.copy2(source, dest_file)
+
+def _reflink(source_file, dest_file):
+    """Clona un file con FICLONE; solleva OSError se non supportato"""
+    if fcntl is None:
+        raise OSError("reflink non supportato su questa piattaforma")
+    with open(source_file, 'rb') as src, open(dest_file, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            dest_file.unlink()
+            raise
+
+def install_file(source_file, dest_file, link_mode="copy", store_dir=None):
+    """
+    Installa source_file in dest_file secondo la strategia richiesta:
+      - copy:     copia indipendente (shutil.copy2)
+      - hardlink: hardlink al file nello store indirizzato per contenuto
+      - reflink:  clone copy-on-write del file nello store
+      - symlink:  link simbolico relativo al file nello store
+    source_file può essere anche il contenuto (bytes) di un file generato
+    uguale tra più dispositivi, come i daemons (vedi render_daemons).
+    I file personalizzati dall'utente (CUSTOMISED_FILES) vengono sempre
+    copiati. Se la strategia non è supportata dal filesystem (es. hardlink
+    tra dispositivi diversi, reflink su ext4) ricade sulla copia.
+    Restituisce la strategia effettivamente usata.
+    """
+    if link_mode == "copy" or store_dir is None or dest_file.name in CUSTOMISED_FILES:
+        _copy_source(source_file, dest_file)
+        return "copy"
+    
+    if isinstance(source_file, bytes):
+        blob = store_content(source_file, store_dir)
+    else:
+        blob = store_file(source_file, store_dir)
+    if dest_file.exists() or dest_file.is_symlink():
+        dest_file.unlink()
+    
+    try:
+        if link_mode == "hardlink":
+            os.link(blob, dest_file)
+        elif link_mode == "reflink":
+            _reflink(blob, dest_file)
+        elif link_mode == "symlink":
+            os.symlink(os.path.relpath(blob, dest_file.parent), dest_file)
+        else:
+            raise ValueError(f"strategia '{link_mode}' non valida! Usa {', '.join(LINK_MODES)}")
+    except OSError:
+        _copy_source(source_file, dest_file)
+        return "copy"
+    
+    return link_mode
+
+@lru_cache(maxsize=None)
+def _compile_template(path, mtime_ns, size):
+    """
+    Compila un template frr.conf in una sequenza di blocchi:
+      - (None, riga): testo o commento copiato così com'è;
+      - ("", [riga]): riga con segnaposto singoli (es. router bgp <AS_NUMBER>);
+      - (lista, [righe]): righe consecutive ripetute per ogni elemento di
+        una lista del contesto (vedi TEMPLATE_LOOPS). Le righe identiche
+        nello stesso blocco, messe nel template come esempio, vengono
+        unite.
+    Ogni riga compilata è una coppia (testo, nomi dei segnaposto).
+    Il risultato è in cache finché il template non cambia.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines(keepends=True)
+    
+    blocks = []
+    for line in lines:
+        names = tuple(PLACEHOLDER_RE.findall(line))
+        if not names or line.lstrip().startswith('!'):
+            blocks.append((None, line))
+            continue
+        
+        loop = next((key for key, triggers in TEMPLATE_LOOPS if triggers.intersection(names)), "")
+        if loop and blocks and blocks[-1][0] == loop:
+            if (line, names) not in blocks[-1][1]:
+                blocks[-1][1].append((line, names))
+        else:
+            blocks.append((loop, [(line, names)]))
+    
+    return tuple((loop, tuple(body) if loop is not None else body) for loop, body in blocks)
+
+def compile_template(path):
+    """Restituisce il template compilato (vedi _compile_template)"""
+    stat = path.stat()
+    return _compile_template(str(path), stat.st_mtime_ns, stat.st_size)
+
+def render_template(path, context):
+    """
+    Riempie un template compilato con il contesto:
+      - context['scalars']: valori dei segnaposto singoli;
+      - context[<lista>]: elementi (dizionari) per i blocchi ripetuti.
+    Le righe con segnaposto che il contesto non sa riempire (es. nomi di
+    prefix-list e route-map) vengono lasciate come commento, una volta
+    sola, così il file resta caricabile da FRR ma l'esempio non si perde.
+    I blocchi ripetuti di una lista vuota vengono omessi.
+    
+    Inoltre context['uncomment'] elenca le righe commentate del template
+    da attivare, e il campo 'extra' di un elemento aggiunge righe dopo il
+    suo blocco (es. neighbor X route-reflector-client).
+    """
+    scalars = context.get('scalars', {})
+    uncomment = context.get('uncomment', ())
+    output = []
+    
+    def fill(line, values):
+        return PLACEHOLDER_RE.sub(lambda match: str(values[match.group(1)]), line)
+    
+    for loop, body in compile_template(path):
+        if loop is None:
+            if uncomment and body.lstrip('! \t').rstrip() in uncomment:
+                body = body.lstrip('! \t')
+            output.append(body)
+            continue
+        
+        rows = context.get(loop, []) if loop else [{}]
+        if not rows:
+            continue
+        
+        resolvable = []
+        for line, names in body:
+            if all(name in rows[0] or scalars.get(name) is not None for name in names):
+                resolvable.append(line)
+            else:
+                output.append(f"!{line}")
+        
+        for row in rows:
+            values = {**scalars, **row}
+            for line in resolvable:
+                output.append(fill(line, values))
+            for extra in row.get('extra', ()):
+                output.append(f"{extra}\n")
+    
+    return "".join(output)
+
+def router_networks(device_data):
+    """Restituisce le reti collegate a un router come righe per i template"""
+    networks = []
+    area = device_data.get('ospf_area') or "0.0.0.0"
+    interface_areas = device_data.get('ospf', {}).get('areas', {})
+    ip_addresses = device_data.get('ip_addresses', {})
+    for eth_num in sorted(ip_addresses):
+        address, prefixlen = _parse_cidr(ip_addresses[eth_num])
+        host_bits = 32 - prefixlen
+        network = f"{_int_to_ip((address >> host_bits) << host_bits)}/{prefixlen}"
+        networks.append({'IP/NETMASK': network, 'IP_ADDRESS/NETMASK': network,
+                         'AREA_ID': interface_areas.get(eth_num, area), 'eth': eth_num})
+    return networks
+
+def device_as_number(device_name, device_data):
+    """AS di un router: esplicito (as_number) o ricavato dal nome (asNrM)"""
+    if device_data.get('as_number') is not None:
+        return device_data['as_number']
+    match = AS_NAME_RE.match(device_name)
+    return int(match.group(1)) if match else None
+
+def _is_bgp_router(device_data):
+    """Verifica se un dispositivo è un router BGP"""
+    return device_data.get('is_router') and device_data.get('routing_protocol') == "bgp"
+
+def router_neighbors(device_name, devices_info, domain_index):
+    """
+    Restituisce le sessioni eBGP di un router come righe per i template:
+    una per ogni router BGP di un altro AS che condivide un dominio di
+    collisione, con l'IP sul dominio comune, il suo AS e il suo nome.
+    Costo proporzionale alle interfacce dei domini del router.
+    """
+    device_data = devices_info[device_name]
+    local_as = device_as_number(device_name, device_data)
+    neighbors = []
+    interfaces = device_data['interfaces']
+    for eth_num in sorted(interfaces):
+        for member, member_eth in domain_index[interfaces[eth_num]]:
+            member_data = devices_info[member]
+            if member == device_name or not _is_bgp_router(member_data):
+                continue
+            member_addresses = member_data.get('ip_addresses', {})
+            if member_eth not in member_addresses:
+                continue
+            # Senza AS non si può scrivere il remote-as: il vicino resta escluso
+            remote_as = device_as_number(member, member_data)
+            if remote_as is None or remote_as == local_as:
+                continue
+            neighbors.append({
+                'IP_ADDRESS': member_addresses[member_eth].split('/')[0],
+                'AS_NUMBER': remote_as,
+                'router name': member,
+            })
+    return neighbors
+
+def derive_bgp_sessions(devices_info, ibgp="none"):
+    """
+    Calcola tutte le sessioni BGP del laboratorio e le salva in
+    'bgp_neighbors' di ogni router BGP, usate poi da render_frr_conf:
+      - eBGP tra router di AS diversi che condividono un dominio di
+        collisione (vedi router_neighbors);
+      - iBGP tra i router dello stesso AS secondo il layout richiesto:
+        "none", "full-mesh" (ogni coppia) o "route-reflector" (un riflettore
+        per AS, il router con route_reflector: true o il primo in ordine
+        naturale, a cui si collegano tutti gli altri). Le sessioni iBGP
+        usano il primo indirizzo del router remoto, raggiungibile tramite
+        l'IGP, e next-hop-self.
+    L'AS mancante viene ricavato dal nome (asNrM). Le sessioni eBGP si
+    ricavano dall'indice dominio -> interfacce in O(E); il full-mesh è
+    per natura quadratico nel numero di router di ogni AS.
+    Restituisce {AS: [router]} dei router BGP.
+    """
+    if ibgp not in IBGP_LAYOUTS:
+        raise ValueError(f"layout iBGP '{ibgp}' non valido! Usa {', '.join(IBGP_LAYOUTS)}")
+    
+    domain_index = build_domain_index(devices_info)
+    as_members = {}
+    
+    for device_name, device_data in devices_info.items():
+        if not _is_bgp_router(device_data):
+            continue
+        as_number = device_as_number(device_name, device_data)
+        if as_number is None:
+            continue
+        device_data['as_number'] = as_number
+        device_data['bgp_neighbors'] = router_neighbors(device_name, devices_info, domain_index)
+        if device_data.get('ip_addresses'):
+            as_members.setdefault(as_number, []).append(device_name)
+    
+    def ibgp_session(local, remote, extra=()):
+        remote_data = devices_info[remote]
+        remote_addresses = remote_data['ip_addresses']
+        address = remote_addresses[min(remote_addresses)].split('/')[0]
+        devices_info[local]['bgp_neighbors'].append({
+            'IP_ADDRESS': address,
+            'AS_NUMBER': remote_data['as_number'],
+            'router name': remote,
+            'extra': [f"neighbor {address} next-hop-self", *(line.format(address) for line in extra)],
+        })
+    
+    for as_number, members in as_members.items():
+        if ibgp == "none" or len(members) < 2:
+            continue
+        members.sort(key=_natural_key)
+        
+        if ibgp == "full-mesh":
+            for local in members:
+                for remote in members:
+                    if local != remote:
+                        ibgp_session(local, remote)
+        else:
+            reflector = next((name for name in members if devices_info[name].get('route_reflector')),
+                             members[0])
+            for client in members:
+                if client != reflector:
+                    ibgp_session(reflector, client, ["neighbor {} route-reflector-client"])
+                    ibgp_session(client, reflector)
+    
+    return as_members
+
+def _is_ospf_router(device_data):
+    """Verifica se un dispositivo è un router OSPF"""
+    return device_data.get('is_router') and device_data.get('routing_protocol') == "ospf"
+
+def partition_ospf_areas(devices_info, backbone_radius=1):
+    """
+    Suddivide i domini di collisione dei router OSPF in aree:
+      - il backbone (0.0.0.0) contiene i domini del router con più
+        interfacce e quelli raggiungibili da lì attraversando al massimo
+        backbone_radius router;
+      - ogni gruppo connesso dei domini restanti diventa un'area
+        (0.0.0.1, 0.0.0.2, ...). Un gruppo è connesso a sé stesso solo
+        tramite router interni, quindi ogni area tocca il backbone
+        attraverso almeno un ABR e nessun router sta in due aree non
+        backbone.
+    Le isole OSPF scollegate ricevono ognuna il proprio backbone.
+    Due visite BFS sul grafo bipartito router/domini: tempo lineare nel
+    numero di interfacce. Restituisce {dominio: area}.
+    """
+    domain_index = build_domain_index(devices_info)
+    
+    # Domini OSPF di ogni router e router OSPF di ogni dominio
+    router_domains = {}
+    for device_name, device_data in devices_info.items():
+        if _is_ospf_router(device_data):
+            interfaces = device_data['interfaces']
+            router_domains[device_name] = [interfaces[eth_num]
+                                           for eth_num in sorted(device_data.get('ip_addresses', {}))]
+    domain_routers = {
+        domain: [member for member, _ in members if member in router_domains]
+        for domain, members in domain_index.items()
+    }
+    
+    def neighbours(domain):
+        for router in domain_routers[domain]:
+            yield from router_domains[router]
+    
+    areas = {}
+    next_area = 1
+    # Radici in ordine di grado decrescente (a parità, ordine di devices_info)
+    roots = sorted(router_domains, key=lambda name: -len(router_domains[name]))
+    
+    for root in roots:
+        if not router_domains[root] or router_domains[root][0] in areas:
+            continue
+        
+        # BFS dal router radice: distanza in router attraversati
+        depth = {}
+        queue = deque()
+        for domain in router_domains[root]:
+            if domain not in depth and domain not in areas:
+                depth[domain] = 0
+                queue.append(domain)
+        while queue:
+            domain = queue.popleft()
+            for next_domain in neighbours(domain):
+                if next_domain not in depth and next_domain not in areas:
+                    depth[next_domain] = depth[domain] + 1
+                    queue.append(next_domain)
+        
+        for domain, distance in depth.items():
+            if distance <= backbone_radius:
+                areas[domain] = "0.0.0.0"
+        
+        # Componenti connesse dei domini fuori dal backbone
+        for domain in depth:
+            if domain in areas:
+                continue
+            area = _int_to_ip(next_area)
+            next_area += 1
+            areas[domain] = area
+            queue.append(domain)
+            while queue:
+                current = queue.popleft()
+                for next_domain in neighbours(current):
+                    if next_domain not in areas:
+                        areas[next_domain] = area
+                        queue.append(next_domain)
+    
+    return areas
+
+def apply_ospf_areas(devices_info, domain_areas=None, stub_areas=False, costs=None):
+    """
+    Salva in 'ospf' di ogni router OSPF le aree delle sue interfacce,
+    le aree stub a cui partecipa e i costi delle interfacce, usati da
+    render_frr_conf per le righe 'network <rete> area <area>',
+    'area <area> stub' e 'ip ospf cost'.
+      - domain_areas: {dominio: area}; i domini non elencati usano
+        l'ospf_area del router (default 0.0.0.0);
+      - stub_areas: se True tutte le aree diverse dal backbone sono stub,
+        oppure l'elenco delle aree stub;
+      - costs: {dominio: costo} delle interfacce collegate al dominio.
+    """
+    domain_areas = domain_areas or {}
+    costs = costs or {}
+    
+    for device_data in devices_info.values():
+        if not _is_ospf_router(device_data):
+            continue
+        default_area = device_data.get('ospf_area') or "0.0.0.0"
+        interface_areas = {}
+        interface_costs = {}
+        interfaces = device_data['interfaces']
+        for eth_num in sorted(device_data.get('ip_addresses', {})):
+            domain = interfaces[eth_num]
+            interface_areas[eth_num] = domain_areas.get(domain, default_area)
+            if domain in costs:
+                interface_costs[eth_num] = int(costs[domain])
+        stub = []
+        if stub_areas:
+            stub = sorted({area for area in interface_areas.values() if area != "0.0.0.0"
+                           and (stub_areas is True or area in stub_areas)},
+                          key=lambda area: ipaddress.IPv4Address(area))
+        device_data['ospf'] = {'areas': interface_areas, 'stub': stub, 'costs': interface_costs}
+
+def render_frr_conf(device_name, devices_info, domain_index=None):
+    """
+    Genera il frr.conf di un router riempiendo il template del suo
+    protocollo con le reti collegate (da ip_addresses), le sessioni BGP
+    (quelle calcolate da derive_bgp_sessions o, in sua assenza, le
+    sessioni eBGP con i router vicini) e gli attributi del router
+    (as_number, ospf_area, aree e costi calcolati da apply_ospf_areas).
+    Restituisce None se il router non ha
+    indirizzi, se il template manca o se manca l'AS di un router BGP: in
+    questi casi il template viene copiato com'è, da completare a mano.
+    """
+    device_data = devices_info[device_name]
+    routing_protocol = device_data.get('routing_protocol')
+    template = Path("fileConfigurazione") / routing_protocol / "frr.conf"
+    as_number = device_as_number(device_name, device_data)
+    
+    if not device_data.get('ip_addresses') or not template.exists():
+        return None
+    if routing_protocol == "bgp" and as_number is None:
+        return None
+    
+    neighbors = []
+    if routing_protocol == "bgp":
+        neighbors = device_data.get('bgp_neighbors')
+        if neighbors is None:
+            if domain_index is None:
+                domain_index = build_domain_index(devices_info)
+            neighbors = router_neighbors(device_name, devices_info, domain_index)
+    
+    ospf = device_data.get('ospf', {})
+    frr_conf = render_template(template, {
+        'scalars': {
+            'AS_NUMBER': as_number,
+            'AREA_ID': device_data.get('ospf_area') or "0.0.0.0",
+        },
+        'networks': router_networks(device_data),
+        'neighbors': neighbors,
+        'areas': [{'AREA_ID': area} for area in ospf.get('stub', [])],
+        'uncomment': BGP_UNCOMMENT if routing_protocol == "bgp" else (),
+    })
+    
+    # Costi OSPF: una sezione interface prima di router ospf
+    if ospf.get('costs'):
+        interface_sections = "".join(f"interface eth{eth_num}\n ip ospf cost {cost}\n!\n"
+                                     for eth_num, cost in sorted(ospf['costs'].items()))
+        frr_conf = frr_conf.replace("\nrouter ospf\n", f"\n{interface_sections}router ospf\n", 1)
+    
+    return frr_conf
+
+def frr_daemons(frr_conf):
+    """Demoni FRR (bgpd, ospfd, ripd...) usati dalle sezioni di un frr.conf"""
+    return {FRR_DAEMONS[next(filter(None, match.groups()))] for match in FRR_DAEMON_RE.finditer(frr_conf)}
+
+def zebra_buffer_size(expected_routes):
+    """
+    Dimensione del buffer netlink di zebra (-s) per il numero di rotte
+    atteso, arrotondata alla potenza di 2 successiva: aggiungere qualche
+    rete al laboratorio non cambia il file daemons di tutti i router (e
+    la rigenerazione incrementale resta minima)
+    """
+    size = max(ZEBRA_BUFFER_MIN, expected_routes * ZEBRA_BUFFER_PER_ROUTE)
+    return 1 << (size - 1).bit_length()
+
+def render_daemons(routing_protocol, frr_conf=None, expected_routes=None):
+    """
+    Genera il file daemons di un router a partire dal template del suo
+    protocollo: sono attivati solo i demoni usati davvero dal frr.conf
+    (quello generato o, se None, il template) e, se expected_routes è
+    indicato, il buffer netlink di zebra viene dimensionato sul numero di
+    rotte invece del valore fisso del template. Meno demoni e buffer più
+    piccoli riducono memoria e tempo di avvio di ogni container.
+    Restituisce None se il template dei daemons manca.
+    """
+    config_source_dir = Path("fileConfigurazione") / routing_protocol
+    template = config_source_dir / "daemons"
+    if not template.exists():
+        return None
+    if frr_conf is None:
+        frr_template = config_source_dir / "frr.conf"
+        frr_conf = read_template(frr_template).decode('utf-8') if frr_template.exists() else ""
+    
+    stat = template.stat()
+    return _render_daemons(str(template), stat.st_mtime_ns, stat.st_size,
+                           frozenset(frr_daemons(frr_conf)), expected_routes)
+
+@lru_cache(maxsize=None)
+def _render_daemons(path, mtime_ns, size, daemons, expected_routes):
+    """File daemons per un insieme di demoni, calcolato una volta per combinazione"""
+    content = DAEMON_LINE_RE.sub(
+        lambda match: f"{match.group(1)}={'yes' if match.group(1) in daemons else 'no'}",
+        _cached_template(path, mtime_ns, size).decode('utf-8')
+    )
+    if expected_routes is not None:
+        content = ZEBRA_BUFFER_RE.sub(lambda match: f"{match.group(1)}{zebra_buffer_size(expected_routes)}",
+                                      content)
+    return content
+
+def create_router_config_directories(device_name, routing_protocol, lab_path, verbose=True,
+                                     link_mode="copy", frr_conf=None, daemons=None):
+    """
+    Crea la directory nomerouter/etc/frr/ e copia i file di configurazione
+    dal protocollo di routing specificato. Con link_mode diverso da "copy"
+    i file non personalizzati vengono collegati allo store condiviso
+    created_labs/.store invece di essere copiati (vedi install_file).
+    Se frr_conf è indicato (vedi render_frr_conf) viene scritto al posto
+    del template frr.conf, e lo stesso per daemons (vedi render_daemons).
+    """
+    # Path della directory di destinazione
+    router_dir = lab_path / device_name / "etc" / "frr"
+    router_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Path della directory sorgente
+    config_source_dir = Path("fileConfigurazione") / routing_protocol
+    
+    # Verifica che la directory sorgente esista
+    if not config_source_dir.exists():
+        print(f"⚠️  Directory di configurazione {config_source_dir} non trovata!")
+        return False
+    
+    # Copia ogni file
+    copied_files = []
+    for config_file in ROUTER_CONFIG_FILES:
+        source_file = config_source_dir / config_file
+        dest_file = router_dir / config_file
+        
+        if config_file == "frr.conf" and frr_conf is not None:
+            with open(dest_file, 'w', encoding='utf-8') as f:
+                f.write(frr_conf)
+            copied_files.append(config_file)
+        elif config_file == "daemons" and daemons is not None:
+            # Uguale tra i router con gli stessi demoni: condivisibile nello store
+            install_file(daemons.encode('utf-8'), dest_file, link_mode, lab_path.parent / ".store")
+            copied_files.append(config_file)
+        elif source_file.exists():
+            install_file(source_file, dest_file, link_mode, lab_path.parent / ".store")
+            copied_files.append(config_file)
+        else:
+            print(f"⚠️  File {config_file} non trovato in {config_source_dir}")
+    
+    if copied_files:
+        if verbose:
+            print(f"✅ Creata directory {device_name}/etc/frr/ con file: {', '.join(copied_files)}")
+        return True
+    else:
+        print(f"❌ Nessun file di configurazione copiato per {device_name}")
+        return False
+
+def create_server_config_directories(device_name, lab_path, verbose=True, link_mode="copy"):
+    """
+    Crea la directory nome_server/var/www/html/ e copia il file index.html
+    dalla directory fileConfigurazione/server/ (o lo collega allo store
+    condiviso, secondo link_mode)
+    """
+    # Path della directory di destinazione
+    server_dir = lab_path / device_name / "var" / "www" / "html"
+    server_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Path della directory sorgente
+    config_source_dir = Path("fileConfigurazione") / "server" / "var" / "www" / "html"
+    
+    # Verifica che la directory sorgente esista
+    if not config_source_dir.exists():
+        print(f"⚠️  Directory di configurazione {config_source_dir} non trovata!")
+        return False
+    
+    # File da copiare
+    source_file = config_source_dir / "index.html"
+    dest_file = server_dir / "index.html"
+    
+    if source_file.exists():
+        install_file(source_file, dest_file, link_mode, lab_path.parent / ".store")
+        if verbose:
+            print(f"✅ Creata directory {device_name}/var/www/html/ con file: index.html")
+        return True
+    else:
+        print(f"⚠️  File index.html non trovato in {config_source_dir}")
+        return False
+
+
+def create_lab_directory(lab_name, overwrite=None):
+    """
+    Prepara il percorso del laboratorio dentro created_labs.
+    Se overwrite è None e la directory esiste già chiede conferma,
+    altrimenti la sovrascrive (True) o annulla (False) senza domande.
+    
+    Il laboratorio esistente non viene toccato qui: i nuovi file vengono
+    scritti in una directory di staging e sostituiti al vecchio solo a
+    generazione completata (vedi staged_lab_directory).
+    """
+    # Crea prima la directory principale created_labs se non esiste
+    base_dir = Path("created_labs")
+    base_dir.mkdir(exist_ok=True)
+    
+    # Crea il path completo del laboratorio
+    lab_path = base_dir / lab_name
+    
+    # Se la directory esiste, chiedi conferma per sovrascriverla
+    if lab_path.exists():
+        print(f"⚠️  Directory 'created_labs/{lab_name}' già esistente!")
+        if overwrite is None:
+            overwrite = input("Vuoi sovrascriverla? (s/N): ").strip().lower() == 's'
+        if not overwrite:
+            print("❌ Operazione annullata.")
+            return None
+        print(f"✅ Directory 'created_labs/{lab_name}' verrà sostituita a generazione completata")
+    else:
+        print(f"✅ Directory 'created_labs/{lab_name}' verrà creata")
+    
+    return lab_path
+
+def _pid_alive(pid):
+    """Verifica se un processo è ancora in esecuzione"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def _sync_tree(path):
+    """
+    Rende persistenti su disco tutte le scritture del laboratorio con una
+    sola chiamata (syncfs sul filesystem che lo contiene) invece di un
+    fsync per ogni file
+    """
+    syncfs = getattr(_libc, 'syncfs', None)
+    if syncfs is not None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            if syncfs(fd) == 0:
+                return
+        finally:
+            os.close(fd)
+    if hasattr(os, 'sync'):
+        os.sync()
+
+def _fsync_directory(path):
+    """Rende persistente una rename eseguita dentro la directory"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # Windows non permette di aprire le directory
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _exchange_paths(first, second):
+    """Scambia atomicamente due percorsi; False se non supportato"""
+    renameat2 = getattr(_libc, 'renameat2', None)
+    if renameat2 is None:
+        return False
+    result = renameat2(AT_FDCWD, os.fsencode(first), AT_FDCWD, os.fsencode(second),
+                       RENAME_EXCHANGE)
+    return result == 0
+
+def commit_lab_directory(staging_path, lab_path):
+    """
+    Sostituisce lab_path con la directory di staging completa. Su Linux lo
+    scambio è atomico (renameat2 con RENAME_EXCHANGE): un 'kathara lstart'
+    in corso vede il vecchio laboratorio o il nuovo, mai uno a metà.
+    Altrove il vecchio laboratorio viene spostato da parte e rimosso dopo
+    la rename del nuovo.
+    """
+    _sync_tree(staging_path)
+    
+    if not lab_path.exists():
+        os.rename(staging_path, lab_path)
+    elif _exchange_paths(staging_path, lab_path):
+        # Ora staging_path contiene il vecchio laboratorio
+        shutil.rmtree(staging_path)
+    else:
+        old_path = lab_path.with_name(f".{lab_path.name}.old-{os.getpid()}")
+        os.rename(lab_path, old_path)
+        os.rename(staging_path, lab_path)
+        shutil.rmtree(old_path)
+    
+    _fsync_directory(lab_path.parent)
+
+@contextmanager
+def staged_lab_directory(lab_path):
+    """
+    Fornisce una directory di staging accanto a lab_path
+    (created_labs/.<lab>.staging-<pid>) in cui generare il laboratorio.
+    Se il blocco termina correttamente lo staging sostituisce lab_path;
+    in caso di errore o Ctrl-C viene eliminato e il laboratorio
+    precedente resta intatto.
+    """
+    # Rimuovi staging lasciati da processi terminati bruscamente
+    for stale_path in lab_path.parent.glob(f".{lab_path.name}.staging-*"):
+        pid = stale_path.name.rsplit('-', 1)[-1]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            shutil.rmtree(stale_path, ignore_errors=True)
+    
+    staging_path = lab_path.with_name(f".{lab_path.name}.staging-{os.getpid()}")
+    with profile_stage("lab_directory"):
+        if staging_path.exists():
+            shutil.rmtree(staging_path)
+        staging_path.mkdir(parents=True)
+    
+    try:
+        yield staging_path
+    except BaseException:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+    
+    with profile_stage("commit"):
+        commit_lab_directory(staging_path, lab_path)
+
+def protocol_daemons(routing_protocol):
+    """Demoni FRR usati dal template frr.conf di un protocollo"""
+    template = Path("fileConfigurazione") / routing_protocol / "frr.conf"
+    if not template.exists():
+        return frozenset()
+    stat = template.stat()
+    return _template_daemons(str(template), stat.st_mtime_ns, stat.st_size)
+
+@lru_cache(maxsize=None)
+def _template_daemons(path, mtime_ns, size):
+    return frozenset(frr_daemons(_cached_template(path, mtime_ns, size).decode('utf-8')))
+
+def router_daemons(device_data, frr_conf):
+    """
+    Demoni FRR avviati da un router, gli stessi del suo file daemons (vedi
+    render_daemons): quelli del frr.conf generato o, se è None (template
+    copiato com'è), quelli del template del protocollo
+    """
+    if frr_conf is None:
+        return protocol_daemons(device_data['routing_protocol'])
+    return frozenset(frr_daemons(frr_conf))
+
+def estimate_resources(device_data, expected_routes=0, daemons=()):
+    """
+    Stima memoria (MB) e CPU di un container dal suo ruolo, dal numero di
+    interfacce e, per i router, dai demoni FRR avviati e dalle rotte
+    attese. La memoria è arrotondata per eccesso a MEMORY_STEP_MB, le CPU
+    a 0.05 (al massimo MAX_DEVICE_CPUS).
+    """
+    device = Device.from_dict(device_data)
+    memory = ROLE_MEMORY_MB[device.kind] + INTERFACE_MEMORY_MB * len(device.interfaces)
+    cpus = ROLE_CPUS[device.kind]
+    
+    if device.is_router:
+        memory += sum(DAEMON_MEMORY_MB.get(daemon, DAEMON_MEMORY_DEFAULT_MB) for daemon in daemons)
+        # Ogni rotta sta nella RIB di zebra e nella tabella di ogni demone
+        memory += expected_routes * ROUTE_MEMORY_KB * (1 + len(daemons)) / 1024
+        cpus += DAEMON_CPUS * max(len(daemons) - 1, 0) + expected_routes / ROUTES_PER_CPU
+    
+    memory = math.ceil(memory / MEMORY_STEP_MB) * MEMORY_STEP_MB
+    cpus = min(math.ceil(round(cpus * 20, 6)) / 20, MAX_DEVICE_CPUS)
+    return memory, cpus
+
+def lab_resources(devices_info, expected_routes=None):
+    """
+    Stima le risorse dei dispositivi: {device_name: (MB, CPU)}, senza
+    quelli con no_limits (in lab.conf non avranno [mem]/[cpus]). Di
+    default ogni router si aspetta tutte le reti del laboratorio. I
+    demoni di un router sono quelli del suo frr.conf generato, come nel
+    file daemons.
+    """
+    if expected_routes is None:
+        expected_routes = len(domain_networks(devices_info))
+    domain_index = None
+    resources = {}
+    for device_name, device_data in devices_info.items():
+        if device_data.get('no_limits'):
+            continue
+        daemons = ()
+        if device_data.get('is_router') and device_data.get('routing_protocol'):
+            if domain_index is None:
+                domain_index = build_domain_index(devices_info)
+            frr_conf = render_frr_conf(device_name, devices_info, domain_index)
+            daemons = router_daemons(device_data, frr_conf)
+        resources[device_name] = estimate_resources(device_data, expected_routes, daemons)
+    return resources
+
+def host_resources():
+    """Memoria disponibile (MB) e CPU della macchina; None se non ricavabili"""
+    memory = None
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    memory = int(line.split()[1]) // 1024
+                    break
+    except (OSError, ValueError):
+        pass
+    if memory is None:
+        try:
+            memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2**20
+        except (AttributeError, OSError, ValueError):
+            pass
+    return memory, os.cpu_count()
+
+def show_resource_budget(devices_info, resources, host_memory=None, host_cpus=None):
+    """
+    Mostra il budget di risorse del laboratorio (limiti [mem]/[cpus] di
+    lab.conf) per ruolo e lo confronta con la macchina, se indicata.
+    Restituisce False se la memoria richiesta supera host_memory o se i
+    limiti di CPU superano CPU_OVERCOMMIT volte host_cpus.
+    """
+    print("\n🧮 BUDGET RISORSE (limiti in lab.conf)")
+    print("-" * 35)
+    if not resources:
+        print("Nessun limite: lab.conf non contiene [mem] e [cpus]")
+        return True
+    roles = {}
+    for device_name, (memory, cpus) in resources.items():
+        role = roles.setdefault(Device.from_dict(devices_info[device_name]).kind, [0, 0, 0.0])
+        role[0] += 1
+        role[1] += memory
+        role[2] += cpus
+    for kind, (count, memory, cpus) in sorted(roles.items()):
+        print(f"  • {count} {kind}: {memory} MB, {cpus:g} CPU")
+    
+    total_memory = sum(memory for memory, _ in resources.values())
+    total_cpus = round(sum(cpus for _, cpus in resources.values()), 2)
+    print(f"Totale: {total_memory} MB, {total_cpus:g} CPU")
+    unlimited = len(devices_info) - len(resources)
+    if unlimited:
+        print(f"Senza limiti: {unlimited} dispositivi (non conteggiati)")
+    
+    if host_memory is None and host_cpus is None:
+        return True
+    machine = []
+    if host_memory is not None:
+        machine.append(f"{host_memory} MB disponibili")
+    if host_cpus:
+        machine.append(f"{host_cpus:g} CPU")
+    print(f"Macchina: {', '.join(machine)}")
+    fits = True
+    if host_cpus and total_cpus > host_cpus * CPU_OVERCOMMIT:
+        print(f"❌ I limiti di CPU superano di {total_cpus / host_cpus:.1f}x le CPU della macchina "
+              f"(al massimo {CPU_OVERCOMMIT}x)")
+        fits = False
+    if host_memory is not None:
+        if total_memory > host_memory:
+            print(f"❌ Servono {total_memory - host_memory} MB in più di quelli disponibili")
+            fits = False
+        else:
+            print(f"✅ Il laboratorio usa al massimo il {total_memory / host_memory:.0%} della memoria")
+    return fits
+
+def check_resource_budget(devices_info, host_memory=None, host_cpus=None, compare_local=True):
+    """
+    Mostra il budget di risorse e lo confronta con la macchina che avvierà
+    il laboratorio. Se host_memory/host_cpus la descrivono, un laboratorio
+    che non ci entra solleva ValueError; altrimenti il confronto è con
+    questa macchina (se compare_local) e restituisce solo un avviso, o
+    None se il laboratorio entra.
+    """
+    with profile_stage("budget"):
+        resources = lab_resources(devices_info)
+    if host_memory is not None or host_cpus is not None:
+        if not show_resource_budget(devices_info, resources, host_memory, host_cpus):
+            raise ValueError("il laboratorio non entra nella macchina indicata con --host-memory/--host-cpus")
+        return None
+    local_memory, local_cpus = host_resources() if compare_local else (None, None)
+    if not show_resource_budget(devices_info, resources, local_memory, local_cpus):
+        return ("il laboratorio potrebbe non partire su questa macchina (indica quella di "
+                "destinazione con --host-memory/--host-cpus, o togli i limiti con --no-limits)")
+    return None
+
+def render_lab_conf_entry(device_name, device_data, resources=None):
+    """
+    Restituisce la sezione di lab.conf relativa a un dispositivo, con i
+    limiti di memoria e CPU se resources = (MB, CPU) è indicato
+    """
+    device = Device.from_dict(device_data)
+    
+    # Specifica sempre l'immagine (anche kathara/base per host e server)
+    lines = [f'{device_name}[image]="{device.image}"\n']
+    
+    # Configura le interfacce
+    for interface in device.interfaces:
+        lines.append(f'{device_name}[{interface.eth}]="{interface.domain}"\n')
+    
+    # Limiti delle risorse del container (vedi estimate_resources)
+    if resources is not None:
+        memory, cpus = resources
+        lines.append(f'{device_name}[mem]="{memory}m"\n')
+        lines.append(f'{device_name}[cpus]="{cpus:g}"\n')
+    
+    if device.interfaces:
+        lines.append(f"# {device_name} - Interfacce configurate\n")
+    else:
+        lines.append(f"# {device_name} - Nessuna interfaccia configurata\n")
+    lines.append("\n")
+    
+    return "".join(lines)
+
+def create_lab_conf(lab_name, devices_info, lab_path):
+    """Crea il file lab.conf nella directory del laboratorio"""
+    filename = lab_path / "lab.conf"
+    
+    print(f"\n📁 Creando file lab.conf...")
+    
+    resources = lab_resources(devices_info)
+    with open(filename, 'w', encoding='utf-8') as f:
+               
+        # Per ogni dispositivo, scrivi la configurazione
+        for device_name, device_data in devices_info.items():
+            f.write(render_lab_conf_entry(device_name, device_data, resources.get(device_name)))
+    
+    print(f"✅ File lab.conf creato!")
+    return filename
+
+def boot_dependencies(devices_info):
+    """
+    Calcola l'ordine di avvio del laboratorio: ogni host o server dipende
+    dai dispositivi che possiedono i gateway delle sue rotte statiche,
+    mentre i router (anche quelli con sessioni eBGP tra loro) non hanno
+    dipendenze e partono tutti insieme. Sono aggiunte solo queste
+    dipendenze, quindi i dispositivi partono nel minor numero di ondate
+    possibile; una dipendenza che chiuderebbe un ciclo (host che si fanno
+    da gateway a vicenda) viene ignorata.
+    Restituisce {dispositivo: [dipendenze]} solo per chi ne ha.
+    """
+    owners = {}
+    for device_name, device_data in devices_info.items():
+        for interface in Device.from_dict(device_data).interfaces:
+            if interface.address is not None:
+                owners.setdefault(interface.address, device_name)
+    
+    dependencies = {}
+    
+    def reaches(source, target):
+        # Visita in profondità delle dipendenze già aggiunte
+        stack, seen = [source], {source}
+        while stack:
+            device_name = stack.pop()
+            if device_name == target:
+                return True
+            for dependency in dependencies.get(device_name, ()):
+                if dependency not in seen:
+                    seen.add(dependency)
+                    stack.append(dependency)
+        return False
+    
+    for device_name, device_data in devices_info.items():
+        device = Device.from_dict(device_data)
+        if device.is_router:
+            continue
+        for route in device.routes:
+            owner = owners.get(route.gateway)
+            if owner is None or owner == device_name or owner in dependencies.get(device_name, ()):
+                continue
+            # I router non dipendono da nessuno: nessun ciclo possibile
+            if not devices_info[owner].get('is_router') and reaches(owner, device_name):
+                continue
+            dependencies.setdefault(device_name, []).append(owner)
+    
+    return {device_name: sorted(device_dependencies, key=_natural_key)
+            for device_name, device_dependencies in dependencies.items()}
+
+def boot_waves(dependencies):
+    """Numero di ondate di avvio necessarie (lunghezza della catena di dipendenze più lunga)"""
+    depths = {}
+    
+    def depth(device_name):
+        if device_name not in depths:
+            depths[device_name] = 1 + max((depth(dependency) for dependency in dependencies.get(device_name, ())),
+                                          default=0)
+        return depths[device_name]
+    
+    return max((depth(device_name) for device_name in dependencies), default=1)
+
+def render_lab_dep(dependencies):
+    """Contenuto di lab.dep nel formato di Kathara ('pc1: r1 r2'), vuoto se non serve"""
+    return "".join(f"{device_name}: {' '.join(device_dependencies)}\n"
+                   for device_name, device_dependencies in dependencies.items())
+
+def create_lab_dep(devices_info, lab_path):
+    """
+    Crea il file lab.dep con l'ordine di avvio (vedi boot_dependencies),
+    solo se qualche dispositivo deve aspettarne altri
+    """
+    dependencies = boot_dependencies(devices_info)
+    if not dependencies:
+        return None
+    
+    filename = lab_path / "lab.dep"
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(render_lab_dep(dependencies))
+    
+    print(f"✅ File lab.dep creato: {len(dependencies)} dispositivi attendono i loro gateway "
+          f"({boot_waves(dependencies)} ondate di avvio)")
+    return filename
+
+def render_startup(device_name, device_data):
+    """Restituisce il contenuto del file .startup di un dispositivo"""
+    device = Device.from_dict(device_data)
+    interfaces = device.interfaces
+    
+    lines = ["#!/bin/bash\n\n"]
+    
+    # Se ci sono IP configurati (router, host o server)
+    if any(interface.address is not None for interface in interfaces):
+        interfaces = sorted(interfaces, key=lambda interface: interface.eth)
+    if device.get('startup_style') == "batch":
+        lines.extend(render_ip_batch(device, interfaces))
+    else:
+        lines.extend(render_ip_commands(device, interfaces))
+    
+    # Se è un router, aggiungi il comando per avviare FRR
+    if device.is_router:
+        lines.append("# Avvio servizio FRR\n")
+        lines.append("systemctl start frr\n")
+    
+    # Se è un server, aggiungi il comando per avviare Apache2
+    if device.is_server:
+        lines.append("# Avvio servizio Apache2\n")
+        lines.append("systemctl start apache2\n")
+    
+    return "".join(lines)
+
+def render_ip_commands(device, interfaces):
+    """Righe del .startup con un comando ip per ogni indirizzo e rotta"""
+    # Configurazione delle interfacce
+    lines = ["# Configurazione interfacce di rete\n"]
+    for interface in interfaces:
+        if interface.address is not None:
+            lines.append(f"ip addr add {interface.ip_address} dev eth{interface.eth}\n")
+        else:
+            # Interfaccia senza IP configurato
+            lines.append(f"# eth{interface.eth} collegata al dominio {interface.domain}\n")
+            lines.append(f"# ip addr add <INDIRIZZO_IP>/<NETMASK> dev eth{interface.eth}\n")
+    
+    if interfaces:
+        lines.append("\n")
+    
+    # Rotte statiche del dispositivo (host, server o router)
+    if device.routes:
+        lines.append("# Configurazione rotte statiche\n")
+        for route in device.routes:
+            if route.is_default:
+                # Rotta di default
+                lines.append(f"ip route add default via {_int_to_ip(route.gateway)}\n")
+            else:
+                # Rotta specifica
+                lines.append(f"ip route add {_int_to_ip(route.network)}/{route.prefixlen} "
+                             f"via {_int_to_ip(route.gateway)}\n")
+        lines.append("\n")
+    return lines
+
+def render_ip_batch(device, interfaces):
+    """
+    Righe del .startup con tutte le operazioni di rete in un solo processo
+    'ip -batch': attivazione delle interfacce e indirizzi prima, rotte poi
+    (il gateway deve essere già raggiungibile). Con -force un comando
+    fallito non interrompe i successivi, come nello stile a comandi.
+    """
+    lines = ["# Configurazione di rete (interfacce e rotte statiche) con un solo processo ip\n"]
+    commands = []
+    for interface in interfaces:
+        if interface.address is not None:
+            commands.append(f"link set dev eth{interface.eth} up\n")
+            commands.append(f"addr add {interface.ip_address} dev eth{interface.eth}\n")
+        else:
+            # Interfaccia senza IP configurato
+            lines.append(f"# eth{interface.eth} collegata al dominio {interface.domain}\n")
+            lines.append(f"# ip addr add <INDIRIZZO_IP>/<NETMASK> dev eth{interface.eth}\n")
+    
+    for route in device.routes:
+        network = "default" if route.is_default else f"{_int_to_ip(route.network)}/{route.prefixlen}"
+        commands.append(f"route add {network} via {_int_to_ip(route.gateway)}\n")
+    
+    if commands:
+        lines.append("ip -force -batch - <<'EOF'\n")
+        lines.extend(commands)
+        lines.append("EOF\n")
+    if interfaces or commands:
+        lines.append("\n")
+    return lines
+
+def write_startup_file(device_name, device_data, lab_path):
+    """Scrive il file .startup di un dispositivo e lo rende eseguibile"""
+    startup_filename = lab_path / f"{device_name}.startup"
+    
+    with open(startup_filename, 'w', encoding='utf-8') as f:
+        f.write(render_startup(device_name, device_data))
+    
+    # Rendi il file eseguibile
+    startup_filename.chmod(0o755)
+    return startup_filename
+
+def run_device_tasks(tasks, workers=1):
+    """
+    Esegue una lista di operazioni per dispositivo, ognuna nella forma
+    (device_name, funzione, argomenti), usando al massimo 'workers' thread.
+    
+    Utile su filesystem ad alta latenza (es. NFS), dove ogni creazione di
+    file o directory costa millisecondi. Gli errori (di I/O o di qualsiasi
+    altro tipo) vengono raccolti per dispositivo invece di interrompere la
+    generazione o le operazioni degli altri dispositivi.
+    Restituisce [(device_name, risultato, errore)] nello stesso ordine
+    delle operazioni, così l'output resta deterministico.
+    """
+    def run(task):
+        device_name, func, args = task
+        try:
+            return device_name, func(*args), None
+        except Exception as e:
+            return device_name, None, e
+    
+    if workers <= 1:
+        return [run(task) for task in tasks]
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, tasks))
+
+def create_startup_files(devices_info, lab_path, workers=1):
+    """Crea i file .startup per ogni dispositivo"""
+    print(f"\n🚀 Creando file .startup...")
+    
+    tasks = [
+        (device_name, write_startup_file, (device_name, device_data, lab_path))
+        for device_name, device_data in devices_info.items()
+    ]
+    
+    startup_files = []
+    
+    for device_name, startup_filename, error in run_device_tasks(tasks, workers):
+        if error:
+            print(f"❌ Errore creando {device_name}.startup: {error}")
+            continue
+        startup_files.append(startup_filename)
+        print(f"✅ Creato {device_name}.startup")
+    
+    return startup_files
+
+def create_config_directories(devices_info, lab_path, workers=1, link_mode="copy"):
+    """
+    Crea le directory di configurazione di router (etc/frr/) e server
+    (var/www/html/) usando al massimo 'workers' thread e la strategia
+    link_mode per i template.
+    Restituisce (router_configs_created, server_configs_created).
+    """
+    # In parallelo i messaggi vengono stampati alla fine, in ordine
+    verbose = workers <= 1
+    domain_index = build_domain_index(devices_info)
+    # Ogni router può imparare al più le reti del laboratorio
+    expected_routes = len(domain_networks(devices_info))
+    
+    def run(tasks, config_dir):
+        created = []
+        for device_name, success, error in run_device_tasks(tasks, workers):
+            if error:
+                print(f"❌ Errore creando {device_name}/{config_dir}/: {error}")
+                continue
+            if not success:
+                continue
+            if not verbose:
+                print(f"✅ Creata directory {device_name}/{config_dir}/")
+            created.append(device_name)
+        return created
+    
+    with profile_stage("router_configs") as stage:
+        tasks = []
+        for device_name, device_data in devices_info.items():
+            if device_data.get('is_router') and device_data.get('routing_protocol'):
+                frr_conf = render_frr_conf(device_name, devices_info, domain_index)
+                daemons = render_daemons(device_data['routing_protocol'], frr_conf, expected_routes)
+                tasks.append((device_name, create_router_config_directories,
+                              (device_name, device_data['routing_protocol'], lab_path, verbose, link_mode,
+                               frr_conf, daemons)))
+        router_configs_created = run(tasks, "etc/frr")
+        stage['files'] = len(router_configs_created) * len(ROUTER_CONFIG_FILES)
+    
+    with profile_stage("server_configs") as stage:
+        tasks = [
+            (device_name, create_server_config_directories, (device_name, lab_path, verbose, link_mode))
+            for device_name, device_data in devices_info.items() if device_data.get('is_server')
+        ]
+        server_configs_created = run(tasks, "var/www/html")
+        stage['files'] = len(server_configs_created)
+    
+    return router_configs_created, server_configs_created
+
+def render_lab_files(lab_name, devices_info):
+    """
+    Produce, senza scrivere nulla su disco, tutti i file del laboratorio
+    come tuple (percorso_relativo, contenuto, permessi, template), dove
+    template è il file di fileConfigurazione/ da cui il contenuto è
+    copiato, il contenuto stesso per i file generati ma condivisibili
+    nello store (daemons) e None per gli altri file generati.
+    """
+    resources = lab_resources(devices_info)
+    yield ("lab.conf",
+           "".join(render_lab_conf_entry(device_name, device_data, resources.get(device_name))
+                   for device_name, device_data in devices_info.items()).encode('utf-8'),
+           0o644, None)
+    
+    lab_dep = render_lab_dep(boot_dependencies(devices_info))
+    if lab_dep:
+        yield ("lab.dep", lab_dep.encode('utf-8'), 0o644, None)
+    
+    for device_name, device_data in devices_info.items():
+        yield (f"{device_name}.startup",
+               render_startup(device_name, device_data).encode('utf-8'),
+               0o755, None)
+    
+    domain_index = build_domain_index(devices_info)
+    expected_routes = len(domain_networks(devices_info))
+    for device_name, device_data in devices_info.items():
+        if device_data.get('is_router') and device_data.get('routing_protocol'):
+            config_source_dir = Path("fileConfigurazione") / device_data['routing_protocol']
+            frr_conf = render_frr_conf(device_name, devices_info, domain_index)
+            daemons = render_daemons(device_data['routing_protocol'], frr_conf, expected_routes)
+            for config_file in ROUTER_CONFIG_FILES:
+                source_file = config_source_dir / config_file
+                if config_file == "frr.conf" and frr_conf is not None:
+                    yield (f"{device_name}/etc/frr/{config_file}", frr_conf.encode('utf-8'), 0o644, None)
+                elif config_file == "daemons" and daemons is not None:
+                    content = daemons.encode('utf-8')
+                    yield (f"{device_name}/etc/frr/{config_file}", content, 0o644, content)
+                elif source_file.exists():
+                    yield (f"{device_name}/etc/frr/{config_file}",
+                           read_template(source_file), 0o644, source_file)
+    
+    for device_name, device_data in devices_info.items():
+        if device_data.get('is_server'):
+            source_file = Path("fileConfigurazione") / "server" / "var" / "www" / "html" / "index.html"
+            if source_file.exists():
+                yield (f"{device_name}/var/www/html/index.html",
+                       read_template(source_file), 0o644, source_file)
+
+def archive_format_for(archive_path):
+    """Formato dell'archivio ricavato dall'estensione (tar.gz se non riconosciuta)"""
+    name = str(archive_path).lower()
+    if name.endswith(".tgz"):
+        return "tar.gz"
+    for archive_format in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if name.endswith("." + archive_format):
+            return archive_format
+    return "tar.gz"
+
+def write_lab_archive(lab_name, devices_info, output, archive_format="tar.gz"):
+    """
+    Scrive il laboratorio direttamente in un archivio tar (eventualmente
+    compresso) o zip, senza creare file su disco: output è un percorso o
+    uno stream binario anche non posizionabile (es. stdout). I file sono
+    sotto <lab_name>/ con i permessi di render_lab_files (0755 per i
+    .startup). Nel tar i file condivisibili uguali (daemons, vtysh.conf,
+    index.html, come nello store di --link-mode) sono salvati una sola
+    volta e gli altri diventano hardlink al primo; .startup e
+    CUSTOMISED_FILES restano sempre copie indipendenti, da modificare
+    senza toccare gli altri dispositivi. Lo zip non ha hardlink e contiene
+    tutti i file.
+    Restituisce {'files', 'unique', 'bytes'}.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"formato di archivio '{archive_format}' non valido! Usa {', '.join(ARCHIVE_FORMATS)}")
+    
+    stats = {'files': 0, 'unique': 0, 'bytes': 0}
+    mtime = time.time()
+    first_paths = {}
+    
+    if ARCHIVE_FORMATS[archive_format] is None:
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for rel_path, content, mode, source_file in render_lab_files(lab_name, devices_info):
+                info = zipfile.ZipInfo(f"{lab_name}/{rel_path}", time.localtime(mtime)[:6])
+                # Permessi Unix (create_system 3), rispettati da unzip
+                info.create_system = 3
+                info.external_attr = (0o100000 | mode) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, content)
+                stats['files'] += 1
+                stats['unique'] += 1
+                stats['bytes'] += len(content)
+        return stats
+    
+    # Modalità "stream" di tarfile: funziona anche su stdout e pipe
+    compression = ARCHIVE_FORMATS[archive_format]
+    if isinstance(output, (str, Path)):
+        archive = tarfile.open(output, f"w:{compression}" if compression else "w")
+    else:
+        archive = tarfile.open(fileobj=output, mode=f"w|{compression}" if compression else "w|")
+    
+    with archive:
+        for rel_path, content, mode, source_file in render_lab_files(lab_name, devices_info):
+            info = tarfile.TarInfo(f"{lab_name}/{rel_path}")
+            info.mode = mode
+            info.mtime = mtime
+            stats['files'] += 1
+            shareable = source_file is not None and Path(rel_path).name not in CUSTOMISED_FILES
+            digest = hashlib.sha256(content).digest() if shareable else None
+            
+            if digest in first_paths:
+                info.type = tarfile.LNKTYPE
+                info.linkname = first_paths[digest]
+                archive.addfile(info)
+                continue
+            
+            if shareable:
+                first_paths[digest] = info.name
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+            stats['unique'] += 1
+            stats['bytes'] += len(content)
+    
+    return stats
+
+def load_manifest(lab_path):
+    """Legge il manifest degli hash dei file generati (vuoto se assente)"""
+    try:
+        with open(lab_path / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+def write_manifest(lab_path, manifest):
+    """Salva il manifest degli hash dei file generati"""
+    write_file_atomic(
+        lab_path / MANIFEST_NAME,
+        json.dumps({'files': manifest}, indent=1, sort_keys=True).encode('utf-8')
+    )
+
+def build_manifest(lab_name, devices_info):
+    """Calcola il manifest {percorso_relativo: sha256} della generazione"""
+    return {
+        rel_path: hashlib.sha256(content).hexdigest()
+        for rel_path, content, mode, source_file in render_lab_files(lab_name, devices_info)
+    }
+
+def write_file_atomic(dest_file, content, mode=None):
+    """
+    Scrive un file sostituendolo con una rename: chi legge vede il vecchio
+    o il nuovo contenuto, mai un file a metà, e un eventuale hardlink verso
+    lo store non viene modificato sul posto
+    """
+    dest_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = dest_file.with_name(f".{dest_file.name}.{os.getpid()}.tmp")
+    with open(tmp_file, 'wb') as f:
+        f.write(content)
+    if mode is not None:
+        tmp_file.chmod(mode)
+    os.replace(tmp_file, dest_file)
+
+def sync_lab(lab_name, devices_info, lab_path, link_mode="copy"):
+    """
+    Rigenera in modo incrementale un laboratorio esistente: confronta ogni
+    file con il manifest della generazione precedente e
+      - scrive solo i file il cui contenuto generato è cambiato;
+      - rimuove i file dei dispositivi eliminati;
+      - non tocca i file modificati a mano dall'utente (es. frr.conf
+        personalizzati): se anche la nuova generazione li cambierebbe, o
+        se appartengono a un dispositivo eliminato, li segnala come
+        conflitti.
+    Restituisce un dizionario con le liste 'written', 'removed' e
+    'conflicts' e il numero di file 'unchanged'.
+    """
+    old_manifest = load_manifest(lab_path)
+    new_manifest = {}
+    result = {'written': [], 'removed': [], 'conflicts': [], 'unchanged': 0}
+    store_dir = lab_path.parent / ".store"
+    
+    for rel_path, content, mode, source_file in render_lab_files(lab_name, devices_info):
+        digest = hashlib.sha256(content).hexdigest()
+        old_digest = old_manifest.get(rel_path)
+        new_manifest[rel_path] = digest
+        dest_file = lab_path / rel_path
+        
+        # Stessa generazione della volta scorsa: il file resta com'è,
+        # anche se l'utente lo ha modificato
+        if digest == old_digest and (dest_file.exists() or dest_file.is_symlink()):
+            result['unchanged'] += 1
+            continue
+        
+        if dest_file.exists():
+            disk_digest = file_digest(dest_file)
+            if disk_digest == digest:
+                result['unchanged'] += 1
+                continue
+            if disk_digest != old_digest:
+                # Modificato a mano (o non generato da noi): non sovrascrivere
+                result['conflicts'].append(rel_path)
+                if old_digest is not None:
+                    new_manifest[rel_path] = old_digest
+                else:
+                    del new_manifest[rel_path]
+                continue
+        
+        if source_file is not None and link_mode != "copy":
+            dest_file.parent.mkdir(parents=True, exist_ok=True)
+            install_file(source_file, dest_file, link_mode, store_dir)
+        else:
+            write_file_atomic(dest_file, content, mode)
+        result['written'].append(rel_path)
+    
+    # File di dispositivi (o configurazioni) non più presenti
+    for rel_path, old_digest in old_manifest.items():
+        if rel_path in new_manifest:
+            continue
+        dest_file = lab_path / rel_path
+        if not dest_file.exists():
+            continue
+        if file_digest(dest_file) != old_digest:
+            result['conflicts'].append(rel_path)
+            new_manifest[rel_path] = old_digest
+            continue
+        dest_file.unlink()
+        result['removed'].append(rel_path)
+        
+        # Rimuovi le directory rimaste vuote (es. r5/etc/frr/)
+        parent = dest_file.parent
+        while parent != lab_path:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+    
+    write_manifest(lab_path, new_manifest)
+    return result
+
+def show_generated_files(lab_path, devices_info):
+    """Mostra il contenuto dei file generati"""
+    print("\n" + "=" * 70)
+    print("📄 CONTENUTO FILE GENERATI")
+    print("=" * 70)
+    
+    # Mostra lab.conf
+    lab_conf_path = lab_path / "lab.conf"
+    if lab_conf_path.exists():
+        print("\n🔧 CONTENUTO lab.conf:")
+        print("-" * 50)
+        with open(lab_conf_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+            print(content)
+        print("-" * 50)
+    
+    # Mostra lab.dep, se generato
+    lab_dep_path = lab_path / "lab.dep"
+    if lab_dep_path.exists():
+        print("\n⏳ CONTENUTO lab.dep:")
+        print("-" * 50)
+        print(lab_dep_path.read_text(encoding='utf-8'))
+        print("-" * 50)
+    
+    # Mostra i file .startup
+    print("\n🚀 CONTENUTO FILE .startup:")
+    print("-" * 50)
+    
+    for device_name in devices_info.keys():
+        startup_path = lab_path / f"{device_name}.startup"
+        if startup_path.exists():
+            print(f"\n📄 File: {device_name}.startup")
+            print("─" * 30)
+            with open(startup_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+                print(content)
+            print("─" * 30)
+    
+    print("\n" + "=" * 70)
+
+def show_summary(lab_name, devices_info, all_domains):
+    """Mostra un riassunto del laboratorio"""
+    print("\n📊 RIASSUNTO LABORATORIO")
+    print("=" * 50)
+    print(f"Nome: {lab_name}")
+    print(f"Numero dispositivi: {len(devices_info)}")
+    print(f"Domini di collisione: {len(all_domains)}")
+    print("\nDispositivi:")
+    
+    for device_name, device_data in devices_info.items():
+        device = Device.from_dict(device_data)
+        
+        print(f"  • {device_name} ({device.image})")
+        
+        if device.is_router and device.routing_protocol:
+            print(f"    ├─ Protocollo: {device.routing_protocol.upper()}")
+        
+        if device.interfaces:
+            for interface in device.interfaces:
+                ip_info = ""
+                if interface.address is not None:
+                    ip_info = f" - IP: {interface.ip_address}"
+                print(f"    └─ eth{interface.eth} → {interface.domain}{ip_info}")
+        else:
+            print(f"    └─ Nessuna interfaccia")
+    
+    if all_domains:
+        print(f"\n📡 DOMINI DI COLLISIONE UTILIZZATI")
+        print("-" * 35)
+        for domain in sorted(all_domains):
+            print(f"  • {domain}")
+        print()
+        print("💡 Ogni dominio di collisione rappresenta un segmento di rete")
+        print("   Dispositivi nello stesso dominio possono comunicare direttamente")
+    else:
+        print("\n📡 Nessun dominio di collisione configurato")
+        print("   (Tutti i dispositivi sono isolati)")
+    
+    print("=" * 50)
+
+def build_device(device_name, device_spec, startup_style="commands", limits=True):
+    """
+    Costruisce la configurazione di un singolo dispositivo a partire dalla
+    sua definizione nella specifica. Restituisce (device_data, errori):
+    device_data è None se la definizione contiene errori. startup_style e
+    limits sono lo stile del .startup e i limiti [mem]/[cpus] se il
+    dispositivo non li indica.
+    """
+    device_errors = []
+    
+    error = check_device_name(device_name)
+    if error:
+        return None, [error]
+    
+    if not isinstance(device_spec, dict):
+        return None, ["la definizione deve essere un oggetto"]
+    
+    # Tipo di dispositivo
+    device_type = str(device_spec.get('type', '')).lower()
+    if device_type not in DEVICE_TYPES:
+        return None, [f"tipo '{device_type}' non valido! Usa router, host o server"]
+    image, is_router, is_server = DEVICE_TYPES[device_type]
+    image = device_spec.get('image', image)
+    is_host = not is_router and not is_server
+    
+    # Interfacce: lista di domini o dizionario eth_num -> dominio
+    raw_interfaces = device_spec.get('interfaces') or {}
+    if isinstance(raw_interfaces, list):
+        raw_interfaces = dict(enumerate(raw_interfaces))
+    if not isinstance(raw_interfaces, dict):
+        return None, ["'interfaces' deve essere una lista di domini o un oggetto {porta: dominio}"]
+    interfaces = {}
+    for eth_num, domain in raw_interfaces.items():
+        try:
+            eth_num = int(eth_num)
+        except (TypeError, ValueError):
+            device_errors.append(f"interfaccia '{eth_num}' non valida (usa il numero della porta eth)")
+            continue
+        domain = str(domain).strip().upper()
+        error = check_domain_name(domain)
+        if error:
+            device_errors.append(f"eth{eth_num}: {error}")
+            continue
+        interfaces[eth_num] = domain
+    
+    # Protocollo di routing e attributi per i template FRR (solo router)
+    routing_protocol = None
+    as_number = None
+    ospf_area = None
+    if is_router:
+        routing_protocol = str(device_spec.get('routing_protocol', '')).lower()
+        if routing_protocol not in ROUTING_PROTOCOLS:
+            device_errors.append(f"protocollo di routing '{routing_protocol}' non valido! Usa ospf, rip o bgp")
+        
+        if device_spec.get('as_number') is not None:
+            try:
+                as_number = int(device_spec['as_number'])
+                if not 1 <= as_number <= 4294967295:
+                    raise ValueError
+            except (TypeError, ValueError):
+                device_errors.append(f"numero di AS '{device_spec['as_number']}' non valido (1-4294967295)")
+        
+        if device_spec.get('ospf_area') is not None:
+            # L'area può essere un numero (1) o in notazione puntata (0.0.0.1)
+            ospf_area = str(device_spec['ospf_area']).strip()
+            try:
+                ospf_area = str(ipaddress.IPv4Address(int(ospf_area) if ospf_area.isdigit() else ospf_area))
+            except ValueError:
+                device_errors.append(f"area OSPF '{device_spec['ospf_area']}' non valida (es. 0.0.0.0 o 1)")
+    
+    # Indirizzi IP: lista allineata alle interfacce o dizionario
+    raw_ips = device_spec.get('ip_addresses') or {}
+    if isinstance(raw_ips, list):
+        raw_ips = {eth_num: ip for eth_num, ip in enumerate(raw_ips) if ip}
+    if not isinstance(raw_ips, dict):
+        device_errors.append("'ip_addresses' deve essere una lista o un oggetto {porta: indirizzo}")
+        raw_ips = {}
+    ip_addresses = {}
+    for eth_num, ip_input in raw_ips.items():
+        try:
+            eth_num = int(eth_num)
+        except (TypeError, ValueError):
+            device_errors.append(f"indirizzo per interfaccia '{eth_num}' non valida")
+            continue
+        if eth_num not in interfaces:
+            device_errors.append(f"indirizzo IP per eth{eth_num}, che non è collegata a nessun dominio")
+            continue
+        ip_input = str(ip_input).strip()
+        error = check_ip_address(ip_input)
+        if error:
+            device_errors.append(f"eth{eth_num}: {error}")
+            continue
+        ip_addresses[eth_num] = ip_input
+    
+    # Rotte statiche (anche dei router, scritte nel .startup come per host e server)
+    host_routes = []
+    raw_routes = device_spec.get('host_routes') or []
+    if not isinstance(raw_routes, list):
+        device_errors.append("'host_routes' deve essere una lista di rotte")
+        raw_routes = []
+    for route_input in raw_routes:
+        if isinstance(route_input, dict):
+            network = route_input.get('network', 'default')
+            route_input = f"{network} via {route_input.get('gateway', '')}"
+        route, error = parse_route(str(route_input))
+        if error:
+            device_errors.append(f"rotta '{route_input}': {error}")
+            continue
+        host_routes.append(route)
+    
+    startup_style = str(device_spec.get('startup_style') or startup_style).lower()
+    if startup_style not in STARTUP_STYLES:
+        device_errors.append(f"stile del .startup '{startup_style}' non valido! Usa commands o batch")
+    
+    limits = device_spec.get('limits', limits)
+    if not isinstance(limits, bool):
+        device_errors.append("'limits' deve essere true o false")
+    
+    if device_errors:
+        return None, device_errors
+    
+    return Device.from_dict({
+        'image': image,
+        'interfaces': interfaces,
+        'is_router': is_router,
+        'is_server': is_server,
+        'is_host': is_host,
+        'routing_protocol': routing_protocol,
+        'ip_addresses': ip_addresses,
+        'host_routes': host_routes,
+        'as_number': as_number,
+        'ospf_area': ospf_area,
+        'route_reflector': bool(device_spec.get('route_reflector')) and is_router,
+        'startup_style': startup_style if startup_style != "commands" else None,
+        'no_limits': not limits
+    }), []
+
+def build_devices_info(spec):
+    """
+    Costruisce la struttura devices_info a partire da una specifica
+    dichiarativa (dizionario già caricato da JSON/YAML).
+    
+    Formato atteso:
+        lab_name: nome del laboratorio
+        devices:
+          r1:
+            type: router            # router | host | server
+            routing_protocol: ospf  # solo router: ospf | rip | bgp
+            as_number: 65001        # opzionale, router BGP (altrimenti dal nome asNrM)
+            route_reflector: false  # opzionale, router BGP (layout route-reflector)
+            ospf_area: 0.0.0.0      # opzionale, router OSPF
+            interfaces: [A, B]      # oppure {0: A, 1: B}
+            ip_addresses: {0: 10.0.0.1/24}   # oppure lista allineata
+            startup_style: batch    # opzionale, sovrascrive quello del laboratorio
+            limits: false           # opzionale, sovrascrive quello del laboratorio
+          pc1:
+            type: host
+            interfaces: [A]
+            ip_addresses: [10.0.0.2/24]
+            host_routes: ["default via 10.0.0.1"]
+        addressing:                 # opzionale: assegna gli IP mancanti
+          pool: 10.0.0.0/8
+          prefixlen: 24
+        auto_routes: true           # opzionale: calcola le rotte di host e server
+        startup_style: batch        # opzionale: commands (default) | batch (ip -batch)
+        limits: false               # opzionale: niente [mem]/[cpus] in lab.conf
+        bgp:                        # opzionale: sessioni iBGP tra router dello stesso AS
+          ibgp: full-mesh           # none | full-mesh | route-reflector
+        ospf:                       # opzionale: aree e costi OSPF
+          areas: {A: 0.0.0.0, B: 1} # per dominio, oppure
+          partition: true           # backbone + aree calcolati dalla topologia
+          backbone_radius: 1
+          stub: true                # aree diverse dal backbone come stub (o elenco di aree)
+          costs: {A: 10}            # costo delle interfacce per dominio
+    
+    Restituisce (lab_name, devices_info, all_domains); solleva ValueError
+    con l'elenco completo degli errori se la specifica non è valida.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("La specifica deve essere un oggetto con 'lab_name' e 'devices'")
+    
+    errors = []
+    lab_name = str(spec.get('lab_name') or '').strip()
+    if not lab_name:
+        errors.append("Il nome del laboratorio non può essere vuoto!")
+    
+    devices = spec.get('devices')
+    if not isinstance(devices, dict) or not devices:
+        errors.append("La specifica deve contenere almeno 1 dispositivo in 'devices'")
+        devices = {}
+    
+    devices_info = {}
+    all_domains = set()
+    startup_style = spec.get('startup_style') or "commands"
+    limits = spec.get('limits', True)
+    
+    for device_name, device_spec in devices.items():
+        device_name = str(device_name)
+        device_data, device_errors = build_device(device_name, device_spec, startup_style, limits)
+        if device_errors:
+            errors.extend(f"{device_name}: {error}" for error in device_errors)
+            continue
+        
+        devices_info[device_name] = device_data
+        all_domains.update(device_data['interfaces'].values())
+    
+    errors.extend(check_spec_sections(spec))
+    
+    if errors:
+        raise ValueError("specifica non valida:\n   • " + "\n   • ".join(errors))
+    
+    addressing = spec.get('addressing')
+    if addressing:
+        allocate_ip_addresses(
+            devices_info,
+            pool=addressing.get('pool', "10.0.0.0/8"),
+            prefixlen=int(addressing.get('prefixlen', 24))
+        )
+    
+    if spec.get('auto_routes'):
+        for device_name in derive_host_routes(devices_info):
+            print(f"⚠️  Nessun router raggiungibile per {device_name}: rotte non calcolate")
+    
+    if spec.get('bgp'):
+        derive_bgp_sessions(devices_info, spec['bgp'].get('ibgp', "none"))
+    
+    ospf = spec.get('ospf')
+    if ospf:
+        domain_areas = {}
+        if ospf.get('partition'):
+            domain_areas = partition_ospf_areas(devices_info, int(ospf.get('backbone_radius', 1)))
+        for domain, area in (ospf.get('areas') or {}).items():
+            domain_areas[str(domain).upper()] = _ospf_area_id(area)
+        stub = ospf.get('stub', False)
+        if isinstance(stub, list):
+            stub = {_ospf_area_id(area) for area in stub}
+        apply_ospf_areas(devices_info, domain_areas, stub,
+                         {str(domain).upper(): cost for domain, cost in (ospf.get('costs') or {}).items()})
+    
+    return lab_name, devices_info, all_domains
+
+def check_spec_sections(spec):
+    """
+    Verifica le sezioni opzionali della specifica a livello di laboratorio
+    (addressing, bgp, ospf); restituisce la lista degli errori trovati
+    """
+    errors = []
+    
+    addressing = spec.get('addressing')
+    if addressing and not isinstance(addressing, dict):
+        errors.append("'addressing' deve essere un oggetto (pool, prefixlen)")
+    elif addressing and _spec_int(addressing.get('prefixlen', 24)) is None:
+        # Pool e intervallo del prefisso sono verificati da allocate_ip_addresses
+        errors.append(f"addressing: prefixlen '{addressing['prefixlen']}' non valido (es. 24)")
+    
+    bgp = spec.get('bgp')
+    if bgp and not isinstance(bgp, dict):
+        errors.append("'bgp' deve essere un oggetto (es. {ibgp: full-mesh})")
+    elif bgp and bgp.get('ibgp', "none") not in IBGP_LAYOUTS:
+        errors.append(f"bgp: layout iBGP '{bgp['ibgp']}' non valido! Usa {', '.join(IBGP_LAYOUTS)}")
+    
+    ospf = spec.get('ospf')
+    if ospf and not isinstance(ospf, dict):
+        errors.append("'ospf' deve essere un oggetto (areas, partition, stub, costs)")
+        ospf = None
+    ospf = ospf or {}
+    
+    if not isinstance(ospf.get('partition', False), bool):
+        errors.append("ospf: 'partition' deve essere true o false")
+    backbone_radius = _spec_int(ospf.get('backbone_radius', 1))
+    if backbone_radius is None or backbone_radius < 0:
+        errors.append(f"ospf: backbone_radius '{ospf['backbone_radius']}' non valido (intero >= 0)")
+    
+    areas = ospf.get('areas') or {}
+    if not isinstance(areas, dict):
+        errors.append("ospf: 'areas' deve essere un oggetto {dominio: area}")
+        areas = {}
+    for domain, area in areas.items():
+        error = check_ospf_area(area)
+        if error:
+            errors.append(f"ospf: dominio {domain}: {error}")
+    
+    stub = ospf.get('stub', False)
+    if isinstance(stub, list):
+        errors.extend(f"ospf: stub: {error}" for error in map(check_ospf_area, stub) if error)
+        if "0.0.0.0" in {_ospf_area_id(area) for area in stub if not check_ospf_area(area)}:
+            errors.append("ospf: il backbone (0.0.0.0) non può essere un'area stub")
+    elif not isinstance(stub, bool):
+        errors.append("ospf: 'stub' deve essere true, false o un elenco di aree")
+    
+    costs = ospf.get('costs') or {}
+    if not isinstance(costs, dict):
+        errors.append("ospf: 'costs' deve essere un oggetto {dominio: costo}")
+        costs = {}
+    for domain, cost in costs.items():
+        if not 1 <= (_spec_int(cost) or 0) <= 65535:
+            errors.append(f"ospf: dominio {domain}: costo '{cost}' non valido (1-65535)")
+    
+    return errors
+
+def _spec_int(value):
+    """Intero di una specifica (anche scritto come stringa), None se non lo è"""
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+def _ospf_area_id(area):
+    """Area OSPF in forma puntata (1 -> 0.0.0.1)"""
+    area = str(area).strip()
+    return _int_to_ip(int(area)) if area.isdigit() else area
+
+def _natural_key(name):
+    """Chiave di ordinamento naturale: D2 viene prima di D10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+def _int_to_ip(value):
+    """Converte un intero nell'indirizzo IPv4 puntato corrispondente"""
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+def allocate_ip_addresses(devices_info, pool="10.0.0.0/8", prefixlen=24, overwrite=False):
+    """
+    Assegna automaticamente gli indirizzi IP: ogni dominio di collisione
+    riceve una sottorete /prefixlen presa in ordine dal pool, e ogni
+    interfaccia collegata al dominio un indirizzo host di quella
+    sottorete (prima i router, così il gateway ha l'indirizzo .1).
+    
+    I domini sono visitati in ordine naturale del nome e i dispositivi
+    nell'ordine di devices_info, quindi a parità di topologia il risultato
+    è sempre lo stesso. Gli indirizzi già configurati vengono mantenuti
+    (a meno di overwrite=True): il loro dominio conserva la sua rete e le
+    sottoreti che si sovrappongono ad essa vengono saltate.
+    Complessità O(domini + interfacce). Aggiorna ip_addresses di ogni
+    dispositivo e restituisce {dominio: rete}.
+    """
+    try:
+        pool = ipaddress.IPv4Network(pool)
+    except ValueError as e:
+        raise ValueError(f"pool di indirizzi '{pool}' non valido: {e}")
+    if not pool.prefixlen <= prefixlen <= 32:
+        raise ValueError(f"la lunghezza del prefisso deve essere tra {pool.prefixlen} e 32")
+    
+    subnet_size = 1 << (32 - prefixlen)
+    # /31 e /32 non hanno indirizzi di rete e broadcast
+    first_host, last_host = (0, subnet_size - 1) if prefixlen >= 31 else (1, subnet_size - 2)
+    
+    # Interfacce per dominio (router prima) e reti già in uso
+    routers, others = {}, {}
+    fixed_networks = {}
+    used_hosts = {}
+    for device_name, device_data in devices_info.items():
+        if overwrite:
+            device_data['ip_addresses'] = {}
+        members = routers if device_data.get('is_router') else others
+        ip_addresses = device_data.get('ip_addresses', {})
+        interfaces = device_data['interfaces']
+        for eth_num in sorted(interfaces):
+            domain = interfaces[eth_num]
+            if eth_num in ip_addresses:
+                interface = ipaddress.IPv4Interface(ip_addresses[eth_num])
+                fixed_networks.setdefault(domain, interface.network)
+                used_hosts.setdefault(domain, set()).add(int(interface.ip))
+            else:
+                members.setdefault(domain, []).append((device_name, eth_num))
+    
+    # Intervalli già occupati, ordinati per la ricerca binaria, con la fine
+    # massima raggiunta fino a ogni posizione (le reti possono annidarsi)
+    reserved = sorted((int(net.network_address), int(net.broadcast_address))
+                      for net in fixed_networks.values())
+    reserved_starts = [start for start, end in reserved]
+    reserved_max_ends = []
+    for start, end in reserved:
+        reserved_max_ends.append(max(end, reserved_max_ends[-1]) if reserved_max_ends else end)
+    
+    def overlaps_reserved(start, end):
+        # Tra gli intervalli che iniziano prima della fine di [start, end]
+        # ce n'è uno che termina dopo il suo inizio?
+        index = bisect.bisect_right(reserved_starts, end)
+        return index > 0 and reserved_max_ends[index - 1] >= start
+    
+    domains = sorted(set(routers) | set(others) | set(fixed_networks), key=_natural_key)
+    cursor = int(pool.network_address)
+    pool_end = int(pool.broadcast_address)
+    allocated = {}
+    assigned = {}
+    
+    for domain in domains:
+        if domain in fixed_networks:
+            network = fixed_networks[domain]
+            base = int(network.network_address)
+            host_range = (range(base, base + network.num_addresses) if network.prefixlen >= 31
+                          else range(base + 1, base + network.num_addresses - 1))
+            domain_prefixlen = network.prefixlen
+        else:
+            while cursor + subnet_size - 1 <= pool_end and overlaps_reserved(cursor, cursor + subnet_size - 1):
+                cursor += subnet_size
+            if cursor + subnet_size - 1 > pool_end:
+                raise ValueError(f"pool {pool} esaurito: impossibile assegnare una /{prefixlen} al dominio {domain}")
+            base = cursor
+            cursor += subnet_size
+            network = ipaddress.IPv4Network((base, prefixlen))
+            host_range = range(base + first_host, base + last_host + 1)
+            domain_prefixlen = prefixlen
+        
+        allocated[domain] = network
+        used = used_hosts.get(domain, ())
+        hosts = (address for address in host_range if address not in used)
+        
+        for device_name, eth_num in routers.get(domain, []) + others.get(domain, []):
+            address = next(hosts, None)
+            if address is None:
+                raise ValueError(f"la rete {network} del dominio {domain} non ha abbastanza indirizzi")
+            assigned.setdefault(device_name, {})[eth_num] = f"{_int_to_ip(address)}/{domain_prefixlen}"
+    
+    # Un solo aggiornamento per dispositivo: con Device ip_addresses è in sola lettura
+    for device_name, new_addresses in assigned.items():
+        ip_addresses = dict(devices_info[device_name].get('ip_addresses') or {})
+        ip_addresses.update(new_addresses)
+        devices_info[device_name]['ip_addresses'] = ip_addresses
+    
+    return allocated
+
+def _parse_cidr(ip_input):
+    """Converte 'a.b.c.d/n' (già validato) in (indirizzo intero, prefisso)"""
+    ip_part, netmask = ip_input.split('/')
+    a, b, c, d = ip_part.split('.')
+    return (int(a) << 24) | (int(b) << 16) | (int(c) << 8) | int(d), int(netmask)
+
+def validate_addressing(devices_info):
+    """
+    Controlla in un solo passaggio tutti gli indirizzi del laboratorio:
+      - indirizzi IP duplicati;
+      - interfacce dello stesso dominio di collisione con sottoreti diverse;
+      - sottoreti di domini diversi che si sovrappongono;
+      - rotte statiche con un gateway fuori dalle sottoreti del dispositivo.
+    Usa un indice di intervalli [inizio, fine] delle sottoreti ordinato per
+    inizio, quindi il costo è O(n log n) nel numero di interfacce.
+    Restituisce la lista dei problemi trovati (vuota se è tutto corretto).
+    """
+    errors = []
+    addresses = []
+    domain_networks = {}
+    
+    for device_name, device_data in devices_info.items():
+        interfaces = device_data['interfaces']
+        for eth_num, ip_input in device_data.get('ip_addresses', {}).items():
+            address, prefixlen = _parse_cidr(ip_input)
+            host_bits = 32 - prefixlen
+            start = (address >> host_bits) << host_bits
+            end = start + (1 << host_bits) - 1
+            addresses.append((address, device_name, eth_num))
+            domain_networks.setdefault(interfaces[eth_num], {}).setdefault(
+                (start, end, prefixlen), []
+            ).append(f"{device_name} eth{eth_num}")
+        
+        # Il gateway di ogni rotta deve stare in una rete collegata
+        connected = [_parse_cidr(ip_input) for ip_input in device_data.get('ip_addresses', {}).values()]
+        for route in device_data.get('host_routes', []):
+            gateway, _ = _parse_cidr(f"{route['gateway']}/32")
+            if not any((gateway >> (32 - prefixlen)) == (address >> (32 - prefixlen))
+                       for address, prefixlen in connected):
+                errors.append(f"{device_name}: il gateway {route['gateway']} della rotta "
+                              f"{route['network']} non appartiene a nessuna rete collegata")
+    
+    # Indirizzi duplicati: dopo l'ordinamento sono adiacenti
+    addresses.sort()
+    for (address, device_name, eth_num), (next_address, next_device, next_eth) in zip(addresses, addresses[1:]):
+        if address == next_address:
+            errors.append(f"indirizzo {_int_to_ip(address)} duplicato: "
+                          f"{device_name} eth{eth_num} e {next_device} eth{next_eth}")
+    
+    # Sottoreti diverse nello stesso dominio di collisione
+    intervals = []
+    for domain in sorted(domain_networks, key=_natural_key):
+        networks = domain_networks[domain]
+        if len(networks) > 1:
+            details = "; ".join(f"{_int_to_ip(start)}/{prefixlen} ({', '.join(members)})"
+                                for (start, end, prefixlen), members in networks.items())
+            errors.append(f"dominio {domain} con sottoreti diverse: {details}")
+        for start, end, prefixlen in networks:
+            intervals.append((start, -end, prefixlen, domain))
+    
+    # Sovrapposizioni tra domini: scorrendo gli intervalli ordinati basta
+    # confrontare ognuno con quello che finora arriva più lontano
+    intervals.sort()
+    widest = None
+    for start, neg_end, prefixlen, domain in intervals:
+        end = -neg_end
+        if widest is not None and start <= widest[1] and domain != widest[3]:
+            errors.append(f"la rete {_int_to_ip(start)}/{prefixlen} (dominio {domain}) si sovrappone "
+                          f"a {_int_to_ip(widest[0])}/{widest[2]} (dominio {widest[3]})")
+        if widest is None or end > widest[1]:
+            widest = (start, end, prefixlen, domain)
+    
+    return errors
+
+def validate_device_addressing(device_name, device_data, domains, intervals):
+    """
+    Versione incrementale di validate_addressing per la generazione in
+    streaming: controlla gli indirizzi di un dispositivo rispetto ai
+    domini già visti e aggiorna lo stato, che cresce con i domini e con
+    le interfacce indirizzate (servono tutte per trovare i duplicati):
+      - domains: {dominio: (inizio, prefisso, primo membro, {indirizzo: membro})};
+      - intervals: lista ordinata (inizio, fine, prefisso, dominio) delle
+        sottoreti, disgiunte, in cui cercare le sovrapposizioni con bisect.
+    Restituisce la lista dei problemi trovati per il dispositivo.
+    """
+    errors = []
+    interfaces = device_data['interfaces']
+    connected = []
+    for eth_num, ip_input in device_data.get('ip_addresses', {}).items():
+        address, prefixlen = _parse_cidr(ip_input)
+        connected.append((address, prefixlen))
+        host_bits = 32 - prefixlen
+        start = (address >> host_bits) << host_bits
+        end = start + (1 << host_bits) - 1
+        domain = interfaces[eth_num]
+        member = f"{device_name} eth{eth_num}"
+        
+        state = domains.get(domain)
+        if state is None:
+            # Le sottoreti già viste sono disgiunte: basta confrontare la
+            # nuova con quella che la precede e quella che la segue
+            position = bisect.bisect_left(intervals, (start,))
+            overlaps = [interval for interval in intervals[max(position - 1, 0):position + 1]
+                        if interval[0] <= end and start <= interval[1]]
+            for other_start, _, other_prefixlen, other_domain in overlaps:
+                errors.append(f"la rete {_int_to_ip(start)}/{prefixlen} (dominio {domain}) si sovrappone "
+                              f"a {_int_to_ip(other_start)}/{other_prefixlen} (dominio {other_domain})")
+            if not overlaps:
+                intervals.insert(position, (start, end, prefixlen, domain))
+            state = domains[domain] = (start, prefixlen, member, {})
+        elif state[:2] != (start, prefixlen):
+            errors.append(f"dominio {domain} con sottoreti diverse: {_int_to_ip(state[0])}/{state[1]} "
+                          f"({state[2]}); {_int_to_ip(start)}/{prefixlen} ({member})")
+            continue
+        
+        used = state[3]
+        if address in used:
+            errors.append(f"indirizzo {_int_to_ip(address)} duplicato: {used[address]} e {member}")
+        else:
+            used[address] = member
+    
+    # Il gateway di ogni rotta deve stare in una rete collegata
+    for route in device_data.get('host_routes', []):
+        gateway, _ = _parse_cidr(f"{route['gateway']}/32")
+        if not any((gateway >> (32 - prefixlen)) == (address >> (32 - prefixlen))
+                   for address, prefixlen in connected):
+            errors.append(f"{device_name}: il gateway {route['gateway']} della rotta "
+                          f"{route['network']} non appartiene a nessuna rete collegata")
+    
+    return errors
+
+def build_domain_index(devices_info):
+    """
+    Indicizza la topologia come grafo bipartito dispositivi/domini di
+    collisione: restituisce {dominio: [(device_name, eth_num), ...]}
+    nell'ordine di devices_info
+    """
+    domain_index = {}
+    for device_name, device_data in devices_info.items():
+        interfaces = device_data['interfaces']
+        for eth_num in sorted(interfaces):
+            domain_index.setdefault(interfaces[eth_num], []).append((device_name, eth_num))
+    return domain_index
+
+def domain_networks(devices_info):
+    """Restituisce {dominio: 'rete/prefisso'} ricavato dagli IP configurati"""
+    networks = {}
+    for device_data in devices_info.values():
+        interfaces = device_data['interfaces']
+        for eth_num, ip_input in device_data.get('ip_addresses', {}).items():
+            domain = interfaces[eth_num]
+            if domain not in networks:
+                address, prefixlen = _parse_cidr(ip_input)
+                host_bits = 32 - prefixlen
+                networks[domain] = f"{_int_to_ip((address >> host_bits) << host_bits)}/{prefixlen}"
+    return networks
+
+def _nearest_gateway(devices_info, domain_index, sources):
+    """
+    Visita in ampiezza (BFS) il grafo attraversando solo i router, partendo
+    contemporaneamente da più router sorgente [(etichetta, router)] in
+    ordine di priorità. Restituisce {dominio: etichetta della sorgente più
+    vicina}; a parità di distanza vince la sorgente elencata prima.
+    """
+    owner = {}
+    visited = set()
+    queue = deque()
+    for label, router in sources:
+        if router not in visited:
+            visited.add(router)
+            queue.append((router, label))
+    
+    while queue:
+        router, label = queue.popleft()
+        for domain in devices_info[router]['interfaces'].values():
+            if domain in owner:
+                continue
+            owner[domain] = label
+            for member, _ in domain_index[domain]:
+                if member not in visited and devices_info[member].get('is_router'):
+                    visited.add(member)
+                    queue.append((member, label))
+    
+    return owner
+
+def derive_host_routes(devices_info, overwrite=False):
+    """
+    Calcola automaticamente le rotte di host e server a partire dal grafo
+    della topologia:
+      - il default gateway è il primo router (nell'ordine di devices_info)
+        sulla prima interfaccia che ne ha uno;
+      - per i dispositivi collegati a più domini con router, una visita
+        BFS multi-sorgente sui router assegna ogni rete remota al gateway
+        più vicino, e per le reti raggiunte meglio da un gateway diverso
+        da quello di default viene aggiunta una rotta statica.
+    I dispositivi con un solo dominio "instradato" costano O(interfacce),
+    quindi migliaia di host vengono risolti in un passaggio. Le rotte
+    inserite a mano vengono mantenute (a meno di overwrite=True).
+    Restituisce la lista dei dispositivi per cui non esiste alcun gateway.
+    """
+    domain_index = build_domain_index(devices_info)
+    networks = domain_networks(devices_info)
+    unreachable = []
+    
+    for device_name, device_data in devices_info.items():
+        if device_data.get('is_router') or (device_data.get('host_routes') and not overwrite):
+            continue
+        
+        # Gateway candidati: (eth, router, IP del router) per ogni interfaccia
+        ip_addresses = device_data.get('ip_addresses', {})
+        gateways = []
+        interfaces = device_data['interfaces']
+        for eth_num in sorted(ip_addresses):
+            domain = interfaces[eth_num]
+            for member, member_eth in domain_index[domain]:
+                member_data = devices_info[member]
+                if not member_data.get('is_router'):
+                    continue
+                member_addresses = member_data.get('ip_addresses', {})
+                if member_eth in member_addresses:
+                    gateways.append((eth_num, member, member_addresses[member_eth].split('/')[0]))
+                    break
+        
+        if not gateways:
+            if ip_addresses:
+                unreachable.append(device_name)
+            continue
+        
+        default_eth, _, default_gateway = gateways[0]
+        routes = [{'network': 'default', 'gateway': default_gateway, 'is_default': True}]
+        
+        if len(gateways) > 1:
+            owner = _nearest_gateway(
+                devices_info, domain_index, [(eth_num, router) for eth_num, router, _ in gateways]
+            )
+            gateway_by_eth = {eth_num: gateway for eth_num, _, gateway in gateways}
+            connected = set(device_data['interfaces'].values())
+            for domain in sorted(owner, key=_natural_key):
+                eth_num = owner[domain]
+                if eth_num != default_eth and domain not in connected and domain in networks:
+                    routes.append({'network': networks[domain], 'gateway': gateway_by_eth[eth_num],
+                                   'is_default': False})
+        
+        device_data['host_routes'] = routes
+    
+    return unreachable
+
+def _propagate_routes(seeds, adverts, max_metric=None, split_horizon=False):
+    """
+    Cammini minimi di un IGP (RIP, OSPF) verso tutte le reti insieme: è
+    l'algoritmo di Dijkstra a bucket (Dial) in cui ogni evento porta un
+    insieme di reti come bitset (intero Python) invece di una sola rete,
+    quindi il costo cresce con i router e le metriche distinte, non con
+    router x reti. seeds è {router: {(metrica, rete): bitset}} delle reti
+    annunciate direttamente (rete del next hop, None se collegate),
+    adverts {router: [(vicino, costo, next_hop, rete)]} i router che
+    ricevono i suoi annunci sulla rete in comune, con il costo
+    dell'interfaccia del vicino e l'indirizzo che userà come next hop.
+    Con split_horizon le rotte non vengono annunciate sulla rete del loro
+    next hop; quelle oltre max_metric vengono scartate (RIP: 16 =
+    irraggiungibile). A parità di metrica vince il primo annuncio: si
+    segue un solo cammino. Restituisce {router: {next_hop: bitset}}.
+    """
+    reached = {}
+    routes = {}
+    pending = {}
+    metrics = []
+    
+    def offer(metric, router, next_hop, segment, bits):
+        if not bits or (max_metric is not None and metric > max_metric):
+            return
+        bucket = pending.get(metric)
+        if bucket is None:
+            bucket = pending[metric] = {}
+            heapq.heappush(metrics, metric)
+        bucket.setdefault(router, []).append((next_hop, segment, bits))
+    
+    for router, by_metric in seeds.items():
+        for (metric, segment), bits in by_metric.items():
+            offer(metric, router, None, segment, bits)
+    
+    while metrics:
+        metric = heapq.heappop(metrics)
+        for router, offers in pending.pop(metric).items():
+            known = reached.get(router, 0)
+            learned = 0
+            by_segment = {}
+            for next_hop, segment, bits in offers:
+                fresh = bits & ~known
+                if not fresh:
+                    continue
+                known |= fresh
+                learned |= fresh
+                if segment is not None:
+                    by_segment[segment] = by_segment.get(segment, 0) | fresh
+                if next_hop is not None:
+                    table = routes.setdefault(router, {})
+                    table[next_hop] = table.get(next_hop, 0) | fresh
+            if not learned:
+                continue
+            reached[router] = known
+            for neighbor, cost, next_hop, segment in adverts.get(router, ()):
+                bits = learned & ~by_segment.get(segment, 0) if split_horizon else learned
+                offer(metric + cost, neighbor, next_hop, segment, bits)
+    return routes
+
+def _propagate_bgp(origins, adverts, clients, as_numbers, as_networks):
+    """
+    Migliori rotte BGP verso tutte le reti insieme, come _propagate_routes:
+    la chiave di ogni evento è 2 x lunghezza dell'AS path + 1 se la rotta
+    arriva da iBGP, quindi vince l'AS path più corto e a parità l'eBGP.
+    origins è {router: bitset} delle reti annunciate con network, adverts
+    {router: [(vicino, ebgp, indirizzo, next_hop_self)]} le sessioni
+    stabilite, clients {riflettore: {client}}. Verso l'iBGP si annunciano
+    solo le rotte locali o imparate via eBGP, a meno che il router sia un
+    route reflector; verso l'eBGP si scartano le reti originate dall'AS del
+    vicino (al posto del controllo dell'AS path).
+    Restituisce {router: {(next_hop, ibgp): bitset}}.
+    """
+    reached = {}
+    routes = {}
+    pending = {}
+    keys = []
+    
+    def offer(key, router, sender, next_hop, bits):
+        if not bits:
+            return
+        bucket = pending.get(key)
+        if bucket is None:
+            bucket = pending[key] = {}
+            heapq.heappush(keys, key)
+        bucket.setdefault(router, []).append((sender, next_hop, bits))
+    
+    for router, bits in origins.items():
+        offer(0, router, None, None, bits)
+    
+    while keys:
+        key = heapq.heappop(keys)
+        # Le rotte riflesse restano con la stessa chiave: stesso bucket
+        while key in pending:
+            for router, offers in pending.pop(key).items():
+                known = reached.get(router, 0)
+                learned = []
+                for sender, next_hop, bits in offers:
+                    fresh = bits & ~known
+                    if not fresh:
+                        continue
+                    known |= fresh
+                    learned.append((sender, next_hop, fresh))
+                    if sender is not None:
+                        table = routes.setdefault(router, {})
+                        tag = (next_hop, bool(key & 1))
+                        table[tag] = table.get(tag, 0) | fresh
+                if not learned:
+                    continue
+                reached[router] = known
+                
+                learned_bits = 0
+                for _, _, bits in learned:
+                    learned_bits |= bits
+                reflected = clients.get(router, ())
+                for peer, ebgp, address, next_hop_self in adverts.get(router, ()):
+                    if ebgp:
+                        offer((key // 2 + 1) * 2, peer, router, address,
+                              learned_bits & ~as_networks[as_numbers[peer]])
+                    elif not key & 1:
+                        for sender, next_hop, bits in learned:
+                            own = sender is None or next_hop_self
+                            offer(key + 1, peer, router, address if own else next_hop, bits)
+                    elif reflected:
+                        for sender, next_hop, bits in learned:
+                            if sender in reflected or peer in reflected:
+                                offer(key, peer, router, next_hop, bits)
+    return routes
+
+def simulate_lab(devices_info):
+    """
+    Simula il piano di controllo del laboratorio senza avviare i container.
+    Ogni router usa il suo frr.conf: quello letto dal laboratorio con
+    load_lab (modifiche manuali comprese) o, per una specifica, quello che
+    render_frr_conf genererebbe, letti entrambi da parse_frr_conf. Delle
+    sezioni router rip/ospf/bgp contano le righe network (interfacce
+    attivate, reti annunciate dal BGP anche aggregate), redistribute
+    (connected, kernel/static = rotte dei .startup, bgp, ospf, rip) e le
+    route di RIP (prefissi annunciati dal router, anche aggregati); con le
+    rotte statiche dei .startup calcola le rotte migliori, le sceglie
+    per prefisso più lungo e poi per distanza amministrativa come zebra e
+    segue l'inoltro da ogni dispositivo verso ogni rete.
+    Le reti sono bit di un intero (ordinate per indirizzo, così un
+    prefisso è un intervallo di bit), quindi ogni passo lavora su tutte le
+    reti insieme e migliaia di router si simulano in pochi secondi.
+    Semplificazioni: le aree OSPF sono trattate come un'unica area, le
+    rotte esterne OSPF perdono sempre contro quelle interne, le sessioni
+    iBGP si considerano raggiungibili, a parità di costo si segue un solo
+    cammino e le policy BGP sono ignorate.
+    Restituisce un dizionario con reti e dispositivi simulati, coppie
+    (dispositivo, rete) consegnate, in un buco nero o in un ciclo, esempi
+    con il percorso seguito e le sessioni BGP non stabilite.
+    """
+    devices = {name: Device.from_dict(data) for name, data in devices_info.items()}
+    names = sorted(devices, key=_natural_key)
+    
+    # Reti ordinate per indirizzo: quelle contenute in un prefisso sono bit consecutivi
+    network_domains = {}
+    for name in names:
+        for interface in devices[name].interfaces:
+            if interface.address is not None:
+                host_bits = 32 - interface.prefixlen
+                network = ((interface.address >> host_bits) << host_bits, interface.prefixlen)
+                network_domains.setdefault(network, interface.domain)
+    networks = sorted(network_domains)
+    position = {network: index for index, network in enumerate(networks)}
+    starts = [start for start, _ in networks]
+    ends = [start + (1 << (32 - prefixlen)) for start, prefixlen in networks]
+    all_bits = (1 << len(networks)) - 1
+    
+    def network_of(address):
+        index = bisect.bisect_right(starts, address) - 1
+        return index if index >= 0 and address < ends[index] else None
+    
+    def prefix_bits(network, prefixlen):
+        low = bisect.bisect_left(starts, network)
+        high = bisect.bisect_left(starts, network + (1 << (32 - prefixlen)))
+        return ((1 << (high - low)) - 1) << low
+    
+    # Prefissi annunciati che non sono reti del laboratorio (network
+    # aggregate, rotte statiche ridistribuite): bit oltre quelli delle reti
+    aggregates = []
+    aggregate_index = {}
+    
+    def prefix_bit(network, prefixlen):
+        host_bits = 32 - prefixlen
+        prefix = ((network >> host_bits) << host_bits, prefixlen)
+        index = position.get(prefix)
+        if index is None:
+            index = aggregate_index.get(prefix)
+            if index is None:
+                index = aggregate_index[prefix] = len(networks) + len(aggregates)
+                aggregates.append((prefix, prefix_bits(*prefix)))
+        return 1 << index
+    
+    attached = {}
+    owners = {}
+    segments = [[] for _ in networks]
+    for name in names:
+        bits = 0
+        for interface in devices[name].interfaces:
+            if interface.address is None:
+                continue
+            host_bits = 32 - interface.prefixlen
+            index = position[((interface.address >> host_bits) << host_bits, interface.prefixlen)]
+            bits |= 1 << index
+            owners[interface.address] = name
+            segments[index].append((name, interface))
+        attached[name] = bits
+    
+    def next_device(name, address):
+        """Dispositivo che possiede address su una rete di name (None se non c'è)"""
+        owner = owners.get(address)
+        index = network_of(address)
+        if owner is None or owner == name or index is None:
+            return None
+        return owner if attached[name] >> index & 1 and attached[owner] >> index & 1 else None
+    
+    # frr.conf di ogni router: letto dal laboratorio o quello che verrebbe generato
+    domain_index = build_domain_index(devices_info)
+    configs = {}
+    for name in names:
+        device = devices[name]
+        if not device.is_router or not attached[name]:
+            continue
+        if 'frr_sections' in device:
+            configs[name] = device
+            continue
+        if not device.routing_protocol:
+            continue
+        # None: il template viene copiato da completare a mano, nessun protocollo attivo
+        frr_conf = render_frr_conf(name, devices_info, domain_index)
+        if frr_conf is not None:
+            config = {'ip_addresses': device['ip_addresses']}
+            parse_frr_conf(frr_conf.splitlines(), config)
+            configs[name] = config
+    
+    sections = {protocol: {} for protocol in ("ospf", "rip", "bgp")}
+    enabled = {"ospf": {}, "rip": {}}
+    for name, config in configs.items():
+        for protocol, section in config['frr_sections'].items():
+            if protocol not in sections:
+                continue
+            sections[protocol][name] = section
+            if protocol in enabled:
+                statements = [_parse_cidr(network) for network in section['networks']]
+                enabled[protocol][name] = {
+                    interface.eth for interface in devices[name].interfaces
+                    if interface.address is not None and any(
+                        interface.address >> (32 - prefixlen) == network >> (32 - prefixlen)
+                        for network, prefixlen in statements
+                    )
+                }
+    
+    static_routes = {}
+    for name in configs:
+        by_segment = {}
+        for route in devices[name].routes:
+            bit = prefix_bit(0, 0) if route.is_default else prefix_bit(route.network, route.prefixlen)
+            segment = network_of(route.gateway)
+            by_segment[segment] = by_segment.get(segment, 0) | bit
+        static_routes[name] = by_segment
+    
+    def by_next_hop(routes):
+        """{next_hop: bitset} -> {rete del next hop: bitset}, per lo split horizon"""
+        by_segment = {}
+        for next_hop, bits in routes.items():
+            segment = network_of(next_hop)
+            by_segment[segment] = by_segment.get(segment, 0) | bits
+        return by_segment
+    
+    def redistributed(name, section, learned):
+        """Reti che name ridistribuisce o annuncia (route di RIP) nella sezione: {rete del next hop: bitset}"""
+        by_segment = {}
+        for network in section.get('routes', ()):
+            by_segment[None] = by_segment.get(None, 0) | prefix_bit(*_parse_cidr(network))
+        for source in section['redistribute']:
+            if source == "connected":
+                sources = {None: attached[name]}
+            elif source in ("kernel", "static"):
+                sources = static_routes[name]
+            else:
+                sources = learned.get(source, {}).get(name, {})
+            for segment, bits in sources.items():
+                by_segment[segment] = by_segment.get(segment, 0) | bits
+        return by_segment
+    
+    # BGP: sessioni stabilite solo se configurate da entrambi i lati con l'AS giusto
+    speakers = {name: configs[name]['as_number'] for name in sections["bgp"]
+                if configs[name].get('as_number') is not None}
+    configured = {name: [(_parse_cidr(f"{neighbor['IP_ADDRESS']}/32")[0], neighbor)
+                         for neighbor in configs[name].get('bgp_neighbors') or ()
+                         if FRR_CIDR_RE.match(f"{neighbor['IP_ADDRESS']}/32")]
+                  for name in speakers}
+    peer_entries = {name: {owners.get(address): neighbor for address, neighbor in entries}
+                    for name, entries in configured.items()}
+    
+    sessions = {}
+    clients = {}
+    sessions_down = []
+    established = 0
+    for name in speakers:
+        for address, neighbor in configured[name]:
+            peer = owners.get(address)
+            remote_as = neighbor['AS_NUMBER']
+            ebgp = remote_as != speakers[name]
+            if peer not in speakers:
+                problem = "nessun router BGP con questo indirizzo"
+            elif speakers[peer] != remote_as:
+                problem = f"il vicino è nell'AS {speakers[peer]}, non {remote_as}"
+            elif name not in peer_entries[peer]:
+                problem = f"{peer} non ha una sessione verso {name}"
+            elif ebgp and next_device(name, address) != peer:
+                problem = "vicino eBGP non direttamente collegato"
+            else:
+                problem = None
+            if problem:
+                sessions_down.append((name, neighbor['IP_ADDRESS'], problem))
+                continue
+            established += 1
+            # Il vicino annuncia a name usando come next hop l'indirizzo configurato da name
+            peer_extra = peer_entries[peer][name].get('extra', ())
+            sessions.setdefault(peer, []).append(
+                (name, ebgp, address, any(line.endswith("next-hop-self") for line in peer_extra))
+            )
+            if any(line.endswith("route-reflector-client") for line in neighbor.get('extra', ())):
+                clients.setdefault(name, set()).add(peer)
+    
+    network_origins = {}
+    for name in speakers:
+        bits = 0
+        for network in sections["bgp"][name]['networks']:
+            bits |= prefix_bit(*_parse_cidr(network))
+        network_origins[name] = bits
+    
+    def bgp_routes_from(learned):
+        origins = {}
+        as_networks = {}
+        for name, as_number in speakers.items():
+            bits = network_origins[name]
+            for more in redistributed(name, sections["bgp"][name], learned).values():
+                bits |= more
+            origins[name] = bits
+            as_networks[as_number] = as_networks.get(as_number, 0) | bits
+        return _propagate_bgp(origins, sessions, clients, speakers, as_networks)
+    
+    def igp_routes(protocol, cost_of, learned, max_metric=None, split_horizon=False, extra_metric=1):
+        routers = enabled[protocol]
+        seeds = {}
+        adverts = {}
+        for index, segment in enumerate(segments):
+            members = [(name, interface) for name, interface in segment
+                       if interface.eth in routers.get(name, ())]
+            for name, interface in members:
+                key = (cost_of(name, interface), None)
+                by_metric = seeds.setdefault(name, {})
+                by_metric[key] = by_metric.get(key, 0) | (1 << index)
+                for neighbor, neighbor_interface in members:
+                    if neighbor != name:
+                        adverts.setdefault(name, []).append(
+                            (neighbor, cost_of(neighbor, neighbor_interface), interface.address, index)
+                        )
+        
+        def run(extra):
+            all_seeds = {name: dict(by_metric) for name, by_metric in seeds.items()}
+            for name, by_segment in extra.items():
+                by_metric = all_seeds.setdefault(name, {})
+                for segment, bits in by_segment.items():
+                    key = (extra_metric, segment)
+                    by_metric[key] = by_metric.get(key, 0) | bits
+            return _propagate_routes(all_seeds, adverts, max_metric, split_horizon)
+        
+        # Le rotte iBGP (distanza 200) perdono contro quelle dell'IGP: si
+        # ridistribuiscono solo dove l'IGP non le conosce già
+        extra = {}
+        internal = {}
+        for name, section in sections[protocol].items():
+            if name not in routers:
+                continue
+            extra[name] = redistributed(name, section, learned)
+            if "bgp" in section['redistribute']:
+                internal[name] = learned.get("ibgp", {}).get(name, {})
+        routes = run(extra)
+        missing = False
+        for name, by_segment in internal.items():
+            known = attached[name]
+            for bits in itertools.chain(routes.get(name, {}).values(), extra[name].values()):
+                known |= bits
+            for segment, bits in by_segment.items():
+                bits &= ~known
+                if bits:
+                    extra[name][segment] = extra[name].get(segment, 0) | bits
+                    missing = True
+        return run(extra) if missing else routes
+    
+    def ospf_cost(name, interface):
+        costs = sections["ospf"][name].get('costs', {})
+        return int(costs.get(interface.eth, costs.get(str(interface.eth), OSPF_DEFAULT_COST)))
+    
+    rip_cost = lambda name, interface: 1
+    
+    # Le ridistribuzioni tra protocolli dipendono l'una dall'altra: un
+    # secondo giro usa le rotte IGP del primo
+    mutual = any(source in ("ospf", "rip") for section in sections["bgp"].values()
+                 for source in section['redistribute'])
+    mutual = mutual or any("rip" in section['redistribute'] for section in sections["ospf"].values())
+    ospf_routes, rip_routes = {}, {}
+    for _ in range(2 if mutual else 1):
+        learned = {
+            "ospf": {name: by_next_hop(routes) for name, routes in ospf_routes.items()},
+            "rip": {name: by_next_hop(routes) for name, routes in rip_routes.items()},
+        }
+        bgp_routes = bgp_routes_from(learned)
+        for tag, key in (("bgp", False), ("ibgp", True)):
+            learned[tag] = {
+                name: by_next_hop({next_hop: bits for (next_hop, ibgp), bits in routes.items() if ibgp == key})
+                for name, routes in bgp_routes.items()
+            }
+        ospf_routes = igp_routes("ospf", ospf_cost, learned, extra_metric=OSPF_EXTERNAL_METRIC)
+        learned["ospf"] = {name: by_next_hop(routes) for name, routes in ospf_routes.items()}
+        rip_routes = igp_routes("rip", rip_cost, learned, RIP_INFINITY - 1, split_horizon=True)
+    
+    # Tabella di inoltro di ogni dispositivo: {dispositivo successivo: bitset}
+    high_shift = len(networks)
+    fib = {}
+    no_route = {}
+    unresolved = {}
+    for name in names:
+        device = devices[name]
+        remaining = all_bits & ~attached[name]
+        table = {}
+        broken = 0
+        
+        def install(bits, target):
+            nonlocal remaining, broken
+            take = bits & remaining
+            if not take:
+                return
+            remaining &= ~take
+            if target is None:
+                broken |= take
+            else:
+                table[target] = table.get(target, 0) | take
+        
+        igp_tables = (ospf_routes.get(name, {}), rip_routes.get(name, {}))
+        
+        def resolve(next_hop):
+            target = next_device(name, next_hop)
+            index = network_of(next_hop)
+            if target is not None or index is None:
+                return target
+            # Next hop remoto (iBGP): si raggiunge con la rotta IGP verso la sua rete
+            covering = 1 << index
+            for offset, ((network, prefixlen), _) in enumerate(aggregates):
+                if next_hop >> (32 - prefixlen) == network >> (32 - prefixlen):
+                    covering |= 1 << (high_shift + offset)
+            for routes in igp_tables:
+                for hop, bits in routes.items():
+                    if bits & covering:
+                        return next_device(name, hop)
+            return None
+        
+        # (distanza, next hop, bitset, next hop da risolvere con l'IGP)
+        candidates = []
+        for route in device.routes:
+            bit = prefix_bit(0, 0) if route.is_default else prefix_bit(route.network, route.prefixlen)
+            candidates.append((1, route.gateway, bit, False))
+        bgp = bgp_routes.get(name, {})
+        for (next_hop, ibgp), bits in bgp.items():
+            candidates.append((ADMIN_DISTANCES["ibgp" if ibgp else "ebgp"], next_hop, bits, True))
+        for protocol, routes in zip(("ospf", "rip"), igp_tables):
+            for next_hop, bits in routes.items():
+                candidates.append((ADMIN_DISTANCES[protocol], next_hop, bits, True))
+        candidates.sort(key=lambda candidate: candidate[0])
+        
+        # Prima le rotte verso una rete del laboratorio per distanza, poi
+        # quelle aggregate per prefisso più lungo
+        covering = []
+        for distance, next_hop, bits, recursive in candidates:
+            target = resolve(next_hop) if recursive else next_device(name, next_hop)
+            install(bits, target)
+            high = bits >> high_shift
+            while high:
+                low = high & -high
+                (_, prefixlen), covered = aggregates[low.bit_length() - 1]
+                covering.append((-prefixlen, distance, covered, target))
+                high ^= low
+        covering.sort(key=lambda entry: entry[:2])
+        for _, _, covered, target in covering:
+            install(covered, target)
+        
+        fib[name] = table
+        no_route[name] = remaining
+        unresolved[name] = broken
+    
+    # Punto fisso dell'inoltro: una rete è consegnata (o persa) da un
+    # dispositivo se lo è dal dispositivo a cui la inoltra
+    delivered = dict(attached)
+    lost = {name: no_route[name] | unresolved[name] for name in names}
+    changed = True
+    while changed:
+        changed = False
+        for name in names:
+            done, dropped = delivered[name], lost[name]
+            for target, bits in fib[name].items():
+                done |= bits & delivered[target]
+                dropped |= bits & lost[target]
+            if done != delivered[name] or dropped != lost[name]:
+                delivered[name], lost[name] = done, dropped
+                changed = True
+    
+    def label(index):
+        start, prefixlen = networks[index]
+        return f"{_int_to_ip(start)}/{prefixlen} ({network_domains[networks[index]]})"
+    
+    def trace(name, index):
+        path = [name]
+        while not attached[path[-1]] >> index & 1:
+            current = path[-1]
+            if no_route[current] >> index & 1:
+                return path, "nessuna rotta"
+            if unresolved[current] >> index & 1:
+                return path, "next hop irraggiungibile"
+            path.append(next(target for target, bits in fib[current].items() if bits >> index & 1))
+            if path[-1] in path[:-1]:
+                return path, "ciclo"
+        return path, None
+    
+    sources = [name for name in names if attached[name]]
+    result = {'devices': len(sources), 'networks': len(networks), 'pairs': len(sources) * len(networks),
+              'delivered': 0, 'black_holes': 0, 'loops': 0, 'unreachable': {}, 'samples': [],
+              'sessions': established, 'sessions_down': sessions_down}
+    for name in sources:
+        reached = bin(delivered[name]).count("1")
+        black_holes = bin(lost[name]).count("1")
+        result['delivered'] += reached
+        result['black_holes'] += black_holes
+        result['loops'] += len(networks) - reached - black_holes
+        missing = all_bits & ~delivered[name]
+        if missing:
+            result['unreachable'][name] = len(networks) - reached
+            if len(result['samples']) < SIMULATION_SAMPLES:
+                index = (missing & -missing).bit_length() - 1
+                path, reason = trace(name, index)
+                result['samples'].append((name, label(index), path, reason))
+    return result
+
+def show_simulation(result):
+    """Mostra il risultato di simulate_lab. Restituisce False se ci sono problemi"""
+    print("\n🧪 SIMULAZIONE DEL PIANO DI CONTROLLO")
+    print("-" * 35)
+    print(f"Dispositivi: {result['devices']}, reti: {result['networks']}, "
+          f"sessioni BGP stabilite: {result['sessions']}")
+    for name, address, problem in result['sessions_down'][:SIMULATION_SAMPLES]:
+        print(f"⚠️  Sessione BGP {name} -> {address} non stabilita: {problem}")
+    if len(result['sessions_down']) > SIMULATION_SAMPLES:
+        print(f"   ... e altre {len(result['sessions_down']) - SIMULATION_SAMPLES} sessioni")
+    
+    print(f"Coppie (dispositivo, rete) raggiunte: {result['delivered']}/{result['pairs']}")
+    if not result['unreachable']:
+        if result['sessions_down']:
+            return False
+        print("✅ Ogni dispositivo raggiunge tutte le reti del laboratorio")
+        return True
+    
+    print(f"❌ {result['black_holes']} coppie finiscono in un buco nero, {result['loops']} in un ciclo "
+          f"({len(result['unreachable'])} dispositivi non raggiungono tutte le reti)")
+    for name, network, path, reason in result['samples']:
+        print(f"  • {name} -> {network}: {reason} ({' -> '.join(path)})")
+    if len(result['unreachable']) > len(result['samples']):
+        print(f"   ... e altri {len(result['unreachable']) - len(result['samples'])} dispositivi")
+    return False
+
+def _topology(routers, links, lans, protocol="ospf", as_numbers=None):
+    """
+    Costruisce devices_info dai router (nomi), dai collegamenti punto-punto
+    tra router (coppie di nomi, un dominio Ln ciascuno) e dalle LAN di host
+    (coppie router, [nomi host], un dominio LANn ciascuna). Le interfacce
+    vengono numerate nell'ordine dei collegamenti; gli indirizzi si
+    assegnano poi con allocate_ip_addresses. Con protocol="bgp" e senza
+    as_numbers ogni router ha un AS proprio (1, 2, ... nell'ordine di
+    routers) e tutte le sessioni sono eBGP, come nei data center BGP.
+    Tempo lineare nel numero di collegamenti.
+    """
+    if protocol == "bgp" and as_numbers is None:
+        as_numbers = {router: as_num for as_num, router in enumerate(routers, 1)}
+    
+    ports = {router: [] for router in routers}
+    for link_num, (first, second) in enumerate(links):
+        domain = f"L{link_num}"
+        ports[first].append(domain)
+        ports[second].append(domain)
+    
+    router_image = DEVICE_TYPES["router"][0]
+    host_image = DEVICE_TYPES["host"][0]
+    host_devices = {}
+    for lan_num, (router, host_names) in enumerate(lans):
+        domain = f"LAN{lan_num}"
+        ports[router].append(domain)
+        for host_name in host_names:
+            host_devices[host_name] = Device(host_image, "host", interfaces=[Interface(0, domain)])
+    
+    devices_info = {
+        router: Device(router_image, "router", protocol,
+                       [Interface(eth_num, domain) for eth_num, domain in enumerate(domains)],
+                       as_number=as_numbers[router] if as_numbers else None)
+        for router, domains in ports.items()
+    }
+    devices_info.update(host_devices)
+    return devices_info
+
+def _router_lans(routers, hosts_per_router):
+    """Una LAN con hosts_per_router host per ogni router (nessuna se 0)"""
+    if hosts_per_router < 1:
+        return []
+    return [(router, [f"h{router}_{host_num}" for host_num in range(hosts_per_router)])
+            for router in routers]
+
+def fat_tree_topology(k=4, hosts_per_edge=None, protocol="ospf"):
+    """
+    Fat-tree k-ario: (k/2)^2 router core, k pod con k/2 router aggregation
+    e k/2 edge ciascuno (collegati tutti con tutti), una LAN di host per
+    ogni edge (k/2 host di default, k^3/4 in totale). L'aggregation i di
+    ogni pod è collegato ai core i*k/2 ... i*k/2 + k/2 - 1.
+    """
+    if k < 2 or k % 2:
+        raise ValueError("k deve essere un numero pari maggiore o uguale a 2")
+    half = k // 2
+    if hosts_per_edge is None:
+        hosts_per_edge = half
+    
+    cores = [f"core{core_num}" for core_num in range(half * half)]
+    aggs = [[f"agg{pod}_{agg_num}" for agg_num in range(half)] for pod in range(k)]
+    edges = [[f"edge{pod}_{edge_num}" for edge_num in range(half)] for pod in range(k)]
+    
+    links = []
+    for pod in range(k):
+        for agg_num, agg in enumerate(aggs[pod]):
+            links.extend((cores[agg_num * half + core_num], agg) for core_num in range(half))
+            links.extend((agg, edge) for edge in edges[pod])
+    
+    lans = []
+    if hosts_per_edge > 0:
+        lans = [(edges[pod][edge_num], [f"h{pod}_{edge_num}_{host_num}" for host_num in range(hosts_per_edge)])
+                for pod in range(k) for edge_num in range(half)]
+    
+    routers = cores + [agg for pod in aggs for agg in pod] + [edge for pod in edges for edge in pod]
+    return _topology(routers, links, lans, protocol)
+
+def leaf_spine_topology(spines=2, leaves=4, hosts_per_leaf=2, protocol="ospf"):
+    """Leaf-spine: ogni leaf collegato a ogni spine, una LAN di host per leaf"""
+    spine_names = [f"spine{spine_num}" for spine_num in range(spines)]
+    leaf_names = [f"leaf{leaf_num}" for leaf_num in range(leaves)]
+    links = [(spine, leaf) for leaf in leaf_names for spine in spine_names]
+    return _topology(spine_names + leaf_names, links, _router_lans(leaf_names, hosts_per_leaf), protocol)
+
+def ring_topology(routers=4, hosts_per_router=1, protocol="ospf"):
+    """Anello di router, ognuno collegato al successivo, con una LAN di host ciascuno"""
+    names = [f"r{router_num}" for router_num in range(routers)]
+    links = [(names[i], names[(i + 1) % routers]) for i in range(routers if routers > 2 else routers - 1)]
+    return _topology(names, links, _router_lans(names, hosts_per_router), protocol)
+
+def mesh_topology(routers=4, hosts_per_router=1, protocol="ospf"):
+    """Full mesh: un collegamento per ogni coppia di router (quadratico per natura)"""
+    names = [f"r{router_num}" for router_num in range(routers)]
+    links = [(names[i], names[j]) for i in range(routers) for j in range(i + 1, routers)]
+    return _topology(names, links, _router_lans(names, hosts_per_router), protocol)
+
+def grid_topology(rows=3, cols=3, torus=0, hosts_per_router=1, protocol="ospf"):
+    """Griglia rows x cols di router (toro se torus=1: bordi opposti collegati)"""
+    names = [[f"r{row}_{col}" for col in range(cols)] for row in range(rows)]
+    links = []
+    for row in range(rows):
+        for col in range(cols):
+            if col + 1 < cols or (torus and cols > 2):
+                links.append((names[row][col], names[row][(col + 1) % cols]))
+            if row + 1 < rows or (torus and rows > 2):
+                links.append((names[row][col], names[(row + 1) % rows][col]))
+    routers = [name for row in names for name in row]
+    return _topology(routers, links, _router_lans(routers, hosts_per_router), protocol)
+
+def as_graph_topology(ases=20, links=2, hosts_per_as=1, seed=1):
+    """
+    Grafo di AS Barabási–Albert: un router BGP per AS (asNr1), ogni nuovo
+    AS si collega a 'links' AS esistenti scelti con probabilità
+    proporzionale al loro grado. La scelta pesca da una lista con un
+    elemento per ogni estremo di collegamento, quindi il tempo è lineare
+    nel numero di collegamenti; a parità di seed il grafo è lo stesso.
+    """
+    if links < 1 or ases <= links:
+        raise ValueError("servono links >= 1 e ases > links")
+    rng = random.Random(seed)
+    names = [f"as{as_num}r1" for as_num in range(1, ases + 1)]
+    
+    # Nucleo iniziale: i primi links + 1 AS collegati a catena
+    edges = [(as_num, as_num + 1) for as_num in range(links)]
+    endpoints = [as_num for edge in edges for as_num in edge]
+    for as_num in range(links + 1, ases):
+        targets = set()
+        while len(targets) < links:
+            targets.add(rng.choice(endpoints))
+        for target in sorted(targets):
+            edges.append((target, as_num))
+            endpoints.extend((target, as_num))
+    
+    as_numbers = {name: as_num for as_num, name in enumerate(names, 1)}
+    return _topology(names, [(names[first], names[second]) for first, second in edges],
+                     _router_lans(names, hosts_per_as), "bgp", as_numbers)
+
+# Generatori di topologie disponibili con --topology NOME:param=valore,...
+TOPOLOGIES = {
+    "fat-tree": fat_tree_topology,
+    "leaf-spine": leaf_spine_topology,
+    "ring": ring_topology,
+    "mesh": mesh_topology,
+    "grid": grid_topology,
+    "as-graph": as_graph_topology,
+}
+
+def generate_topology(topology):
+    """
+    Genera una topologia da una descrizione come 'fat-tree:k=4' o
+    'grid:rows=4,cols=8,torus=1'. Restituisce (lab_name, devices_info,
+    all_domains); il nome del laboratorio riassume i parametri.
+    """
+    name, _, raw_params = topology.partition(':')
+    if name not in TOPOLOGIES:
+        raise ValueError(f"topologia '{name}' non valida! Usa {', '.join(TOPOLOGIES)}")
+    
+    params = {}
+    for raw_param in filter(None, raw_params.split(',')):
+        key, _, value = raw_param.partition('=')
+        key, value = key.strip().replace('-', '_'), value.strip()
+        params[key] = int(value) if value.lstrip('-').isdigit() else value
+    if params.get('protocol') not in (None, *ROUTING_PROTOCOLS):
+        raise ValueError(f"protocollo di routing '{params['protocol']}' non valido! Usa ospf, rip o bgp")
+    
+    try:
+        devices_info = TOPOLOGIES[name](**params)
+    except TypeError as e:
+        raise ValueError(f"parametri non validi per {name}: {e}") from None
+    
+    lab_name = "-".join([name] + [f"{key}{value}" for key, value in params.items()]).replace('_', '')
+    all_domains = {domain for device_data in devices_info.values()
+                   for domain in device_data['interfaces'].values()}
+    return lab_name, devices_info, all_domains
+
+def load_spec(spec_path):
+    """
+    Carica una specifica di topologia da file JSON o YAML e la valida.
+    Restituisce (lab_name, devices_info, all_domains).
+    """
+    return build_devices_info(read_spec(spec_path))
+
+def read_spec(spec_path):
+    """Legge un file JSON o YAML (specifica o descrizione di un batch)"""
+    spec_path = Path(spec_path)
+    text = spec_path.read_text(encoding='utf-8')
+    
+    if spec_path.suffix.lower() in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ValueError("PyYAML non installato: usa una specifica JSON o installa pyyaml")
+        spec = yaml.safe_load(text)
+    else:
+        spec = json.loads(text)
+    
+    # Il nome del file fa da nome del laboratorio se non specificato
+    if isinstance(spec, dict) and not spec.get('lab_name'):
+        spec['lab_name'] = spec_path.stem
+    
+    return spec
+
+def open_spec_stream(spec_path, startup_style=None, limits=True):
+    """
+    Apre una specifica in formato JSON Lines (.jsonl) per la generazione in
+    streaming: una riga per dispositivo, con prima riga opzionale di
+    intestazione senza 'name':
+        {"lab_name": "fabric", "startup_style": "batch", "limits": false}
+        {"name": "r1", "type": "router", "routing_protocol": "ospf", ...}
+        {"name": "pc1", "type": "host", ...}
+    
+    Restituisce (lab_name, dispositivi) dove dispositivi è un generatore di
+    coppie (device_name, device_data) letto dal file man mano: la specifica
+    non viene mai caricata per intero in memoria (restano solo i nomi dei
+    dispositivi letti, per trovare i duplicati). Un dispositivo non valido
+    solleva ValueError con il numero di riga. startup_style, se indicato,
+    vale per tutti i dispositivi al posto di quello della specifica; con
+    limits False nessun dispositivo ha i limiti [mem]/[cpus].
+    """
+    spec_path = Path(spec_path)
+    spec_file = open(spec_path, 'r', encoding='utf-8')
+    
+    # Leggi l'intestazione (se presente) per conoscere il nome del laboratorio
+    lab_name = spec_path.stem
+    header_style = "commands"
+    header_limits = True
+    first_line = spec_file.readline()
+    first_entry = json.loads(first_line) if first_line.strip() else None
+    if isinstance(first_entry, dict) and 'name' not in first_entry:
+        lab_name = str(first_entry.get('lab_name') or lab_name).strip()
+        header_style = first_entry.get('startup_style') or header_style
+        header_limits = first_entry.get('limits', header_limits)
+        first_entry = None
+    
+    def entries():
+        if first_entry is not None:
+            yield 1, first_entry
+        for line_number, line in enumerate(spec_file, start=2):
+            if line.strip():
+                yield line_number, json.loads(line)
+    
+    def devices():
+        seen = set()
+        with spec_file:
+            for line_number, entry in entries():
+                if not isinstance(entry, dict) or 'name' not in entry:
+                    raise ValueError(f"riga {line_number}: ogni dispositivo deve avere il campo 'name'")
+                device_name = str(entry['name'])
+                if device_name in seen:
+                    raise ValueError(f"riga {line_number}: dispositivo '{device_name}' duplicato")
+                if startup_style is not None:
+                    entry = dict(entry, startup_style=startup_style)
+                if not limits:
+                    entry = dict(entry, limits=False)
+                device_data, device_errors = build_device(device_name, entry, header_style, header_limits)
+                if device_errors:
+                    raise ValueError(f"riga {line_number}: {device_name}: " + "; ".join(device_errors))
+                seen.add(device_name)
+                yield device_name, device_data
+    
+    return lab_name, devices()
+
+def _read_lines(path):
+    """Righe di un file di testo, lista vuota se il file non esiste"""
+    try:
+        return path.read_text(encoding='utf-8').splitlines()
+    except FileNotFoundError:
+        return []
+
+def parse_frr_conf(lines, device_data):
+    """
+    Ricava da un frr.conf protocollo, AS, sessioni BGP, aree e costi OSPF
+    del router e li salva in device_data. Le reti delle righe network
+    vengono associate alle interfacce tramite ip_addresses. In
+    'frr_sections' salva anche ogni sezione router così com'è scritta
+    ({protocollo: {'networks', 'redistribute', 'routes' (solo rip),
+    'costs' (solo ospf)}}), usata da simulate_lab per simulare il file
+    modificato a mano.
+    """
+    protocols = {}
+    sections = {}
+    section = None
+    networks = {}
+    stub = []
+    costs = {}
+    neighbors = {}
+    interface = None
+    
+    for line in lines:
+        match = FRR_ROUTER_RE.match(line)
+        if match:
+            protocols[match.group(1)] = match.group(2)
+            section = sections.setdefault(match.group(1), {'networks': [], 'redistribute': []})
+            if match.group(1) == "rip":
+                section.setdefault('routes', [])
+            continue
+        if FRR_SECTION_END_RE.match(line):
+            section = None
+        match = FRR_NETWORK_RE.match(line)
+        if match:
+            if match.group(2):
+                networks[match.group(1)] = match.group(2)
+            if section is not None and FRR_CIDR_RE.match(match.group(1)):
+                section['networks'].append(match.group(1))
+            continue
+        match = FRR_REDISTRIBUTE_RE.match(line)
+        if match:
+            if section is not None and match.group(1) not in section['redistribute']:
+                section['redistribute'].append(match.group(1))
+            continue
+        match = FRR_RIP_ROUTE_RE.match(line)
+        if match and section is not None and 'routes' in section:
+            # 'route <prefisso>' di RIP: rete annunciata dal router stesso
+            if FRR_CIDR_RE.match(match.group(1)):
+                section['routes'].append(match.group(1))
+            continue
+        match = FRR_NEIGHBOR_RE.match(line)
+        if match:
+            address, keyword, value = match.groups()
+            neighbor = neighbors.setdefault(address, {'IP_ADDRESS': address, 'AS_NUMBER': None,
+                                                      'router name': address})
+            if keyword == "remote-as":
+                neighbor['AS_NUMBER'] = int(value) if value.isdigit() else value
+            else:
+                neighbor['router name'] = value
+            continue
+        match = FRR_NEIGHBOR_EXTRA_RE.match(line)
+        if match and match.group(2) in neighbors:
+            # Il template ripete le righe aggiuntive dopo ogni blocco di neighbor
+            extra = neighbors[match.group(2)].setdefault('extra', [])
+            if match.group(1) not in extra:
+                extra.append(match.group(1))
+            continue
+        match = FRR_STUB_RE.match(line)
+        if match:
+            stub.append(_ospf_area_id(match.group(1)))
+            continue
+        match = FRR_INTERFACE_RE.match(line)
+        if match:
+            interface = int(match.group(1))
+            continue
+        match = FRR_COST_RE.match(line)
+        if match and interface is not None:
+            costs[interface] = int(match.group(1))
+    
+    if "ospf" in sections:
+        sections["ospf"]['costs'] = costs
+    device_data['frr_sections'] = sections
+    
+    # Il template BGP contiene anche una sezione RIP: conta il protocollo principale
+    routing_protocol = next((protocol for protocol in ("bgp", "ospf", "rip") if protocol in protocols), None)
+    if routing_protocol is None:
+        return
+    device_data['routing_protocol'] = routing_protocol
+    
+    if routing_protocol == "bgp":
+        if protocols["bgp"]:
+            device_data['as_number'] = int(protocols["bgp"])
+        device_data['bgp_neighbors'] = [neighbor for neighbor in neighbors.values()
+                                        if neighbor['AS_NUMBER'] is not None]
+        device_data['route_reflector'] = any(
+            line.endswith("route-reflector-client")
+            for neighbor in neighbors.values() for line in neighbor.get('extra', ())
+        )
+    elif routing_protocol == "ospf" and networks:
+        # Come ospfd: ogni interfaccia va nell'area della riga network più
+        # specifica che contiene il suo indirizzo (anche aggregata)
+        statements = sorted(((_parse_cidr(network), _ospf_area_id(area)) for network, area in networks.items()
+                             if FRR_CIDR_RE.match(network)), key=lambda statement: -statement[0][1])
+        interface_areas = {}
+        for eth_num, ip_addr in device_data['ip_addresses'].items():
+            address, _ = _parse_cidr(ip_addr)
+            for (network, prefixlen), area in statements:
+                if address >> (32 - prefixlen) == network >> (32 - prefixlen):
+                    interface_areas[eth_num] = area
+                    break
+        areas = list(interface_areas.values())
+        device_data['ospf_area'] = max(set(areas), key=areas.count) if areas else None
+        device_data['ospf'] = {'areas': interface_areas, 'stub': stub, 'costs': costs}
+
+def load_lab(lab_path):
+    """
+    Ricostruisce devices_info da un laboratorio esistente: immagini e
+    interfacce da lab.conf, indirizzi, rotte e servizi dai file .startup,
+    protocollo, AS, sessioni BGP e aree OSPF da <device>/etc/frr/frr.conf.
+    Ogni file viene letto una sola volta e analizzato riga per riga con
+    espressioni regolari precompilate. Restituisce (lab_name, devices_info,
+    all_domains), come load_spec.
+    """
+    lab_path = Path(lab_path)
+    lab_conf = lab_path / "lab.conf"
+    if not lab_conf.is_file():
+        raise ValueError(f"{lab_path} non contiene un lab.conf")
+    
+    devices_info = {}
+    all_domains = set()
+    for line in _read_lines(lab_conf):
+        match = LAB_CONF_RE.match(line)
+        if not match:
+            continue
+        device_name, key, value = match.groups()
+        device_data = devices_info.setdefault(device_name, {
+            'image': "kathara/base",
+            'interfaces': {},
+            'is_router': False,
+            'is_server': False,
+            'is_host': True,
+            'routing_protocol': None,
+            'ip_addresses': {},
+            'host_routes': [],
+            'as_number': None,
+            'ospf_area': None,
+            'route_reflector': False,
+            'no_limits': True
+        })
+        if key == "image":
+            device_data['image'] = value
+        elif key == "mem":
+            device_data['no_limits'] = False
+        elif key.isdigit():
+            device_data['interfaces'][int(key)] = value
+            all_domains.add(value)
+    
+    for device_name, device_data in devices_info.items():
+        services = set()
+        for line in _read_lines(lab_path / f"{device_name}.startup"):
+            if IP_BATCH_RE.match(line):
+                device_data['startup_style'] = "batch"
+                continue
+            match = IP_ADDR_RE.match(line)
+            if match:
+                device_data['ip_addresses'][int(match.group(2))] = match.group(1)
+                continue
+            match = IP_ROUTE_RE.match(line)
+            if match:
+                network, gateway = match.groups()
+                device_data['host_routes'].append({'network': network, 'gateway': gateway,
+                                                   'is_default': network == "default"})
+                continue
+            match = SERVICE_RE.match(line)
+            if match:
+                services.add(match.group(1))
+        
+        frr_conf = lab_path / device_name / "etc" / "frr" / "frr.conf"
+        device_data['is_router'] = "frr" in services or frr_conf.exists()
+        device_data['is_server'] = "apache2" in services
+        device_data['is_host'] = not device_data['is_router'] and not device_data['is_server']
+        if device_data['is_router']:
+            parse_frr_conf(_read_lines(frr_conf), device_data)
+    
+    devices_info = {device_name: Device.from_dict(device_data)
+                    for device_name, device_data in devices_info.items()}
+    return lab_path.name, devices_info, all_domains
+
+def load_labs(labs_dir="created_labs"):
+    """
+    Importa tutti i laboratori di una directory (quelli con un lab.conf).
+    Restituisce {lab_name: devices_info}.
+    """
+    labs = {}
+    for lab_path in sorted(Path(labs_dir).iterdir()):
+        if not lab_path.name.startswith('.') and (lab_path / "lab.conf").is_file():
+            lab_name, devices_info, _ = load_lab(lab_path)
+            labs[lab_name] = devices_info
+    return labs
+
+def export_spec(lab_name, devices_info):
+    """
+    Converte devices_info nella specifica accettata da build_devices_info,
+    così un laboratorio importato può essere modificato e rigenerato.
+    Aree, aree stub, costi OSPF e layout iBGP diventano le sezioni ospf e
+    bgp. Ciò che la specifica non può rappresentare è elencato da
+    export_spec_losses.
+    """
+    devices = {}
+    domain_areas = {}
+    domain_costs = {}
+    stub_areas = set()
+    ibgp = "none"
+    
+    for device_name, device_data in devices_info.items():
+        if device_data.get('is_router'):
+            device_type = "router"
+        elif device_data.get('is_server'):
+            device_type = "server"
+        else:
+            device_type = "host"
+        device_spec = {
+            'type': device_type,
+            'image': device_data['image'],
+            'interfaces': {str(eth_num): domain for eth_num, domain in sorted(device_data['interfaces'].items())},
+            'ip_addresses': {str(eth_num): ip for eth_num, ip in sorted(device_data.get('ip_addresses', {}).items())},
+        }
+        if device_data.get('host_routes'):
+            device_spec['host_routes'] = [f"{route['network']} via {route['gateway']}"
+                                          for route in device_data['host_routes']]
+        if device_type == "router":
+            device_spec['routing_protocol'] = device_data.get('routing_protocol')
+            for key in ('as_number', 'ospf_area', 'route_reflector'):
+                if device_data.get(key):
+                    device_spec[key] = device_data[key]
+        if device_data.get('startup_style'):
+            device_spec['startup_style'] = device_data['startup_style']
+        if device_data.get('no_limits'):
+            device_spec['limits'] = False
+        devices[device_name] = device_spec
+        
+        ospf = device_data.get('ospf', {})
+        interfaces = device_data['interfaces']
+        for eth_num, area in ospf.get('areas', {}).items():
+            domain_areas[interfaces[eth_num]] = area
+        for eth_num, cost in ospf.get('costs', {}).items():
+            domain_costs[interfaces[eth_num]] = cost
+        stub_areas.update(ospf.get('stub', ()))
+        
+        for neighbor in device_data.get('bgp_neighbors') or ():
+            if neighbor['AS_NUMBER'] == device_data.get('as_number'):
+                if device_data.get('route_reflector'):
+                    ibgp = "route-reflector"
+                elif ibgp == "none":
+                    ibgp = "full-mesh"
+    
+    spec = {'lab_name': lab_name, 'devices': devices}
+    # Uno stile comune a tutti i dispositivi diventa quello del laboratorio
+    startup_styles = {device_spec.get('startup_style') for device_spec in devices.values()}
+    if len(startup_styles) == 1 and None not in startup_styles:
+        spec['startup_style'] = startup_styles.pop()
+        for device_spec in devices.values():
+            del device_spec['startup_style']
+    # Lo stesso per i limiti [mem]/[cpus] tolti a tutti i dispositivi
+    if devices and all('limits' in device_spec for device_spec in devices.values()):
+        spec['limits'] = False
+        for device_spec in devices.values():
+            del device_spec['limits']
+    if any(device_data.get('bgp_neighbors') for device_data in devices_info.values()):
+        spec['bgp'] = {'ibgp': ibgp}
+    if domain_areas or domain_costs or stub_areas:
+        # true se tutte le aree diverse dal backbone sono stub, altrimenti l'elenco
+        other_areas = set(domain_areas.values()) - {"0.0.0.0"}
+        stub = True if other_areas and other_areas <= stub_areas else \
+            sorted(stub_areas, key=lambda area: ipaddress.IPv4Address(area))
+        spec['ospf'] = {'areas': domain_areas, 'stub': stub or False, 'costs': domain_costs}
+    return spec
+
+def export_spec_losses(devices_info, spec):
+    """
+    Confronta le sezioni router dei frr.conf importati con quelle che la
+    specifica di export_spec rigenera e restituisce ciò che la specifica
+    non rappresenta, da riaggiungere a mano dopo la rigenerazione: sezioni
+    router mancanti, righe redistribute e route, righe network che in
+    RIP/OSPF non attivano le stesse interfacce o che in BGP non vengono
+    più annunciate. Solleva ValueError se la specifica non è valida.
+    """
+    _, regenerated, _ = build_devices_info(spec)
+    
+    def enabled(networks, ip_addresses):
+        statements = [_parse_cidr(network) for network in networks]
+        return {eth_num for eth_num, ip_addr in ip_addresses.items()
+                if any(_parse_cidr(ip_addr)[0] >> (32 - prefixlen) == network >> (32 - prefixlen)
+                       for network, prefixlen in statements)}
+    
+    losses = []
+    for device_name, device_data in devices_info.items():
+        original = device_data.get('frr_sections')
+        if not original:
+            continue
+        ip_addresses = regenerated[device_name].get('ip_addresses', {})
+        frr_conf = render_frr_conf(device_name, regenerated)
+        rendered = {'ip_addresses': ip_addresses}
+        parse_frr_conf(frr_conf.splitlines() if frr_conf else (), rendered)
+        rendered = rendered['frr_sections']
+        
+        for protocol, section in original.items():
+            where = f"{device_name}: router {protocol}"
+            other = rendered.get(protocol)
+            if other is None:
+                losses.append(f"{where}: sezione non rigenerata")
+                continue
+            losses.extend(f"{where}: redistribute {source}" for source in section['redistribute']
+                          if source not in other['redistribute'])
+            losses.extend(f"{where}: route {network}" for network in section.get('routes', ())
+                          if network not in other.get('routes', ()))
+            if protocol != "bgp" and enabled(section['networks'], ip_addresses) == \
+                    enabled(other['networks'], ip_addresses):
+                continue
+            losses.extend(f"{where}: network {network}" for network in section['networks']
+                          if network not in other['networks'])
+    return losses
+
+def lab_summary(devices_info):
+    """Metadati di un laboratorio salvati nel catalogue"""
+    domains = set()
+    for device_data in devices_info.values():
+        domains.update(device_data['interfaces'].values())
+    routers = [device_data for device_data in devices_info.values() if device_data.get('is_router')]
+    return {
+        'devices': len(devices_info),
+        'routers': len(routers),
+        'hosts': sum(1 for device_data in devices_info.values() if device_data.get('is_host')),
+        'servers': sum(1 for device_data in devices_info.values() if device_data.get('is_server')),
+        'domains': len(domains),
+        'protocols': sorted({device_data['routing_protocol'] for device_data in routers
+                             if device_data.get('routing_protocol')}),
+    }
+
+def _lab_stamp(lab_path):
+    """
+    mtime della directory e del lab.conf: cambia quando il laboratorio
+    viene rigenerato o vengono aggiunti/modificati dispositivi. None se
+    lab_path non è un laboratorio.
+    """
+    try:
+        return [lab_path.stat().st_mtime_ns, (lab_path / "lab.conf").stat().st_mtime_ns]
+    except OSError:
+        return None
+
+def load_catalogue(labs_dir):
+    """Legge il catalogue {lab_name: metadati} (vuoto se assente)"""
+    try:
+        with open(Path(labs_dir) / CATALOGUE_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f).get('labs', {})
+    except (OSError, ValueError):
+        return {}
+
+def save_catalogue(labs_dir, labs):
+    """Salva il catalogue dei laboratori"""
+    write_file_atomic(
+        Path(labs_dir) / CATALOGUE_NAME,
+        json.dumps({'labs': labs}, indent=1, sort_keys=True).encode('utf-8')
+    )
+
+def _catalogue_entry(devices_info, stamp):
+    """Voce del catalogue: metadati del laboratorio e mtime con cui sono stati letti"""
+    entry = lab_summary(devices_info)
+    entry['stamp'] = stamp
+    entry['modified'] = time.strftime("%Y-%m-%d %H:%M", time.localtime(stamp[1] / 1e9))
+    return entry
+
+def update_catalogue(lab_path, devices_info):
+    """Aggiorna la voce di un laboratorio appena creato o rigenerato"""
+    lab_path = Path(lab_path)
+    stamp = _lab_stamp(lab_path)
+    if stamp is None:
+        return
+    labs = load_catalogue(lab_path.parent)
+    labs[lab_path.name] = _catalogue_entry(devices_info, stamp)
+    save_catalogue(lab_path.parent, labs)
+
+def refresh_catalogue(labs_dir="created_labs"):
+    """
+    Allinea il catalogue al contenuto di labs_dir: i laboratori nuovi o con
+    mtime diverso da quello salvato vengono riletti con load_lab, quelli
+    spariti rimossi. Per i laboratori invariati bastano due stat, quindi
+    l'elenco non rilegge mai i file dei dispositivi. Restituisce
+    {lab_name: metadati}.
+    """
+    labs_dir = Path(labs_dir)
+    labs = load_catalogue(labs_dir)
+    current = {}
+    changed = False
+    
+    with os.scandir(labs_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            lab_path = Path(entry.path)
+            stamp = _lab_stamp(lab_path)
+            if stamp is None:
+                continue
+            cached = labs.get(entry.name)
+            if cached is not None and cached.get('stamp') == stamp:
+                current[entry.name] = cached
+                continue
+            try:
+                _, devices_info, _ = load_lab(lab_path)
+            except (OSError, ValueError):
+                continue
+            current[entry.name] = _catalogue_entry(devices_info, stamp)
+            changed = True
+    
+    if changed or current.keys() != labs.keys():
+        save_catalogue(labs_dir, current)
+    return current
+
+def search_labs(labs_dir="created_labs", protocol=None, min_routers=None, max_routers=None, name=None):
+    """
+    Cerca nel catalogue i laboratori che usano protocol, hanno un numero di
+    router compreso tra min_routers e max_routers e contengono name nel
+    nome. Restituisce [(lab_name, metadati)] ordinati per nome.
+    """
+    results = []
+    for lab_name, entry in refresh_catalogue(labs_dir).items():
+        if protocol and protocol not in entry['protocols']:
+            continue
+        if min_routers is not None and entry['routers'] < min_routers:
+            continue
+        if max_routers is not None and entry['routers'] > max_routers:
+            continue
+        if name and name.lower() not in lab_name.lower():
+            continue
+        results.append((lab_name, entry))
+    return sorted(results, key=lambda result: _natural_key(result[0]))
+
+def stream_lab(devices, lab_path, link_mode="copy"):
+    """
+    Genera il laboratorio in streaming: per ogni dispositivo prodotto da
+    'devices' (qualsiasi iterabile di coppie (device_name, device_data),
+    ad esempio open_spec_stream o un generatore scritto a mano) scrive
+    subito la sua sezione di lab.conf, il file .startup e le directory di
+    configurazione. I dati dei dispositivi non restano in memoria: resta
+    solo lo stato usato per controllare l'indirizzamento (vedi
+    validate_device_addressing), cioè la sottorete di ogni dominio e gli
+    indirizzi usati, che cresce quindi con domini e interfacce, oltre ai
+    nomi dei domini internati (vedi scoped_domain_interning). Al primo
+    dispositivo non valido solleva ValueError.
+    
+    Restituisce un dizionario con il numero di dispositivi, router, server
+    e file generati.
+    """
+    stats = {'devices': 0, 'routers': 0, 'servers': 0, 'files': 1}
+    domains, intervals = {}, []
+    
+    with open(lab_path / "lab.conf", 'w', encoding='utf-8') as lab_conf:
+        for device_name, device_data in devices:
+            device_data = Device.from_dict(device_data)
+            errors = validate_device_addressing(device_name, device_data, domains, intervals)
+            if errors:
+                raise ValueError("indirizzamento non valido:\n   • " + "\n   • ".join(errors))
+            
+            frr_conf = None
+            is_frr_router = device_data.get('is_router') and device_data.get('routing_protocol')
+            if is_frr_router:
+                # In streaming gli altri dispositivi non sono noti: il frr.conf
+                # contiene le reti del router ma non le sessioni con i vicini
+                frr_conf = render_frr_conf(device_name, {device_name: device_data})
+            
+            # Le reti del laboratorio non sono note: stima senza le rotte
+            resources = None
+            if not device_data.get('no_limits'):
+                daemons = router_daemons(device_data, frr_conf) if is_frr_router else ()
+                resources = estimate_resources(device_data, 0, daemons)
+            lab_conf.write(render_lab_conf_entry(device_name, device_data, resources))
+            write_startup_file(device_name, device_data, lab_path)
+            stats['devices'] += 1
+            stats['files'] += 1
+            
+            if is_frr_router:
+                # Le reti del laboratorio non sono note: il buffer di zebra resta quello del template
+                daemons = render_daemons(device_data['routing_protocol'], frr_conf)
+                if create_router_config_directories(
+                    device_name, device_data['routing_protocol'], lab_path, verbose=False,
+                    link_mode=link_mode, frr_conf=frr_conf, daemons=daemons
+                ):
+                    stats['routers'] += 1
+                    stats['files'] += 3
+            
+            if device_data.get('is_server'):
+                if create_server_config_directories(device_name, lab_path, verbose=False,
+                                                    link_mode=link_mode):
+                    stats['servers'] += 1
+                    stats['files'] += 1
+    
+    return stats
+
+def generate_lab(lab_name, devices_info, lab_path, workers=1, link_mode="copy"):
+    """
+    Genera tutti i file del laboratorio (lab.conf, .startup e directory
+    di configurazione), usando fino a 'workers' thread per i file dei
+    singoli dispositivi e la strategia link_mode per i template.
+    I file vengono scritti in una directory di staging che sostituisce
+    lab_path solo a generazione completata. Restituisce (startup_files,
+    router_configs_created, server_configs_created).
+    """
+    with staged_lab_directory(lab_path) as staging_path:
+        # Crea file lab.conf
+        with profile_stage("lab_conf") as stage:
+            create_lab_conf(lab_name, devices_info, staging_path)
+            stage['files'] = 1
+        
+        # Crea file lab.dep (ordine di avvio)
+        with profile_stage("lab_dep") as stage:
+            stage['files'] = 1 if create_lab_dep(devices_info, staging_path) else 0
+        
+        # Crea file .startup
+        with profile_stage("startup_files") as stage:
+            startup_files = create_startup_files(devices_info, staging_path, workers)
+            stage['files'] = len(startup_files)
+        
+        # Crea directory di configurazione per router e server
+        router_configs_created, server_configs_created = create_config_directories(
+            devices_info, staging_path, workers, link_mode
+        )
+        
+        # Salva gli hash dei file generati per le rigenerazioni incrementali
+        with profile_stage("manifest") as stage:
+            write_manifest(staging_path, build_manifest(lab_name, devices_info))
+            stage['files'] = 1
+    
+    with profile_stage("catalogue"):
+        update_catalogue(lab_path, devices_info)
+    
+    # I percorsi restituiti puntano al laboratorio definitivo
+    startup_files = [lab_path / startup_file.name for startup_file in startup_files]
+    
+    return startup_files, router_configs_created, server_configs_created
+
+def show_created_lab(lab_name, lab_path, startup_files, router_configs_created, server_configs_created):
+    """Mostra l'elenco dei file generati e i prossimi passi"""
+    print(f"\n🎉 Laboratorio '{lab_name}' creato!")
+    print(f"📁 Directory: {lab_path.absolute()}")
+    print("📄 File generati:")
+    print(f"   • lab.conf")
+    if (lab_path / "lab.dep").exists():
+        print(f"   • lab.dep (ordine di avvio)")
+    print(f"   • {len(startup_files)} file .startup")
+    if router_configs_created:
+        print(f"   • {len(router_configs_created)} directory di configurazione router:")
+        for router in router_configs_created:
+            print(f"     - {router}/etc/frr/")
+    if server_configs_created:
+        print(f"   • {len(server_configs_created)} directory di configurazione server:")
+        for server in server_configs_created:
+            print(f"     - {server}/var/www/html/")
+    
+    print("\nProssimi passi:")
+    print("1. Modifica i file .startup per configurare gli IP")
+    if router_configs_created:
+        print("2. Personalizza i file di configurazione routing in <router>/etc/frr/")
+        print("3. Entra nella directory del laboratorio:")
+    else:
+        print("2. Entra nella directory del laboratorio:")
+    print(f"   cd created_labs/{lab_name}")
+    print(f"{3 if router_configs_created else 2}. Avvia il laboratorio:")
+    print("   kathara lstart")
+    print(f"{4 if router_configs_created else 3}. Per fermarlo:")
+    print("   kathara lclean")
+
+def run_spec(spec_path, overwrite=False, workers=1, link_mode="copy", incremental=False,
+             ip_pool=None, ip_prefixlen=24, auto_routes=False, ibgp=None,
+             ospf_partition=None, archive=None, archive_format=None, startup_style=None,
+             host_memory=None, host_cpus=None, simulate=False, limits=True):
+    """Crea un laboratorio da una specifica senza alcuna domanda interattiva"""
+    if Path(spec_path).suffix.lower() == '.jsonl':
+        if archive is not None:
+            raise ValueError("--archive non è supportato con le specifiche .jsonl generate in streaming")
+        return run_spec_stream(spec_path, overwrite=overwrite, link_mode=link_mode,
+                               startup_style=startup_style, limits=limits)
+    
+    with profile_stage("load_spec"):
+        lab_name, devices_info, all_domains = load_spec(spec_path)
+    return build_lab(lab_name, devices_info, all_domains, overwrite, workers, link_mode, incremental,
+                     ip_pool, ip_prefixlen, auto_routes, ibgp, ospf_partition, archive, archive_format,
+                     startup_style, host_memory, host_cpus, simulate, limits)
+
+def run_topology(topology, overwrite=False, workers=1, link_mode="copy", incremental=False,
+                 ip_pool=None, ip_prefixlen=24, ibgp=None, ospf_partition=None,
+                 archive=None, archive_format=None, startup_style=None,
+                 host_memory=None, host_cpus=None, simulate=False, limits=True):
+    """
+    Crea un laboratorio da un generatore di topologie: gli indirizzi
+    vengono sempre assegnati (dal pool 10.0.0.0/8 se non indicato) e le
+    rotte degli host calcolate automaticamente
+    """
+    with profile_stage("topology"):
+        lab_name, devices_info, all_domains = generate_topology(topology)
+    return build_lab(lab_name, devices_info, all_domains, overwrite, workers, link_mode, incremental,
+                     ip_pool or "10.0.0.0/8", ip_prefixlen, True, ibgp, ospf_partition,
+                     archive, archive_format, startup_style, host_memory, host_cpus, simulate, limits)
+
+def build_lab(lab_name, devices_info, all_domains, overwrite=False, workers=1, link_mode="copy",
+              incremental=False, ip_pool=None, ip_prefixlen=24, auto_routes=False, ibgp=None,
+              ospf_partition=None, archive=None, archive_format=None, startup_style=None,
+              host_memory=None, host_cpus=None, simulate=False, limits=True):
+    """
+    Completa devices_info (indirizzi, rotte, sessioni BGP, aree OSPF), lo
+    valida e genera il laboratorio, da zero o in modo incrementale, oppure
+    lo scrive nell'archivio 'archive' (percorso o stream binario).
+    startup_style, se indicato, vale per tutti i dispositivi; con limits
+    False lab.conf non contiene i limiti [mem]/[cpus]. Prima di scrivere
+    qualsiasi file confronta i limiti con la macchina descritta da
+    host_memory/host_cpus (errore se non entrano) o con questa (solo un
+    avviso) e, con simulate, mostra la simulazione del piano di controllo.
+    """
+    if startup_style is not None:
+        set_startup_style(devices_info, startup_style)
+    if not limits:
+        set_resource_limits(devices_info, False)
+    
+    if ip_pool:
+        with profile_stage("addressing"):
+            allocate_ip_addresses(devices_info, ip_pool, ip_prefixlen)
+    
+    if auto_routes:
+        with profile_stage("host_routes"):
+            unreachable = derive_host_routes(devices_info)
+        for device_name in unreachable:
+            print(f"⚠️  Nessun router raggiungibile per {device_name}: rotte non calcolate")
+    
+    if ibgp:
+        with profile_stage("bgp_sessions"):
+            derive_bgp_sessions(devices_info, ibgp)
+    
+    if ospf_partition is not None:
+        with profile_stage("ospf_areas"):
+            apply_ospf_areas(devices_info, partition_ospf_areas(devices_info, ospf_partition), stub_areas=True)
+    
+    # Controlla tutto l'indirizzamento prima di scrivere qualsiasi file
+    with profile_stage("validate"):
+        errors = validate_addressing(devices_info)
+    if errors:
+        raise ValueError("indirizzamento non valido:\n   • " + "\n   • ".join(errors))
+    
+    with profile_stage("summary"):
+        show_summary(lab_name, devices_info, all_domains)
+    
+    if simulate:
+        with profile_stage("simulate"):
+            result = simulate_lab(devices_info)
+        show_simulation(result)
+    
+    # Un archivio va su un'altra macchina: confronta solo se è descritta
+    warning = check_resource_budget(devices_info, host_memory, host_cpus, compare_local=archive is None)
+    if warning:
+        print(f"⚠️  {warning[0].upper()}{warning[1:]}")
+    
+    if archive is not None:
+        if archive_format is None:
+            archive_format = archive_format_for(archive) if isinstance(archive, (str, Path)) else "tar.gz"
+        with profile_stage("archive") as stage:
+            stats = write_lab_archive(lab_name, devices_info, archive, archive_format)
+            stage['files'] = stats['files']
+        target = archive if isinstance(archive, (str, Path)) else "stdout"
+        print(f"\n📦 Laboratorio '{lab_name}' scritto in {target} ({archive_format}): "
+              f"{stats['files']} file, {stats['unique']} salvati per intero (gli altri come hardlink), "
+              f"{stats['bytes']} byte")
+        return True
+    
+    lab_path = Path("created_labs") / lab_name
+    if incremental and lab_path.exists():
+        with profile_stage("incremental_sync"):
+            return run_incremental(lab_name, devices_info, lab_path, link_mode)
+    
+    lab_path = create_lab_directory(lab_name, overwrite=overwrite)
+    if lab_path is None:
+        print("💡 Usa --force per sovrascrivere il laboratorio esistente")
+        return False
+    
+    created = generate_lab(lab_name, devices_info, lab_path, workers, link_mode)
+    show_created_lab(lab_name, lab_path, *created)
+    return True
+
+def set_startup_style(devices_info, startup_style):
+    """Imposta lo stile del .startup (commands o batch) di tutti i dispositivi"""
+    for device_data in devices_info.values():
+        device_data['startup_style'] = startup_style if startup_style != "commands" else None
+
+def set_resource_limits(devices_info, limits):
+    """Attiva o toglie i limiti [mem]/[cpus] in lab.conf per tutti i dispositivi"""
+    for device_data in devices_info.values():
+        device_data['no_limits'] = not limits
+
+def warm_template_cache():
+    """
+    Legge e compila una volta tutti i template di fileConfigurazione/: i
+    processi del batch creati con fork ereditano la cache già pronta (in
+    sola lettura, condivisa copy-on-write) invece di rileggerla ognuno
+    """
+    for template in sorted(Path("fileConfigurazione").rglob("*")):
+        if template.is_file():
+            read_template(template)
+            stat = template.stat()
+            _cached_digest(str(template), stat.st_mtime_ns, stat.st_size)
+            if template.name == "frr.conf":
+                compile_template(template)
+
+def _format_values(value, variables):
+    """Sostituisce {variabile} in tutte le stringhe di value (anche annidate)"""
+    if isinstance(value, str):
+        return value.format(**variables)
+    if isinstance(value, dict):
+        return {key: _format_values(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_format_values(item, variables) for item in value]
+    return value
+
+def expand_batch(batch_paths):
+    """
+    Trasforma i file passati a --batch nei lavori da eseguire. Ogni file
+    può essere una specifica (un laboratorio) o la descrizione di un
+    batch, ad esempio:
+    
+        spec: puzzle.json              # oppure topology: "fat-tree:k={k}"
+        matrix:                        # prodotto cartesiano dei valori
+          student: [rossi, bianchi]
+          seed: [1, 2]
+        lab_name: "puzzle-{student}-{seed}"
+        addressing: {pool: "10.{index}.0.0/16", prefixlen: 24, overwrite: true}
+        auto_routes: true
+        ibgp: full-mesh
+        ospf_partition: 1
+        startup_style: batch
+        limits: false                  # niente [mem]/[cpus] in lab.conf
+    
+    oppure 'specs: [a.json, b.yaml]'. Nelle stringhe si possono usare le
+    chiavi della matrice, {index} (numero della variante) e {lab_name}.
+    """
+    jobs = []
+    for batch_path in batch_paths:
+        batch = read_spec(batch_path)
+        if not isinstance(batch, dict):
+            raise ValueError(f"{batch_path}: il batch deve essere un oggetto")
+        if 'devices' in batch:
+            jobs.append({'spec': batch, 'lab_name': batch['lab_name']})
+            continue
+        
+        for spec_path in batch.get('specs') or []:
+            spec = read_spec(Path(batch_path).parent / spec_path)
+            jobs.append({'spec': spec, 'lab_name': spec['lab_name']})
+        
+        if not (batch.get('spec') or batch.get('topology')):
+            continue
+        base_spec = read_spec(Path(batch_path).parent / batch['spec']) if batch.get('spec') else None
+        matrix = batch.get('matrix') or {}
+        keys = list(matrix)
+        default_name = "-".join(["{lab_name}"] + [f"{{{key}}}" for key in keys])
+        
+        for index, values in enumerate(itertools.product(*(matrix[key] for key in keys))):
+            variables = dict(zip(keys, values), index=index)
+            variables['lab_name'] = base_spec['lab_name'] if base_spec else batch['topology'].split(':')[0]
+            addressing = _format_values(batch.get('addressing') or {}, variables)
+            jobs.append({
+                'spec': base_spec,
+                'topology': _format_values(batch.get('topology'), variables),
+                'lab_name': _format_values(batch.get('lab_name', default_name), variables),
+                'ip_pool': addressing.get('pool'),
+                'ip_prefixlen': int(addressing.get('prefixlen', 24)),
+                'overwrite_addresses': bool(addressing.get('overwrite')),
+                'auto_routes': bool(batch.get('auto_routes')),
+                'ibgp': batch.get('ibgp'),
+                'ospf_partition': batch.get('ospf_partition'),
+                'startup_style': batch.get('startup_style'),
+                'limits': batch.get('limits'),
+            })
+    
+    for job in jobs:
+        error = check_device_name(job['lab_name'])
+        if error:
+            raise ValueError(f"nome di laboratorio '{job['lab_name']}' non valido: {error}")
+    if len({job['lab_name'] for job in jobs}) != len(jobs):
+        raise ValueError("il batch genera più laboratori con lo stesso nome: usa le variabili in lab_name")
+    return jobs
+
+def run_batch_job(job, overwrite=False, link_mode="copy", host_memory=None, host_cpus=None):
+    """
+    Genera un laboratorio del batch (eseguito in un processo del pool) e
+    ne restituisce il riepilogo; i messaggi dei singoli passi sono scartati.
+    Il budget di risorse è controllato come in build_lab: un laboratorio
+    che non entra nella macchina host_memory/host_cpus è un errore, su
+    questa macchina solo un avviso. Qualsiasi eccezione è riportata in
+    result['error']: un laboratorio difettoso non ferma il resto del batch.
+    """
+    start = time.perf_counter()
+    result = {'lab_name': job['lab_name'], 'devices': 0, 'routers': 0, 'error': None, 'warning': None}
+    try:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            if job.get('topology'):
+                # Come con --topology: indirizzi dal pool 10.0.0.0/8 se non indicato
+                _, devices_info, _ = generate_topology(job['topology'])
+                job = dict(job, ip_pool=job.get('ip_pool') or "10.0.0.0/8")
+            else:
+                _, devices_info, _ = build_devices_info(dict(job['spec'], lab_name=job['lab_name']))
+            
+            if job.get('ip_pool'):
+                allocate_ip_addresses(devices_info, job['ip_pool'], job.get('ip_prefixlen', 24),
+                                      overwrite=job.get('overwrite_addresses', False))
+            if job.get('auto_routes') or job.get('topology'):
+                derive_host_routes(devices_info, overwrite=job.get('overwrite_addresses', False))
+            if job.get('ibgp'):
+                derive_bgp_sessions(devices_info, job['ibgp'])
+            if job.get('ospf_partition') is not None:
+                apply_ospf_areas(devices_info, partition_ospf_areas(devices_info, int(job['ospf_partition'])),
+                                 stub_areas=True)
+            
+            if job.get('startup_style'):
+                set_startup_style(devices_info, job['startup_style'])
+            if job.get('limits') is False:
+                set_resource_limits(devices_info, False)
+            
+            errors = validate_addressing(devices_info)
+            if errors:
+                raise ValueError(f"indirizzamento non valido: {errors[0]}")
+            result['warning'] = check_resource_budget(devices_info, host_memory, host_cpus)
+            
+            lab_path = create_lab_directory(job['lab_name'], overwrite=overwrite)
+            if lab_path is None:
+                raise ValueError("laboratorio già esistente (usa --force)")
+            generate_lab(job['lab_name'], devices_info, lab_path, link_mode=link_mode)
+        
+        summary = lab_summary(devices_info)
+        result['devices'] = summary['devices']
+        result['routers'] = summary['routers']
+    except (OSError, ValueError) as e:
+        result['error'] = str(e)
+    except Exception as e:
+        # Errore inatteso (specifica malformata, bug): il tipo aiuta a capirlo
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run_batch(batch_paths, processes=None, overwrite=False, link_mode="copy", startup_style=None,
+              host_memory=None, host_cpus=None, limits=True):
+    """
+    Genera in parallelo tutti i laboratori descritti dai file di batch,
+    con un pool di processi (uno per CPU di default) che condivide la
+    cache dei template, e mostra un unico riepilogo
+    """
+    jobs = expand_batch(batch_paths)
+    if startup_style is not None:
+        jobs = [dict(job, startup_style=startup_style) for job in jobs]
+    if not limits:
+        jobs = [dict(job, limits=False) for job in jobs]
+    processes = min(processes or os.cpu_count() or 1, max(len(jobs), 1))
+    print(f"\n🏭 Generazione di {len(jobs)} laboratori con {processes} processi...")
+    
+    warm_template_cache()
+    # fork: i processi ereditano la cache dei template già caricata
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(processes, mp_context=context, initializer=warm_template_cache) as pool:
+        futures = [pool.submit(run_batch_job, job, overwrite, link_mode, host_memory, host_cpus)
+                   for job in jobs]
+        for future in as_completed(futures):
+            results.append(future.result())
+    elapsed = time.perf_counter() - start
+    
+    # I processi aggiornano il catalogue in parallelo: riallinealo una volta
+    refresh_catalogue()
+    
+    results.sort(key=lambda result: _natural_key(result['lab_name']))
+    failed = [result for result in results if result['error']]
+    for result in results:
+        if result['error']:
+            print(f"❌ {result['lab_name']}: {result['error']}")
+        else:
+            print(f"✅ {result['lab_name']}: {result['devices']} dispositivi "
+                  f"({result['routers']} router) in {result['seconds']:.2f}s")
+            if result['warning']:
+                print(f"   ⚠️  {result['warning'][0].upper()}{result['warning'][1:]}")
+    
+    devices = sum(result['devices'] for result in results)
+    print(f"\n🎉 {len(results) - len(failed)} laboratori creati, {len(failed)} errori, "
+          f"{devices} dispositivi in {elapsed:.2f}s ({len(results) / elapsed:.0f} laboratori/s)")
+    return not failed
+
+def run_simulation(path):
+    """
+    Simula il piano di controllo di un laboratorio esistente (directory:
+    conta ogni frr.conf così com'è, anche modificato a mano) o di una
+    specifica (i frr.conf che verrebbero generati), senza generarlo.
+    Restituisce False se ci sono problemi di indirizzamento o di raggiungibilità.
+    """
+    with profile_stage("load"):
+        if Path(path).is_dir():
+            lab_name, devices_info, _ = load_lab(path)
+        else:
+            lab_name, devices_info, _ = load_spec(path)
+    print(f"\n🔎 Laboratorio '{lab_name}'")
+    
+    with profile_stage("validate"):
+        errors = validate_addressing(devices_info)
+    for error in errors:
+        print(f"⚠️  {error}")
+    
+    with profile_stage("simulate"):
+        result = simulate_lab(devices_info)
+    return show_simulation(result) and not errors
+
+def run_incremental(lab_name, devices_info, lab_path, link_mode="copy"):
+    """Rigenera un laboratorio esistente riscrivendo solo i file cambiati"""
+    print(f"\n🔄 Rigenerazione incrementale di 'created_labs/{lab_name}'...")
+    result = sync_lab(lab_name, devices_info, lab_path, link_mode)
+    update_catalogue(lab_path, devices_info)
+    
+    for rel_path in result['written']:
+        print(f"✏️  Aggiornato {rel_path}")
+    for rel_path in result['removed']:
+        print(f"🗑️  Rimosso {rel_path}")
+    for rel_path in result['conflicts']:
+        print(f"⚠️  Conflitto: {rel_path} è stato modificato a mano, lasciato invariato")
+    
+    print(f"\n✅ {len(result['written'])} file aggiornati, {len(result['removed'])} rimossi, "
+          f"{result['unchanged']} invariati, {len(result['conflicts'])} conflitti")
+    return True
+
+def run_spec_stream(spec_path, overwrite=False, link_mode="copy", startup_style=None, limits=True):
+    """Crea un laboratorio da una specifica JSON Lines generandolo in streaming"""
+    lab_name, devices = open_spec_stream(spec_path, startup_style, limits)
+    
+    lab_path = create_lab_directory(lab_name, overwrite=overwrite)
+    if lab_path is None:
+        print("💡 Usa --force per sovrascrivere il laboratorio esistente")
+        return False
+    
+    print(f"\n🚀 Generazione in streaming di '{lab_name}'...")
+    # I dispositivi letti non sopravvivono alla generazione: i loro domini
+    # possono essere dimenticati alla fine
+    with staged_lab_directory(lab_path) as staging_path, scoped_domain_interning():
+        with profile_stage("stream") as stage:
+            stats = stream_lab(devices, staging_path, link_mode)
+            stage['files'] = stats['files']
+    
+    print(f"\n🎉 Laboratorio '{lab_name}' creato!")
+    print(f"📁 Directory: {lab_path.absolute()}")
+    print(f"📄 {stats['files']} file generati per {stats['devices']} dispositivi "
+          f"({stats['routers']} router, {stats['servers']} server)")
+    return True
+
+def parse_args(argv=None):
+    """Interpreta gli argomenti da riga di comando"""
+    parser = argparse.ArgumentParser(
+        description="Crea laboratori Kathara (interattivo o da specifica JSON/YAML)"
+    )
+    parser.add_argument(
+        "--spec", metavar="FILE",
+        help="crea il laboratorio da una specifica topology.json/.yaml senza domande "
+             "(.jsonl: un dispositivo per riga, generato in streaming)"
+    )
+    parser.add_argument(
+        "--topology", metavar="NOME[:param=valore,...]",
+        help="genera una topologia parametrica, ad esempio fat-tree:k=4, "
+             "leaf-spine:spines=2,leaves=8, ring:routers=10, mesh:routers=5, "
+             "grid:rows=4,cols=4,torus=1 o as-graph:ases=50,links=2 "
+             "(indirizzi e rotte degli host sono calcolati automaticamente)"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="sovrascrive senza conferma un laboratorio già esistente (con --spec, --topology o --batch)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="N",
+        help="numero di thread per scrivere i file dei dispositivi "
+             "(utile su NFS e altri filesystem ad alta latenza, default 1)"
+    )
+    parser.add_argument(
+        "--link-mode", choices=LINK_MODES, default="copy",
+        help="come installare i template non personalizzati (daemons, vtysh.conf, "
+             "index.html): copia o link allo store created_labs/.store (default copy)"
+    )
+    parser.add_argument(
+        "--startup-style", choices=STARTUP_STYLES,
+        help="file .startup con un comando ip per operazione (commands) o con un solo "
+             "processo ip -batch per dispositivo (batch), per tutti i dispositivi"
+    )
+    parser.add_argument(
+        "--host-memory", type=int, metavar="MB",
+        help="memoria della macchina che avvierà il laboratorio, confrontata con i limiti "
+             "[mem] prima di generarlo: se non bastano la generazione si ferma (default: "
+             "memoria disponibile su questa macchina, solo come avviso)"
+    )
+    parser.add_argument(
+        "--host-cpus", type=float, metavar="N",
+        help="CPU della macchina che avvierà il laboratorio (default: quelle di questa macchina)"
+    )
+    parser.add_argument(
+        "--no-limits", action="store_true",
+        help="non scrive i limiti [mem] e [cpus] dei dispositivi in lab.conf"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="se il laboratorio esiste già, riscrive solo i file cambiati e "
+             "conserva quelli modificati a mano (con --spec)"
+    )
+    parser.add_argument(
+        "--ip-pool", metavar="RETE",
+        help="assegna automaticamente gli IP mancanti prendendo una sottorete "
+             "per dominio di collisione da questo pool (es. 10.0.0.0/8)"
+    )
+    parser.add_argument(
+        "--ip-prefixlen", type=int, default=24, metavar="N",
+        help="lunghezza del prefisso delle sottoreti assegnate con --ip-pool (default 24)"
+    )
+    parser.add_argument(
+        "--auto-routes", action="store_true",
+        help="calcola default gateway e rotte statiche di host e server dalla topologia"
+    )
+    parser.add_argument(
+        "--ibgp", choices=IBGP_LAYOUTS,
+        help="genera anche le sessioni iBGP tra i router BGP dello stesso AS "
+             "(le sessioni eBGP tra AS diversi sono sempre generate)"
+    )
+    parser.add_argument(
+        "--ospf-partition", type=int, metavar="RAGGIO",
+        help="suddivide i router OSPF in backbone e aree stub: il backbone comprende "
+             "i domini entro RAGGIO router dal router con più interfacce"
+    )
+    parser.add_argument(
+        "--simulate", metavar="LAB", nargs="?", const=True,
+        help="simula RIP, OSPF e BGP senza avviare i container e segnala le reti "
+             "irraggiungibili, i buchi neri e i cicli: di un laboratorio esistente (con i suoi "
+             "frr.conf, anche modificati a mano) o di una specifica (LAB), oppure, senza "
+             "argomento, di quello creato con --spec o --topology"
+    )
+    parser.add_argument(
+        "--export-spec", metavar="LAB",
+        help="importa un laboratorio esistente (lab.conf, .startup, frr.conf) e "
+             "stampa la sua specifica JSON, da modificare e rigenerare con --spec"
+    )
+    parser.add_argument(
+        "--list", action="store_true",
+        help="elenca i laboratori di created_labs/ con dispositivi, protocolli e domini "
+             "(filtrabili con --protocol, --min-routers, --max-routers, --name)"
+    )
+    parser.add_argument("--protocol", choices=ROUTING_PROTOCOLS,
+                        help="con --list: solo i laboratori che usano questo protocollo")
+    parser.add_argument("--min-routers", type=int, metavar="N", help="con --list: almeno N router")
+    parser.add_argument("--max-routers", type=int, metavar="N", help="con --list: al massimo N router")
+    parser.add_argument("--name", metavar="TESTO", help="con --list: nome che contiene TESTO")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help=f"mostra tempo, file, byte scritti e operazioni sul filesystem di ogni "
+             f"fase della generazione (come {PROFILE_ENV}=1)"
+    )
+    parser.add_argument(
+        "--profile-dump", metavar="FILE",
+        help=f"salva anche le statistiche cProfile in FILE, da leggere con pstats "
+             f"(come {PROFILE_DUMP_ENV}=FILE)"
+    )
+    parser.add_argument(
+        "--archive", metavar="FILE",
+        help="invece di created_labs/ scrive il laboratorio direttamente in un archivio "
+             "(.tar, .tar.gz, .tar.bz2, .tar.xz o .zip; - per stdout), con --spec o --topology"
+    )
+    parser.add_argument(
+        "--archive-format", choices=ARCHIVE_FORMATS,
+        help="formato dell'archivio (default: dall'estensione, tar.gz per stdout)"
+    )
+    parser.add_argument(
+        "--batch", metavar="FILE", nargs="+",
+        help="genera in parallelo più laboratori: specifiche o descrizioni di batch "
+             "(una specifica o topologia con una matrice di parametri, es. studenti x seed)"
+    )
+    parser.add_argument(
+        "--processes", type=int, metavar="N",
+        help="processi usati da --batch (default: uno per CPU)"
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers deve essere almeno 1")
+    if args.archive and not (args.spec or args.topology):
+        parser.error("--archive richiede --spec o --topology")
+    if args.processes is not None and args.processes < 1:
+        parser.error("--processes deve essere almeno 1")
+    if args.simulate is True and not (args.spec or args.topology):
+        parser.error("--simulate senza argomento richiede --spec o --topology")
+    return args
+
+def main(argv=None):
+    """Funzione principale"""
+    args = parse_args(argv)
+    
+    if args.profile or os.environ.get(PROFILE_ENV):
+        enable_profiling()
+    profile_dump = args.profile_dump or os.environ.get(PROFILE_DUMP_ENV)
+    profiler = cProfile.Profile() if profile_dump else None
+    
+    # Con l'archivio su stdout i messaggi vanno su stderr
+    output = nullcontext()
+    if args.archive == "-":
+        args.archive = sys.stdout.buffer
+        output = redirect_stdout(sys.stderr)
+    
+    with output:
+        if profiler:
+            profiler.enable()
+        try:
+            return run(args)
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_dump)
+                print(f"\n📊 Statistiche cProfile salvate in {profile_dump} "
+                      f"(python3 -m pstats {profile_dump})")
+            show_profile()
+
+def run(args):
+    """Esegue la modalità scelta da riga di comando (interattiva se nessuna)"""
+    if args.list:
+        show_existing_labs(args.protocol, args.min_routers, args.max_routers, args.name)
+        return
+    
+    if isinstance(args.simulate, str):
+        return run_simulation(args.simulate)
+    
+    if args.export_spec:
+        lab_name, devices_info, _ = load_lab(args.export_spec)
+        spec = export_spec(lab_name, devices_info)
+        print(json.dumps(spec, indent=2, ensure_ascii=False))
+        # Gli avvisi vanno su stderr: stdout è la specifica
+        try:
+            losses = export_spec_losses(devices_info, spec)
+        except ValueError as e:
+            print(f"⚠️  La specifica esportata non può essere rigenerata così com'è: {e}", file=sys.stderr)
+            return False
+        errors = validate_addressing(devices_info)
+        if errors:
+            print("⚠️  --spec rifiuterà la specifica finché l'indirizzamento non è corretto:\n   • "
+                  + "\n   • ".join(errors), file=sys.stderr)
+        if losses:
+            print(f"⚠️  {len(losses)} righe dei frr.conf non sono rappresentate nella specifica "
+                  f"(da aggiungere a mano dopo la rigenerazione):", file=sys.stderr)
+            for loss in losses:
+                print(f"   • {loss}", file=sys.stderr)
+        return
+    
+    if args.batch:
+        return run_batch(args.batch, args.processes, overwrite=args.force, link_mode=args.link_mode,
+                         startup_style=args.startup_style, host_memory=args.host_memory,
+                         host_cpus=args.host_cpus, limits=not args.no_limits)
+    
+    if args.topology:
+        return run_topology(args.topology, overwrite=args.force, workers=args.workers,
+                            link_mode=args.link_mode, incremental=args.incremental,
+                            ip_pool=args.ip_pool, ip_prefixlen=args.ip_prefixlen,
+                            ibgp=args.ibgp, ospf_partition=args.ospf_partition,
+                            archive=args.archive, archive_format=args.archive_format,
+                            startup_style=args.startup_style,
+                            host_memory=args.host_memory, host_cpus=args.host_cpus,
+                            simulate=bool(args.simulate), limits=not args.no_limits)
+    
+    if args.spec:
+        return run_spec(args.spec, overwrite=args.force, workers=args.workers,
+                        link_mode=args.link_mode, incremental=args.incremental,
+                        ip_pool=args.ip_pool, ip_prefixlen=args.ip_prefixlen,
+                        auto_routes=args.auto_routes, ibgp=args.ibgp,
+                        ospf_partition=args.ospf_partition,
+                        archive=args.archive, archive_format=args.archive_format,
+                        startup_style=args.startup_style,
+                        host_memory=args.host_memory, host_cpus=args.host_cpus,
+                        simulate=bool(args.simulate), limits=not args.no_limits)
+    
+    welcome()
+    
+    # Ottieni nome laboratorio
+    lab_name = get_lab_name()
+    
+    # Crea directory del laboratorio
+    lab_path = create_lab_directory(lab_name)
+    if lab_path is None:
+        return
+    
+    # Ottieni lista dispositivi
+    devices = get_devices()
+    
+    # Per ogni dispositivo, chiedi il tipo e le interfacce
+    devices_info = {}
+    all_domains = set()
+    
+    print(f"\n🖥️  CONFIGURAZIONE DISPOSITIVI")
+    print("-" * 35)
+    
+    for device in devices:
+        print(f"\n--- Configurazione {device} ---")
+        
+        # Tipo di dispositivo
+        image, is_router, is_server = choose_device_type(device)
+        is_host = not is_router and not is_server
+        
+        # Interfacce del dispositivo
+        interfaces, device_domains = get_device_interfaces(device)
+        
+        # Configurazione IP e rotte in base al tipo
+        routing_protocol = None
+        ip_addresses = {}
+        host_routes = []
+        
+        if is_router:
+            # Router: chiedi protocollo di routing e IP
+            routing_protocol = choose_routing_protocol(device)
+            if interfaces:
+                ip_addresses = get_router_ip_addresses(device, interfaces)
+        elif is_host:
+            # Host: chiedi IP e rotte
+            if interfaces:
+                ip_addresses = get_host_server_ip_addresses(device, "host", interfaces)
+            host_routes = get_host_routes(device)
+        elif is_server:
+            # Server: chiedi solo IP
+            if interfaces:
+                ip_addresses = get_host_server_ip_addresses(device, "server", interfaces)
+        
+        # Salva informazioni dispositivo
+        devices_info[device] = Device.from_dict({
+            'image': image,
+            'interfaces': interfaces,
+            'is_router': is_router,
+            'is_server': is_server,
+            'is_host': is_host,
+            'routing_protocol': routing_protocol,
+            'ip_addresses': ip_addresses,
+            'host_routes': host_routes
+        })
+        
+        # Aggiungi domini utilizzati
+        all_domains.update(device_domains)
+    
+    # Assegna automaticamente gli IP non inseriti a mano
+    if args.ip_pool:
+        allocate_ip_addresses(devices_info, args.ip_pool, args.ip_prefixlen)
+    
+    # Calcola le rotte di host e server non inserite a mano
+    if args.auto_routes:
+        for device_name in derive_host_routes(devices_info):
+            print(f"⚠️  Nessun router raggiungibile per {device_name}: rotte non calcolate")
+    
+    if args.ibgp:
+        derive_bgp_sessions(devices_info, args.ibgp)
+    
+    if args.ospf_partition is not None:
+        apply_ospf_areas(devices_info, partition_ospf_areas(devices_info, args.ospf_partition),
+                         stub_areas=True)
+    
+    # Mostra riassunto
+    with profile_stage("summary"):
+        show_summary(lab_name, devices_info, all_domains)
+    
+    # Segnala eventuali conflitti di indirizzamento prima della conferma
+    with profile_stage("validate"):
+        errors = validate_addressing(devices_info)
+    for error in errors:
+        print(f"⚠️  {error}")
+    
+    # Limiti di memoria e CPU rispetto alla macchina (qui sempre solo un avviso)
+    if args.no_limits:
+        set_resource_limits(devices_info, False)
+    try:
+        warning = check_resource_budget(devices_info, args.host_memory, args.host_cpus)
+    except ValueError as e:
+        warning = str(e)
+    if warning:
+        print(f"⚠️  {warning[0].upper()}{warning[1:]}")
+    
+    # Chiedi conferma
+    confirm = input("\nVuoi creare i file del laboratorio? (S/n): ").strip().lower()
+    if confirm != 'n':
+        created = generate_lab(lab_name, devices_info, lab_path, args.workers, args.link_mode)
+        show_created_lab(lab_name, lab_path, *created)
+        
+        # Chiedi se mostrare il contenuto dei file
+        show_files = input("\nVuoi vedere il contenuto dei file generati? (S/n): ").strip().lower()
+        if show_files != 'n':
+            with profile_stage("show_generated_files"):
+                show_generated_files(lab_path, devices_info)
+        
+    else:
+        print("\n👋 Operazione annullata.")
+
+if __name__ == "__main__":
+    try:
+        if main() is False:
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print("\n\n👋 Uscita dal programma. Arrivederci!")
+    except Exception as e:
+        print(f"\n❌ Errore: {e}")
+        sys.exit(1)
\ No newline at end of file
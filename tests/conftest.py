@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+SAMPLE_LABS = REPO_ROOT / "created_labs"
+
+
+@pytest.fixture(autouse=True)
+def repo_cwd(monkeypatch):
+    """I template sono cercati in fileConfigurazione/, relativo alla directory corrente"""
+    monkeypatch.chdir(REPO_ROOT)
+
+
+def router(protocol, interfaces, ip_addresses=None, **attributes):
+    """Definizione di un router nel formato della specifica"""
+    return dict(type="router", routing_protocol=protocol, interfaces=interfaces,
+                ip_addresses=ip_addresses or [], **attributes)
+
+
+def host(interfaces, ip_addresses=None, **attributes):
+    """Definizione di un host nel formato della specifica"""
+    return dict(type="host", interfaces=interfaces, ip_addresses=ip_addresses or [], **attributes)
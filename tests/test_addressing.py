@@ -0,0 +1,107 @@
+import ipaddress
+
+import pytest
+
+import kathara_lab_creator as klc
+from conftest import host, router
+
+
+def devices(**definitions):
+    _, devices_info, _ = klc.build_devices_info({"lab_name": "lab", "devices": definitions})
+    return devices_info
+
+
+def test_allocate_one_subnet_per_domain_routers_first():
+    devices_info = devices(
+        pc1=host(["A"]),
+        r1=router("rip", ["A", "B"]),
+        r2=router("rip", ["B"]),
+    )
+    allocated = klc.allocate_ip_addresses(devices_info, "10.0.0.0/16", 24)
+    assert {domain: str(network) for domain, network in allocated.items()} == {
+        "A": "10.0.0.0/24", "B": "10.0.1.0/24",
+    }
+    # Il router del dominio riceve .1: è il gateway degli host
+    assert devices_info["r1"]["ip_addresses"] == {0: "10.0.0.1/24", 1: "10.0.1.1/24"}
+    assert devices_info["pc1"]["ip_addresses"] == {0: "10.0.0.2/24"}
+    assert devices_info["r2"]["ip_addresses"] == {0: "10.0.1.2/24"}
+    assert klc.validate_addressing(devices_info) == []
+
+
+def test_allocate_keeps_configured_addresses():
+    devices_info = devices(
+        r1=router("rip", ["A", "B"], {1: "10.0.0.1/24"}),
+        r2=router("rip", ["B", "C"]),
+    )
+    klc.allocate_ip_addresses(devices_info, "10.0.0.0/16", 24)
+    assert devices_info["r1"]["ip_addresses"][1] == "10.0.0.1/24"
+    assert devices_info["r2"]["ip_addresses"][0] == "10.0.0.2/24"
+    # La sottorete già usata da B viene saltata per gli altri domini
+    assert devices_info["r1"]["ip_addresses"][0] == "10.0.1.1/24"
+    assert devices_info["r2"]["ip_addresses"][1] == "10.0.2.1/24"
+    assert klc.validate_addressing(devices_info) == []
+
+
+def test_allocate_overwrite():
+    devices_info = devices(r1=router("rip", ["A"], ["192.168.0.1/24"]))
+    klc.allocate_ip_addresses(devices_info, "10.0.0.0/16", 30, overwrite=True)
+    assert devices_info["r1"]["ip_addresses"] == {0: "10.0.0.1/30"}
+
+
+def test_allocate_point_to_point_prefix():
+    devices_info = devices(r1=router("rip", ["A"]), r2=router("rip", ["A"]))
+    klc.allocate_ip_addresses(devices_info, "10.0.0.0/24", 31)
+    assert devices_info["r1"]["ip_addresses"] == {0: "10.0.0.0/31"}
+    assert devices_info["r2"]["ip_addresses"] == {0: "10.0.0.1/31"}
+
+
+def test_allocate_is_deterministic():
+    definitions = {f"r{i}": router("ospf", [f"D{i}", f"D{i + 1}"]) for i in range(1, 12)}
+    first, second = devices(**definitions), devices(**definitions)
+    klc.allocate_ip_addresses(first)
+    klc.allocate_ip_addresses(second)
+    assert {name: dict(data["ip_addresses"]) for name, data in first.items()} == \
+        {name: dict(data["ip_addresses"]) for name, data in second.items()}
+    networks = {ipaddress.IPv4Interface(ip).network
+                for data in first.values() for ip in data["ip_addresses"].values()}
+    assert len(networks) == 12
+
+
+@pytest.mark.parametrize("pool, prefixlen, message", [
+    ("10.0.0.0/33", 24, "pool di indirizzi"),
+    ("10.0.0.0/16", 8, "lunghezza del prefisso"),
+])
+def test_allocate_invalid_arguments(pool, prefixlen, message):
+    devices_info = devices(r1=router("rip", ["A"]))
+    with pytest.raises(ValueError, match=message):
+        klc.allocate_ip_addresses(devices_info, pool, prefixlen)
+
+
+def test_allocate_pool_exhausted():
+    devices_info = devices(r1=router("rip", ["A", "B", "C"]))
+    with pytest.raises(ValueError):
+        klc.allocate_ip_addresses(devices_info, "10.0.0.0/23", 24)
+
+
+def test_validate_addressing_problems():
+    devices_info = devices(
+        r1=router("rip", ["A", "B"], ["10.0.0.1/24", "10.0.1.1/24"]),
+        r2=router("rip", ["A", "C"], ["10.0.0.1/24", "10.0.1.129/25"]),
+        pc1=host(["A"], ["10.0.0.3/16"], host_routes=["default via 10.9.9.9"]),
+    )
+    errors = "\n".join(klc.validate_addressing(devices_info))
+    assert "indirizzo 10.0.0.1 duplicato" in errors
+    assert "dominio A con sottoreti diverse" in errors
+    assert "si sovrappone" in errors
+    assert "10.9.9.9" in errors
+
+
+def test_stream_validation_matches_batch():
+    devices_info = devices(
+        r1=router("rip", ["A", "B"], ["10.0.0.1/24", "10.0.1.1/24"]),
+        r2=router("rip", ["A"], ["10.0.0.1/24"]),
+    )
+    domains, intervals = {}, []
+    errors = [error for name, data in devices_info.items()
+              for error in klc.validate_device_addressing(name, data, domains, intervals)]
+    assert errors == klc.validate_addressing(devices_info)
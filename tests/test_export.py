@@ -0,0 +1,88 @@
+import contextlib
+import io
+
+import pytest
+
+import kathara_lab_creator as klc
+from conftest import SAMPLE_LABS, host, router
+
+SAMPLES = sorted(path.name for path in SAMPLE_LABS.iterdir() if (path / "lab.conf").is_file())
+
+
+def summary(devices_info):
+    """Ciò che la specifica deve conservare di ogni dispositivo"""
+    return {
+        name: {
+            'image': data['image'],
+            'interfaces': dict(data['interfaces']),
+            'ip_addresses': dict(data.get('ip_addresses', {})),
+            'host_routes': [dict(route) for route in data.get('host_routes', ())],
+            'routing_protocol': data.get('routing_protocol'),
+            'as_number': klc.device_as_number(name, data) if data.get('routing_protocol') == "bgp" else None,
+            'ospf': {key: value if isinstance(value, dict) else sorted(value)
+                     for key, value in (data.get('ospf') or {}).items()},
+        }
+        for name, data in devices_info.items()
+    }
+
+
+def generate_and_load(lab_name, devices_info, tmp_path):
+    """Genera il laboratorio in tmp_path e lo rilegge con load_lab"""
+    lab_path = tmp_path / lab_name
+    with contextlib.redirect_stdout(io.StringIO()):
+        klc.generate_lab(lab_name, devices_info, lab_path)
+    return klc.load_lab(lab_path)
+
+
+def without_ospf(devices):
+    return {name: dict(data, ospf=None) for name, data in devices.items()}
+
+
+@pytest.mark.parametrize("sample", SAMPLES)
+def test_sample_round_trip(sample, tmp_path):
+    lab_name, devices_info, _ = klc.load_lab(SAMPLE_LABS / sample)
+    spec = klc.export_spec(lab_name, devices_info)
+    losses = klc.export_spec_losses(devices_info, spec)
+
+    _, rebuilt, _ = klc.build_devices_info(spec)
+    _, reloaded, _ = generate_and_load(lab_name, rebuilt, tmp_path)
+
+    expected = summary(devices_info)
+    for devices in (summary(rebuilt), summary(reloaded)):
+        if losses:
+            # Le righe network perse possono attivare OSPF su altre interfacce
+            assert without_ospf(devices) == without_ospf(expected)
+        else:
+            assert devices == expected
+
+
+def test_spec_round_trip(tmp_path):
+    spec = {
+        'lab_name': "giro",
+        'devices': {
+            'r1': router("ospf", ["A", "B"], ["10.0.0.1/24", "10.0.1.1/24"],
+                         host_routes=["192.168.0.0/16 via 10.0.0.2"]),
+            'r2': router("ospf", ["B", "C"], ["10.0.1.2/24", "10.0.2.1/24"]),
+            'r3': router("ospf", ["C", "D"], ["10.0.2.2/24", "10.0.3.1/24"]),
+            'as1r1': router("bgp", ["D", "E"], ["10.0.3.2/24", "10.0.4.1/24"]),
+            'as2r1': router("bgp", ["E"], ["10.0.4.2/24"]),
+            'pc1': host(["A"], ["10.0.0.2/24"], host_routes=["default via 10.0.0.1"]),
+        },
+        'ospf': {'areas': {'C': 1, 'D': 2}, 'stub': ["0.0.0.1"], 'costs': {'B': 20}},
+    }
+    _, devices_info, _ = klc.build_devices_info(spec)
+    lab_name, reloaded, _ = generate_and_load("giro", devices_info, tmp_path)
+    assert summary(reloaded) == summary(devices_info)
+
+    exported = klc.export_spec(lab_name, reloaded)
+    assert exported['ospf']['stub'] == ["0.0.0.1"]
+    assert exported['ospf']['costs'] == {'B': 20}
+    assert klc.export_spec_losses(reloaded, exported) == []
+    _, rebuilt, _ = klc.build_devices_info(exported)
+    assert summary(rebuilt) == summary(devices_info)
+
+
+def test_losses_reported():
+    lab_name, devices_info, _ = klc.load_lab(SAMPLE_LABS / "desconocida")
+    losses = klc.export_spec_losses(devices_info, klc.export_spec(lab_name, devices_info))
+    assert "as1r1: router rip: redistribute connected" in losses
@@ -0,0 +1,64 @@
+import pytest
+
+import kathara_lab_creator as klc
+from conftest import SAMPLE_LABS, host, router
+
+
+def simulate(sample):
+    _, devices_info, _ = klc.load_lab(SAMPLE_LABS / sample)
+    return devices_info, klc.simulate_lab(devices_info)
+
+
+@pytest.mark.parametrize("sample, devices, networks", [
+    ("puzzle", 7, 10),
+    ("time", 9, 10),
+    ("twin-pan-balance", 8, 11),
+])
+def test_sample_fully_reachable(sample, devices, networks):
+    _, result = simulate(sample)
+    assert (result['devices'], result['networks']) == (devices, networks)
+    assert result['delivered'] == result['pairs'] == devices * networks
+    assert result['black_holes'] == result['loops'] == 0
+    assert result['sessions_down'] == []
+
+
+def test_desconocida_black_holes():
+    # 20.0.0.8/30 non è annunciata da nessun router
+    _, result = simulate("desconocida")
+    assert result['pairs'] == 100
+    assert result['black_holes'] == 4
+    assert result['loops'] == 0
+    assert result['sessions'] == 10 and result['sessions_down'] == []
+
+
+def test_maracas_duplicate_address():
+    devices_info, result = simulate("maracas")
+    assert klc.validate_addressing(devices_info) == ["indirizzo 10.0.0.1 duplicato: r1 eth0 e r2 eth0"]
+    assert (result['delivered'], result['black_holes']) == (3, 1)
+
+
+def test_rip_route_statement_originates_prefix():
+    # In twin-pan-balance r6 annuncia 40.0.0.0/16 solo con 'route' in router rip
+    devices_info, _ = simulate("twin-pan-balance")
+    sections = devices_info['r6']['frr_sections']
+    assert sections['rip']['routes'] == ["40.0.0.0/16"]
+    devices_info['r6']['frr_sections'] = {protocol: dict(section, routes=[])
+                                          for protocol, section in sections.items()}
+    assert klc.simulate_lab(devices_info)['black_holes'] > 0
+
+
+def test_spec_host_without_gateway():
+    spec = {
+        'lab_name': "senza-gateway",
+        'devices': {
+            'r1': router("rip", ["A", "B"], ["10.0.0.1/24", "10.0.1.1/24"]),
+            'r2': router("rip", ["B"], ["10.0.1.2/24"]),
+            'pc1': host(["A"], ["10.0.0.2/24"]),
+        },
+    }
+    _, devices_info, _ = klc.build_devices_info(spec)
+    result = klc.simulate_lab(devices_info)
+    # pc1 non ha una rotta di default: la rete B non è raggiungibile
+    assert result['black_holes'] == 1
+    assert result['delivered'] == result['pairs'] - 1
+    assert result['samples'][0][0] == "pc1"
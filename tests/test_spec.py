@@ -0,0 +1,83 @@
+import pytest
+
+import kathara_lab_creator as klc
+from conftest import host, router
+
+
+def spec_with(**sections):
+    """Specifica minima valida (un router OSPF e un host) con sezioni aggiuntive"""
+    return dict(lab_name="lab", devices={
+        "r1": router("ospf", ["A", "B"], ["10.0.0.1/24", "10.0.1.1/24"]),
+        "pc1": host(["A"], ["10.0.0.2/24"], host_routes=["default via 10.0.0.1"]),
+    }, **sections)
+
+
+def spec_errors(spec):
+    with pytest.raises(ValueError) as excinfo:
+        klc.build_devices_info(spec)
+    return str(excinfo.value)
+
+
+def test_valid_spec():
+    lab_name, devices_info, all_domains = klc.build_devices_info(spec_with())
+    assert lab_name == "lab"
+    assert all_domains == {"A", "B"}
+    assert devices_info["r1"]["ip_addresses"] == {0: "10.0.0.1/24", 1: "10.0.1.1/24"}
+    assert devices_info["pc1"]["host_routes"][0]["gateway"] == "10.0.0.1"
+
+
+@pytest.mark.parametrize("spec, message", [
+    ([], "deve essere un oggetto"),
+    ({"lab_name": "lab", "devices": {}}, "almeno 1 dispositivo"),
+    ({"lab_name": "lab", "devices": {"r1": {"type": "switch"}}}, "tipo 'switch' non valido"),
+    ({"lab_name": "lab", "devices": {"r1": router("isis", ["A"])}}, "protocollo di routing 'isis'"),
+    ({"lab_name": "lab", "devices": {"r1": router("ospf", 5)}}, "'interfaces' deve essere"),
+    ({"lab_name": "lab", "devices": {"r1": router("ospf", ["A"], ["10.0.0.1"])}}, "eth0"),
+    ({"lab_name": "lab", "devices": {"pc1": host(["A"], host_routes="default via 1.1.1.1")}},
+     "'host_routes' deve essere"),
+])
+def test_invalid_devices(spec, message):
+    assert message in spec_errors(spec)
+
+
+@pytest.mark.parametrize("sections, message", [
+    ({"bgp": "full-mesh"}, "'bgp' deve essere un oggetto"),
+    ({"bgp": {"ibgp": "star"}}, "layout iBGP 'star' non valido"),
+    ({"ospf": ["A"]}, "'ospf' deve essere un oggetto"),
+    ({"ospf": {"areas": ["A"]}}, "'areas' deve essere un oggetto"),
+    ({"ospf": {"areas": {"A": "1.2.3"}}}, "area OSPF '1.2.3' non valida"),
+    ({"ospf": {"areas": {"A": True}}}, "area OSPF 'True' non valida"),
+    ({"ospf": {"costs": {"A": 0}}}, "costo '0' non valido"),
+    ({"ospf": {"costs": {"A": "alto"}}}, "costo 'alto' non valido"),
+    ({"ospf": {"stub": "yes"}}, "'stub' deve essere"),
+    ({"ospf": {"stub": ["0.0.0.0"]}}, "il backbone (0.0.0.0) non può essere"),
+    ({"ospf": {"partition": "si"}}, "'partition' deve essere"),
+    ({"ospf": {"partition": True, "backbone_radius": -1}}, "backbone_radius '-1'"),
+    ({"addressing": "10.0.0.0/8"}, "'addressing' deve essere un oggetto"),
+    ({"addressing": {"prefixlen": "ventiquattro"}}, "prefixlen 'ventiquattro'"),
+])
+def test_invalid_sections(sections, message):
+    assert message in spec_errors(spec_with(**sections))
+
+
+def test_all_errors_reported_together():
+    errors = spec_errors(spec_with(bgp={"ibgp": "star"}, ospf={"costs": {"A": 0}, "stub": 1}))
+    assert errors.count("•") == 3
+
+
+def test_ospf_sections_applied():
+    _, devices_info, _ = klc.build_devices_info(spec_with(
+        ospf={"areas": {"b": 1}, "stub": ["0.0.0.1"], "costs": {"A": "10"}}
+    ))
+    ospf = devices_info["r1"]["ospf"]
+    assert ospf["areas"] == {0: "0.0.0.0", 1: "0.0.0.1"}
+    assert list(ospf["stub"]) == ["0.0.0.1"]
+    assert ospf["costs"] == {0: 10}
+
+
+def test_router_static_routes():
+    spec = spec_with()
+    spec["devices"]["r1"]["host_routes"] = ["192.168.0.0/16 via 10.0.0.2"]
+    _, devices_info, _ = klc.build_devices_info(spec)
+    assert devices_info["r1"]["host_routes"][0]["network"] == "192.168.0.0/16"
+    assert "ip route add 192.168.0.0/16 via 10.0.0.2" in klc.render_startup("r1", devices_info["r1"])